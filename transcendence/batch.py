@@ -0,0 +1,507 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from . import cards
+from . import generators
+from . import kernels
+from . import medium
+from . import transcendence
+
+Tile = transcendence.Tile
+
+EMPTY = -1
+MAX_LEVEL = cards.CardLevel.MAX.value
+LIGHTNING = medium._CardConstants.CARD_TO_INT[cards.Lightning]
+PURIFY = medium._CardConstants.CARD_TO_INT[cards.Purify]
+TREE = medium._CardConstants.CARD_TO_INT[cards.Tree]
+OUTBURST = medium._CardConstants.CARD_TO_INT[cards.Outburst]
+NUM_CARDS = len(medium._CardConstants.CARD_TO_INT)
+NUM_LEVELS = len(cards.CardLevel)
+NUM_TILES = len(Tile)
+
+# Lookup tables indexed by tile value.
+# Tiles that are in TranscendenceBoard.breakable_tiles.
+IN_BREAKABLE = np.array([tile is Tile.NORMAL or Tile.is_special(tile)
+                         for tile in Tile])
+# Tiles for which Tile.is_breakable holds.
+HITTABLE = np.array([Tile.is_breakable(tile) for tile in Tile])
+IS_SPECIAL = np.array([Tile.is_special(tile) for tile in Tile])
+
+
+class CrossCheckError(AssertionError):
+    pass
+
+
+class _Tables:
+    # Per (width, height) card tables, shared by every batch of that size.
+    _tables: Dict = {}
+
+    @classmethod
+    def get(cls, width: int, height: int) -> '_Tables':
+        key = (width, height)
+        if key not in cls._tables:
+            cls._tables[key] = cls(width, height)
+        return cls._tables[key]
+
+    def __init__(self, width: int, height: int):
+        size = width * height
+        # probabilities[card, level, origin, cell]
+        self.probabilities = np.zeros((NUM_CARDS, NUM_LEVELS, size, size))
+        self.always_hits_origin = np.zeros(NUM_CARDS, dtype=bool)
+        self.spares_distorted_at_max = np.zeros(NUM_CARDS, dtype=bool)
+        for card_type, card_id in medium._CardConstants.CARD_TO_INT.items():
+            self.always_hits_origin[card_id] = card_type.ALWAYS_HITS_ORIGIN
+            self.spares_distorted_at_max[card_id] = (
+                card_type.SPARES_DISTORTED_AT_MAX)
+            if card_type is cards.Lightning:
+                continue
+            for level in cards.CardLevel:
+                kernel = kernels.KernelRegistry.get_kernel(
+                    card_type, level, width, height)
+                for origin, footprint in enumerate(kernel.footprints):
+                    for index, _, probability in footprint:
+                        self.probabilities[card_id, level.value,
+                                           origin, index] = probability
+
+        self.lightning_targets = np.array(cards.Lightning.TARGET_COUNT)
+
+        card_weights = generators.CardGenerator.get_probabilities()
+        self.card_ids = np.array([medium._CardConstants.CARD_TO_INT[card]
+                                  for card in card_weights])
+        weights = np.array(list(card_weights.values()), dtype=float)
+        self.card_probabilities = weights / weights.sum()
+
+        tile_weights = generators.TileGenerator.get_probabilities()
+        self.tile_values = np.array([tile.value for tile in tile_weights])
+        weights = np.array(list(tile_weights.values()), dtype=float)
+        self.tile_probabilities = weights / weights.sum()
+
+
+class BatchGame:
+    # N independent games of the same board size advanced in lockstep.
+    # Cards are stored as medium._CardConstants ids and levels, with EMPTY
+    # marking hand and queue slots waiting to be filled.
+    def __init__(self,
+                 width: int,
+                 height: int,
+                 tiles: np.ndarray,
+                 hands: np.ndarray,
+                 hand_levels: np.ndarray,
+                 queues: np.ndarray,
+                 queue_levels: np.ndarray,
+                 turns_left: np.ndarray,
+                 changes_left: np.ndarray,
+                 seed=None,
+                 cross_check: bool = False):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.hands = hands
+        self.hand_levels = hand_levels
+        self.queues = queues
+        self.queue_levels = queue_levels
+        self.turns_left = turns_left
+        self.changes_left = changes_left
+        self.rng = np.random.default_rng(seed)
+        self.cross_check = cross_check
+        self._tables = _Tables.get(width, height)
+        self._script = None
+
+    @classmethod
+    def from_games(cls,
+                   games: Sequence['transcendence.TranscendenceGame'],
+                   seed=None,
+                   cross_check: bool = False) -> 'BatchGame':
+        width = games[0].board.width
+        height = games[0].board.height
+        queue_size = games[0].hand_queue_size
+        for game in games:
+            if (game.board.width, game.board.height) != (width, height):
+                raise ValueError('All boards in a batch must have the same size')
+            if game.hand_queue_size != queue_size:
+                raise ValueError('All games in a batch must have the same'
+                                 ' queue size')
+
+        count = len(games)
+        batch = cls(
+            width, height,
+            tiles=np.zeros((count, width * height), dtype=np.int8),
+            hands=np.full((count, 2), EMPTY, dtype=np.int8),
+            hand_levels=np.zeros((count, 2), dtype=np.int8),
+            queues=np.full((count, queue_size), EMPTY, dtype=np.int8),
+            queue_levels=np.zeros((count, queue_size), dtype=np.int8),
+            turns_left=np.zeros(count, dtype=np.int32),
+            changes_left=np.zeros(count, dtype=np.int32),
+            seed=seed,
+            cross_check=cross_check)
+        for index, game in enumerate(games):
+            batch._set_game(index, game)
+        return batch
+
+    @classmethod
+    def new_games(cls,
+                  count: int,
+                  width: int,
+                  height: int,
+                  turns_left: int,
+                  seed=None,
+                  cross_check: bool = False) -> 'BatchGame':
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(width, height))
+        game.turns_left = turns_left
+        batch = cls.from_games([game], seed=seed, cross_check=cross_check)
+        for name in ['tiles', 'hands', 'hand_levels', 'queues',
+                     'queue_levels', 'turns_left', 'changes_left']:
+            array = getattr(batch, name)
+            setattr(batch, name, np.repeat(array, count, axis=0))
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.turns_left)
+
+    def _set_game(self, index: int, game: 'transcendence.TranscendenceGame') -> None:
+        card_to_int = medium._CardConstants.CARD_TO_INT
+        self.tiles[index] = [tile.value for tile in game.board.tiles]
+        for side, card in enumerate([game.hand_left, game.hand_right]):
+            self.hands[index, side] = card_to_int[type(card)]
+            self.hand_levels[index, side] = card.level.value
+        for slot, card in enumerate(game.hand_queue):
+            self.queues[index, slot] = card_to_int[type(card)]
+            self.queue_levels[index, slot] = card.level.value
+        self.turns_left[index] = game.turns_left
+        self.changes_left[index] = game.changes_left
+
+    def get_game(self, index: int) -> 'transcendence.TranscendenceGame':
+        return self._build_game(index, transcendence.TranscendenceBoard,
+                                transcendence.TranscendenceGame)
+
+    def to_games(self) -> List['transcendence.TranscendenceGame']:
+        return [self.get_game(index) for index in range(len(self))]
+
+    def _build_game(self, index: int, board_type: type, game_type: type):
+        int_to_card = medium._CardConstants.INT_TO_CARD
+        board = board_type(self.width, self.height)
+        for cell, value in enumerate(self.tiles[index]):
+            x, y = board.position(cell)
+            board._setup_board_tile(x, y, Tile(int(value)))
+        game = game_type(board)
+
+        def make_card(card_id, level):
+            return int_to_card[int(card_id)](cards.CardLevel(int(level)))
+
+        game.hand_left = make_card(self.hands[index, 0],
+                                   self.hand_levels[index, 0])
+        game.hand_right = make_card(self.hands[index, 1],
+                                    self.hand_levels[index, 1])
+        game.hand_queue = [make_card(card_id, level) for card_id, level
+                           in zip(self.queues[index], self.queue_levels[index])]
+        game.hand_queue_size = self.queues.shape[1]
+        game.turns_left = int(self.turns_left[index])
+        game.changes_left = int(self.changes_left[index])
+        return game
+
+    def is_finished(self) -> np.ndarray:
+        return ~IN_BREAKABLE[self.tiles].any(axis=1)
+
+    def is_over(self) -> np.ndarray:
+        return (self.turns_left <= 0) | self.is_finished()
+
+    def random_moves(self):
+        # Uniform over the moves of generators.MoveGenerator.get_valid_moves.
+        breakable = IN_BREAKABLE[self.tiles]
+        counts = breakable.sum(axis=1)
+        totals = 2 * counts + 2 * (self.changes_left > 0)
+        choices = np.floor(self.rng.random(len(self)) * totals).astype(np.int64)
+        is_change = choices >= 2 * counts
+        is_left = choices % 2 == 0
+        nth = choices // 2
+        cells = np.argmax(breakable.cumsum(axis=1) > nth[:, None], axis=1)
+        return is_left, cells, is_change
+
+    def step_random(self) -> None:
+        self.step(*self.random_moves())
+
+    def play_out(self, max_steps: int = None) -> np.ndarray:
+        steps = 0
+        while not self.is_over().all():
+            if max_steps is not None and steps >= max_steps:
+                break
+            self.step_random()
+            steps += 1
+        return self.is_finished()
+
+    def step(self,
+             is_left: np.ndarray,
+             cells: np.ndarray,
+             is_change: np.ndarray) -> None:
+        # Applies one move to every game that is not over. Moves of games
+        # that are over are ignored.
+        is_left = np.asarray(is_left, dtype=bool)
+        cells = np.asarray(cells, dtype=np.int64)
+        is_change = np.asarray(is_change, dtype=bool)
+        games = np.flatnonzero(~self.is_over())
+        if self.cross_check:
+            before = self._copy_state()
+            self._script = {int(game): {'hits': set(), 'mystery': None,
+                                        'cards': [], 'special': None}
+                            for game in games}
+
+        sides = np.where(is_left[games], 0, 1)
+        changes = is_change[games]
+        self._play_cards(games[~changes], sides[~changes], cells[games[~changes]])
+        self._change_cards(games[changes], sides[changes])
+
+        if self.cross_check:
+            self._check_step(before, games, is_left, cells, is_change)
+            self._script = None
+
+    def _change_cards(self, games: np.ndarray, sides: np.ndarray) -> None:
+        self.hands[games, sides] = EMPTY
+        self.changes_left[games] -= 1
+        self._fix_hands(games)
+
+    def _play_cards(self,
+                    games: np.ndarray,
+                    sides: np.ndarray,
+                    origins: np.ndarray) -> None:
+        if not games.size:
+            return
+        tables = self._tables
+        rows = np.arange(len(games))
+        card_ids = self.hands[games, sides].astype(np.int64)
+        levels = self.hand_levels[games, sides].astype(np.int64)
+        tiles = self.tiles[games]
+
+        # Hit tiles, as in cards.Card.get_hit_tiles.
+        hittable = HITTABLE[tiles]
+        distorted = tiles == Tile.DISTORTED.value
+        spares = (tables.spares_distorted_at_max[card_ids]
+                  & (levels == MAX_LEVEL))
+        hittable &= ~(distorted & spares[:, None])
+        probabilities = tables.probabilities[card_ids, levels, origins]
+        hits = hittable & (self.rng.random(tiles.shape) < probabilities)
+        hits[rows, origins] |= tables.always_hits_origin[card_ids]
+
+        lightning = np.flatnonzero(card_ids == LIGHTNING)
+        if lightning.size:
+            hits[lightning] = self._lightning_hits(
+                tiles[lightning], origins[lightning], levels[lightning])
+
+        if self._script is not None:
+            for row, game in enumerate(games):
+                self._script[int(game)]['hits'] = {
+                    self._position(cell) for cell in np.flatnonzero(hits[row])}
+
+        # Hit resolution, as in TranscendenceBoard.calculate_hit_tiles.
+        is_lightning = (card_ids == LIGHTNING)[:, None]
+        is_purify = (card_ids == PURIFY)[:, None]
+        destroyed = tiles == Tile.DESTROYED.value
+        unsupported = hits & ((~HITTABLE[tiles] & ~(destroyed & is_lightning))
+                              | (distorted & ~is_purify))
+        if unsupported.any():
+            raise NotImplementedError('Tile of type'
+                                      f' {Tile(int(tiles[unsupported][0]))}'
+                                      ' is not supported')
+
+        hit_values = np.where(hits, tiles, Tile.NONE.value)
+        hit_types = np.zeros((len(games), NUM_TILES), dtype=bool)
+        hit_types[rows[:, None], hit_values] = True
+        if hit_types[:, Tile.RELOCATION.value].any():
+            raise NotImplementedError()
+
+        tiles = np.where(hits & HITTABLE[tiles], Tile.DESTROYED.value, tiles)
+        tiles = np.where(hits & destroyed, Tile.NORMAL.value, tiles)
+        self.tiles[games] = tiles
+
+        # Special tile effects, in the order of TranscendenceGame.use_move.
+        others = 1 - sides
+        blessed = hit_types[:, Tile.BLESSING.value]
+        self.turns_left[games[blessed]] += 1
+        added = hit_types[:, Tile.ADDITION.value]
+        self.changes_left[games[added]] += 1
+        cloned = hit_types[:, Tile.CLONE.value]
+        self.hands[games[cloned], others[cloned]] = card_ids[cloned]
+        self.hand_levels[games[cloned], others[cloned]] = levels[cloned]
+        enhanced = hit_types[:, Tile.ENHANCEMENT.value]
+        self.hand_levels[games[enhanced], others[enhanced]] = np.minimum(
+            self.hand_levels[games[enhanced], others[enhanced]] + 1, MAX_LEVEL)
+        mystery = np.flatnonzero(hit_types[:, Tile.MYSTERY.value])
+        if mystery.size:
+            trees = self.rng.random(mystery.size) < 0.5
+            self.hands[games[mystery], others[mystery]] = np.where(
+                trees, TREE, OUTBURST)
+            self.hand_levels[games[mystery], others[mystery]] = MAX_LEVEL
+            if self._script is not None:
+                for game, tree in zip(games[mystery], trees):
+                    self._script[int(game)]['mystery'] = bool(tree)
+
+        self.hands[games, sides] = EMPTY
+        self._fix_hands(games)
+        self._set_special_tiles(games)
+        self.turns_left[games] -= 1
+
+    def _lightning_hits(self,
+                        tiles: np.ndarray,
+                        origins: np.ndarray,
+                        levels: np.ndarray) -> np.ndarray:
+        # As in cards.Lightning.use.
+        rows = np.arange(len(tiles))
+        origin_cells = np.zeros(tiles.shape, dtype=bool)
+        origin_cells[rows, origins] = True
+        additional_targets = self.rng.integers(
+            -1, self._tables.lightning_targets[levels] + 1)
+        keys = self.rng.random(tiles.shape)
+        hits = origin_cells.copy()
+
+        # Undo one tile from the destroyed tiles and the target.
+        undo = additional_targets < 0
+        pool = (tiles == Tile.DESTROYED.value) | origin_cells
+        chosen = np.argmax(np.where(pool, keys, -1.0), axis=1)
+        hits[rows[undo], chosen[undo]] ^= True
+
+        # Break a uniform sample of the other breakable tiles.
+        breakable = IN_BREAKABLE[tiles]
+        totals = np.clip(np.minimum(additional_targets,
+                                    breakable.sum(axis=1) - 1), 0, None)
+        candidates = breakable & ~origin_cells
+        ranks = np.argsort(np.argsort(np.where(candidates, keys, 2.0), axis=1),
+                           axis=1)
+        sampled = candidates & (ranks < totals[:, None])
+        hits[~undo] |= sampled[~undo]
+        return hits
+
+    def _fix_hands(self, games: np.ndarray) -> None:
+        # As in TranscendenceGame.fix_hand.
+        self._fold_hands(games)
+        self._refill_queues(games)
+        pending = games[(self.hands[games] == EMPTY).any(axis=1)]
+        while pending.size:
+            for side in (0, 1):
+                empty = pending[self.hands[pending, side] == EMPTY]
+                self.hands[empty, side] = self.queues[empty, 0]
+                self.hand_levels[empty, side] = self.queue_levels[empty, 0]
+                self.queues[empty, :-1] = self.queues[empty, 1:]
+                self.queue_levels[empty, :-1] = self.queue_levels[empty, 1:]
+                self.queues[empty, -1] = EMPTY
+            self._fold_hands(pending)
+            self._refill_queues(pending)
+            pending = pending[(self.hands[pending] == EMPTY).any(axis=1)]
+
+    def _fold_hands(self, games: np.ndarray) -> None:
+        hands = self.hands[games]
+        levels = self.hand_levels[games]
+        fold = ((hands != EMPTY).all(axis=1)
+                & (hands[:, 0] == hands[:, 1])
+                & (levels != MAX_LEVEL).all(axis=1))
+        folded = games[fold]
+        self.hands[folded, 1] = EMPTY
+        self.hand_levels[folded, 0] += 1
+
+    def _refill_queues(self, games: np.ndarray) -> None:
+        queues = self.queues[games]
+        rows, slots = np.nonzero(queues == EMPTY)
+        if not rows.size:
+            return
+        tables = self._tables
+        new_cards = self.rng.choice(tables.card_ids, size=rows.size,
+                                    p=tables.card_probabilities)
+        self.queues[games[rows], slots] = new_cards
+        self.queue_levels[games[rows], slots] = cards.CardLevel.NORMAL.value
+        if self._script is not None:
+            for game, card_id in zip(games[rows], new_cards):
+                self._script[int(game)]['cards'].append(int(card_id))
+
+    def _set_special_tiles(self, games: np.ndarray) -> None:
+        # As in TranscendenceBoard.set_special_tile.
+        tiles = self.tiles[games]
+        tiles[IS_SPECIAL[tiles]] = Tile.NORMAL.value
+        breakable = IN_BREAKABLE[tiles]
+        keys = np.where(breakable, self.rng.random(tiles.shape), -1.0)
+        cells = np.argmax(keys, axis=1)
+        has_breakable = breakable.any(axis=1)
+        tables = self._tables
+        new_tiles = self.rng.choice(tables.tile_values, size=len(games),
+                                    p=tables.tile_probabilities)
+        rows = np.flatnonzero(has_breakable)
+        tiles[rows, cells[rows]] = new_tiles[rows]
+        self.tiles[games] = tiles
+        if self._script is not None:
+            for row in rows:
+                self._script[int(games[row])]['special'] = (
+                    self._position(cells[row]), Tile(int(new_tiles[row])))
+
+    def _position(self, cell: int):
+        return (int(cell) % self.width, int(cell) // self.width)
+
+    # ----- Cross-checking against the object model -----
+    _STATE = ['tiles', 'hands', 'hand_levels', 'queues', 'queue_levels',
+              'turns_left', 'changes_left']
+
+    def _copy_state(self) -> 'BatchGame':
+        state = BatchGame.__new__(BatchGame)
+        state.__dict__.update(self.__dict__)
+        for name in self._STATE:
+            setattr(state, name, getattr(self, name).copy())
+        return state
+
+    def _check_step(self,
+                    before: 'BatchGame',
+                    games: np.ndarray,
+                    is_left: np.ndarray,
+                    cells: np.ndarray,
+                    is_change: np.ndarray) -> None:
+        # Replays the step through TranscendenceGame.use_move with the same
+        # random outcomes and compares the resulting states.
+        for game in games:
+            game = int(game)
+            script = self._script[game]
+            replay = before._build_game(game, _ScriptedBoard, _ScriptedGame)
+            replay.script = script
+            replay.board.script = script
+            card = replay.hand_left if is_left[game] else replay.hand_right
+            x, y = self._position(cells[game])
+            move = _ScriptedMove(card, x, y, is_left=bool(is_left[game]),
+                                 is_change=bool(is_change[game]))
+            move.hit_tiles = script['hits']
+            replay.use_move(move)
+
+            expected = BatchGame.from_games([replay])
+            for name in self._STATE:
+                actual = getattr(self, name)[game]
+                if not np.array_equal(getattr(expected, name)[0], actual):
+                    raise CrossCheckError(
+                        f'Game {game} diverged from the object model on'
+                        f' {name}: {actual} != {getattr(expected, name)[0]}')
+
+
+class _ScriptedMove(transcendence.TranscendenceMove):
+    def get_hit_tiles(self,
+                      board: 'transcendence.TranscendenceBoard',
+                      x: int,
+                      y: int,
+                      rng=None):
+        return set(self.hit_tiles)
+
+
+class _ScriptedBoard(transcendence.TranscendenceBoard):
+    def set_special_tile(self, rng=None, tile_table=None) -> None:
+        self._clear_special_tiles()
+        if self.script['special'] is not None:
+            (x, y), special_tile = self.script['special']
+            self.set_tile(x, y, special_tile)
+
+
+class _ScriptedGame(transcendence.TranscendenceGame):
+    def mystery(self, move: 'transcendence.TranscendenceMove') -> None:
+        result = cards.Tree() if self.script['mystery'] else cards.Outburst()
+        if move.is_left:
+            self.hand_right = result
+        else:
+            self.hand_left = result
+
+    def _refill_hand_queue(self) -> None:
+        int_to_card = medium._CardConstants.INT_TO_CARD
+        while len(self.hand_queue) < self.hand_queue_size:
+            card_id = self.script['cards'].pop(0)
+            self.hand_queue.append(int_to_card[card_id]())
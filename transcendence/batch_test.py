@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from . import batch
+from . import cards
+from . import transcendence
+
+
+class TestBatchGame(unittest.TestCase):
+    def test_round_trip(self):
+        board = transcendence.TranscendenceBoard(4, 3)
+        board.set_tile(1, 2, transcendence.Tile.DESTROYED)
+        board.set_tile(3, 0, transcendence.Tile.NONE)
+        game = transcendence.TranscendenceGame(board)
+        game.hand_left = cards.Hellfire(cards.CardLevel.ENHANCED)
+        game.turns_left = 5
+        game.changes_left = 2
+
+        result = batch.BatchGame.from_games([game]).get_game(0)
+        self.assertEqual(result.board.tiles, board.tiles)
+        self.assertEqual(result.hand_left, game.hand_left)
+        self.assertEqual(result.hand_right, game.hand_right)
+        self.assertListEqual(result.hand_queue, game.hand_queue)
+        self.assertEqual(result.turns_left, 5)
+        self.assertEqual(result.changes_left, 2)
+
+    def test_cross_check_random_playouts(self):
+        games = batch.BatchGame.new_games(100, 5, 5, 10, seed=0,
+                                          cross_check=True)
+        finished = games.play_out()
+        self.assertTrue(games.is_over().all())
+        self.assertEqual(finished.shape, (100,))
+
+    def test_change_folds_matching_cards(self):
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(3, 3))
+        game.hand_left = cards.Thunder()
+        game.hand_right = cards.Tornado()
+        game.hand_queue = [cards.Thunder(), cards.Tempest(), cards.Purify()]
+        game.turns_left = 1
+        games = batch.BatchGame.from_games([game], seed=0, cross_check=True)
+        games.step(np.array([False]), np.array([0]), np.array([True]))
+        result = games.get_game(0)
+        self.assertEqual(result.hand_left, cards.Thunder(cards.CardLevel.ENHANCED))
+        self.assertEqual(result.hand_right, cards.Tempest())
+        self.assertEqual(result.turns_left, 1)
+
+    def test_change_uses_a_change(self):
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(3, 3))
+        game.turns_left = 1
+        game.changes_left = 2
+        games = batch.BatchGame.from_games([game, game], seed=0,
+                                           cross_check=True)
+        games.step(np.array([True, True]), np.array([0, 0]),
+                   np.array([True, False]))
+        self.assertListEqual(list(games.changes_left), [1, 2])
+        self.assertEqual(games.get_game(0).changes_left, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
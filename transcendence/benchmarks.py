@@ -0,0 +1,268 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from . import cards
+from . import generators
+from . import medium
+from . import rollouts
+from . import transcendence
+
+# A case builds its state from a seeded rng and returns the function to time.
+# Cases that change their state restore it inside that function, so every
+# call does the same work.
+Case = Callable[[random.Random], Callable[[], object]]
+
+BOARD_SIZES = [(4, 4), (6, 6), (8, 8)]
+CARD_TYPES = [cards.Thunder, cards.Tornado, cards.Purify, cards.Tempest,
+              cards.Hellfire, cards.Shockwave, cards.Earthquake,
+              cards.TidalWave, cards.Explosion, cards.Lightning, cards.Tree,
+              cards.Outburst]
+
+
+def _make_game(width: int,
+               height: int,
+               rng: random.Random,
+               turns_left: int = 10) -> 'transcendence.TranscendenceGame':
+    # A board with a few destroyed tiles and a special tile, as it looks a
+    # few turns into a game.
+    board = transcendence.TranscendenceBoard(width, height)
+    for index in rng.sample(range(width * height), width * height // 8):
+        x, y = board.position(index)
+        board.set_tile(x, y, transcendence.Tile.DESTROYED)
+    board.set_special_tile(rng)
+    game = transcendence.TranscendenceGame(board, rng=rng.getrandbits(32))
+    game.turns_left = turns_left
+    game.changes_left = 2
+    return game
+
+
+def _card_use(card_type: type, level: 'cards.CardLevel') -> Case:
+    def setup(rng: random.Random) -> Callable[[], object]:
+        game = _make_game(8, 8, rng)
+        card = card_type(level)
+        x, y = sorted(game.board.breakable_tiles)[0]
+        return lambda: card.use(game.board, x, y, rng)
+    return setup
+
+
+def _calculate_hit_tiles(rng: random.Random) -> Callable[[], object]:
+    game = _make_game(8, 8, rng)
+    board = game.board
+    x, y = sorted(board.breakable_tiles)[0]
+    hit_tiles = cards.Thunder(cards.CardLevel.MAX).use(board, x, y, rng)
+    snapshot = board.snapshot()
+
+    def run():
+        board.restore(snapshot)
+        return board.calculate_hit_tiles(hit_tiles, cards.Thunder)
+    return run
+
+
+def _set_special_tile(rng: random.Random) -> Callable[[], object]:
+    board = _make_game(8, 8, rng).board
+    return lambda: board.set_special_tile(rng)
+
+
+def _fix_hand(rng: random.Random) -> Callable[[], object]:
+    # Both hand slots are emptied, so the queue is drawn from and refilled.
+    game = _make_game(8, 8, rng)
+
+    def run():
+        game.hand_left = None
+        game.hand_right = None
+        game.hand_queue = game.hand_queue[:1]
+        game.fix_hand()
+    return run
+
+
+def _get_valid_moves(width: int, height: int) -> Case:
+    def setup(rng: random.Random) -> Callable[[], object]:
+        game = _make_game(width, height, rng)
+        return lambda: generators.MoveGenerator.get_valid_moves(game)
+    return setup
+
+
+def _json_round_trip(rng: random.Random) -> Callable[[], object]:
+    game = _make_game(8, 8, rng)
+    return lambda: medium.ToJson.json_to_game(medium.ToJson.game_to_json(game))
+
+
+def _playout(width: int, height: int) -> Case:
+    def setup(rng: random.Random) -> Callable[[], object]:
+        # The same game is played every call.
+        game = _make_game(width, height, rng)
+        snapshot = game.snapshot()
+        seed = rng.getrandbits(32)
+
+        def run():
+            game.restore(snapshot)
+            game.rng = random.Random(seed)
+            return rollouts.play_out(game)
+        return run
+    return setup
+
+
+def get_cases() -> Dict[str, Case]:
+    cases = {}
+    for card_type in CARD_TYPES:
+        for level in cards.CardLevel:
+            name = f'card_use.{card_type.__name__}.{level.name}'
+            cases[name] = _card_use(card_type, level)
+    cases['board.calculate_hit_tiles'] = _calculate_hit_tiles
+    cases['board.set_special_tile'] = _set_special_tile
+    cases['game.fix_hand'] = _fix_hand
+    for width, height in BOARD_SIZES:
+        cases[f'moves.get_valid_moves.{width}x{height}'] = _get_valid_moves(
+            width, height)
+    cases['json.round_trip'] = _json_round_trip
+    for width, height in BOARD_SIZES:
+        cases[f'playout.random.{width}x{height}'] = _playout(width, height)
+    return cases
+
+
+def _calibrate(run: Callable[[], object], min_time: float) -> int:
+    # Calls per repeat so that one repeat takes at least min_time.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def _measure_memory(run: Callable[[], object],
+                    number: int) -> Tuple[float, int]:
+    # Blocks retained by each call, on average, and the most memory any one
+    # call had allocated at once, from tracemalloc. tracemalloc only sees
+    # live blocks, so blocks a call allocates and frees again are not in the
+    # retained count; a case that only churns temporaries retains about 0
+    # blocks and shows its allocations in the peak bytes instead.
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        peak_bytes = 0
+        for _ in range(number):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_bytes = max(peak_bytes, peak - current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff
+                 for stat in after.compare_to(before, 'filename'))
+    return max(blocks, 0) / number, peak_bytes
+
+
+def run_case(name: str,
+             case: Case,
+             seed: int = 0,
+             repeat: int = 5,
+             min_time: float = 0.05) -> dict:
+    run = case(random.Random(f'{seed}:{name}'))
+    number = _calibrate(run, min_time)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    retained_blocks, peak_bytes = _measure_memory(run, min(number, 100))
+    return {
+        'name': name,
+        'number': number,
+        'repeat': repeat,
+        'best': min(times),
+        'median': statistics.median(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'retained_blocks': retained_blocks,
+        'peak_bytes': peak_bytes,
+    }
+
+
+def run_benchmarks(names: Iterable[str] = None,
+                   seed: int = 0,
+                   repeat: int = 5,
+                   min_time: float = 0.05) -> dict:
+    cases = get_cases()
+    if names is None:
+        names = list(cases)
+    unknown = [name for name in names if name not in cases]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks {unknown}')
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': [run_case(name, cases[name], seed, repeat, min_time)
+                    for name in names],
+    }
+
+
+def compare(baseline: dict, results: dict) -> List[Tuple[str, float]]:
+    # Ratio of the best time of every case to the baseline. Above 1 is slower.
+    baseline_times = {result['name']: result['best']
+                      for result in baseline['results']}
+    return [(result['name'], result['best'] / baseline_times[result['name']])
+            for result in results['results']
+            if baseline_times.get(result['name'])]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the hot paths of the simulator.')
+    parser.add_argument('names', nargs='*',
+                        help='Prefixes of the benchmarks to run')
+    parser.add_argument('--output', help='File to write the JSON results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='Ratio to the baseline reported as a regression')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05)
+    parser.add_argument('--list', action='store_true',
+                        help='List the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    cases = get_cases()
+    if args.list:
+        print('\n'.join(cases))
+        return 0
+    names = [name for name in cases
+             if not args.names or name.startswith(tuple(args.names))]
+    results = run_benchmarks(names, args.seed, args.repeat, args.min_time)
+    for result in results['results']:
+        print(f"{result['name']:<40} {result['best'] * 1e6:>12.2f} us"
+              f" {result['retained_blocks']:>10.1f} retained"
+              f" {result['peak_bytes']:>12.0f} B")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = 0
+        for name, ratio in compare(baseline, results):
+            flag = ''
+            if ratio > args.threshold:
+                flag = ' REGRESSION'
+                regressions += 1
+            print(f'{name:<40} {ratio:>8.2f}x{flag}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
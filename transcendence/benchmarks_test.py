@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout
+from io import StringIO
+
+from . import benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_every_case_runs(self):
+        results = benchmarks.run_benchmarks(repeat=1, min_time=0)
+        names = [result['name'] for result in results['results']]
+        self.assertEqual(names, list(benchmarks.get_cases()))
+        for result in results['results']:
+            self.assertGreater(result['best'], 0)
+
+    def test_retained_blocks(self):
+        kept = []
+        retained, peak = benchmarks._measure_memory(
+            lambda: kept.append(object()), 50)
+        self.assertGreaterEqual(retained, 1)
+        retained, peak = benchmarks._measure_memory(
+            lambda: [object() for _ in range(100)], 50)
+        self.assertLess(retained, 1)
+        self.assertGreater(peak, 100 * 16)
+
+    def test_unknown_case(self):
+        with self.assertRaises(ValueError):
+            benchmarks.run_benchmarks(['missing'])
+
+    def test_compare_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            args = ['game.fix_hand', '--repeat', '1', '--min-time', '0']
+            with redirect_stdout(StringIO()):
+                self.assertEqual(benchmarks.main(args + ['--output', path]), 0)
+            with open(path) as results_file:
+                results = json.load(results_file)
+            self.assertEqual([result['name'] for result in results['results']],
+                             ['game.fix_hand'])
+
+            slower = dict(results)
+            slower['results'] = [dict(result, best=result['best'] / 2)
+                                 for result in results['results']]
+            self.assertEqual(benchmarks.compare(slower, results),
+                             [('game.fix_hand', 2.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,15 @@
 from enum import Enum
+from typing import FrozenSet
 from typing import Set
 from typing import Dict
 from typing import Tuple
 from typing import List
 
+from . import kernels
+from . import randomness
 from . import transcendence
 
+import itertools
 import random
 
 # TODO: Add levels to string
@@ -15,35 +19,124 @@ class CardLevel(Enum):
     MAX = 2
 
 
+def _falloff(distance: int) -> float:
+    return max(0.1, 1 - (0.15 * distance))
+
+
 class Card:
+    # Offsets mapped to break probabilities per level. Cards whose footprint
+    # is not a fixed table override get_footprint instead.
+    BREAKS: Dict[Tuple, List] = None
+    # Whether the targeted tile is hit even when it is not breakable.
+    ALWAYS_HITS_ORIGIN = False
+    # Whether a max level card leaves distorted tiles alone.
+    SPARES_DISTORTED_AT_MAX = False
+    # Whether the card hits the same tiles, in distribution, under every
+    # mirroring and rotation of the board. None if it depends on the
+    # footprint, which MoveGenerator then checks.
+    SYMMETRIC = None
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         self.level = level
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        raise NotImplementedError()
+    @classmethod
+    def get_footprint(cls,
+                      level: CardLevel,
+                      width: int,
+                      height: int,
+                      x: int,
+                      y: int) -> Dict[Tuple, float]:
+        if cls.BREAKS is None:
+            raise NotImplementedError()
+        return {(x + dx, y + dy): probabilities[level.value]
+                for (dx, dy), probabilities in cls.BREAKS.items()}
+
+    def get_kernel(self, board: 'transcendence.TranscendenceBoard') -> 'kernels.CardKernel':
+        return kernels.KernelRegistry.get_kernel(
+            type(self), self.level, board.width, board.height,
+            board.unusable_mask)
+
+    def use(self,
+            board: 'transcendence.TranscendenceBoard',
+            x: int,
+            y: int,
+            rng: 'randomness.RandomLike' = random) -> Set[tuple]:
+        return self.get_hit_tiles(board, x, y, self.get_kernel(board), rng)
 
     def enhance(self) -> None:
         if not self.level is CardLevel.MAX:
             self.level = CardLevel(self.level.value + 1)
 
+    def hit_distribution(self,
+                         board: 'transcendence.TranscendenceBoard',
+                         x: int,
+                         y: int) -> Dict[Tuple, float]:
+        # Exact probability of each tile being in the set returned by use().
+        distribution = {(x, y): 1.0} if self.ALWAYS_HITS_ORIGIN else {}
+        breakable = self._get_breakable_mask(board)
+        for index, position, probability in self.get_kernel(board).footprint(x, y):
+            if probability > 0 and breakable >> index & 1:
+                distribution.setdefault(position, float(probability))
+        return distribution
+
+    def hit_outcomes(self,
+                     board: 'transcendence.TranscendenceBoard',
+                     x: int,
+                     y: int) -> Dict[FrozenSet[Tuple], float]:
+        # Every set use() can return, with its exact probability. Tiles that
+        # may or may not break do so independently.
+        certain = {(x, y)} if self.ALWAYS_HITS_ORIGIN else set()
+        breakable = self._get_breakable_mask(board)
+        uncertain = []
+        for index, position, probability in self.get_kernel(board).footprint(x, y):
+            if not breakable >> index & 1:
+                continue
+            if probability >= 1:
+                certain.add(position)
+            elif probability > 0:
+                uncertain.append((position, probability))
+
+        outcomes = {frozenset(certain): 1.0}
+        for position, probability in uncertain:
+            expanded = {}
+            for hit_tiles, outcome_probability in outcomes.items():
+                hit = hit_tiles | {position}
+                expanded[hit] = (expanded.get(hit, 0.0)
+                                 + outcome_probability * probability)
+                expanded[hit_tiles] = (expanded.get(hit_tiles, 0.0)
+                                       + outcome_probability * (1 - probability))
+            outcomes = expanded
+        return outcomes
+
+    def _get_breakable_mask(self, board: 'transcendence.TranscendenceBoard') -> int:
+        breakable = board.breakable_mask | board.distorted_mask
+        if self.SPARES_DISTORTED_AT_MAX and self.level is CardLevel.MAX:
+            breakable &= ~board.distorted_mask
+        return breakable
+
     def get_hit_tiles(self,
                       board: 'transcendence.TranscendenceBoard',
                       x: int,
                       y: int,
-                      breaks: Dict[Tuple, List]) -> Set[Tuple]:
-        hit_tiles = set()
-        for (dx, dy), probabilities in breaks.items():
-            tile = board.get(x + dx, y + dy)
-            if not tile:
+                      kernel: 'kernels.CardKernel',
+                      rng: 'randomness.RandomLike' = random) -> Set[Tuple]:
+        hit_tiles = {(x, y)} if self.ALWAYS_HITS_ORIGIN else set()
+        breakable = self._get_breakable_mask(board)
+
+        uncertain = []
+        for index, position, probability in kernel.footprint(x, y):
+            if not breakable >> index & 1:
                 continue
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-            
-            if random.random() < probabilities[self.level.value]:
-                if tile is transcendence.Tile.DISTORTED and self.level is CardLevel.MAX:
-                    continue
-                else:
-                    hit_tiles.add((x + dx, y + dy))
+            if probability >= 1:
+                hit_tiles.add(position)
+            elif probability > 0:
+                uncertain.append((position, probability))
+
+        # One batched draw for every tile that may or may not break.
+        draws = randomness.uniforms(rng, len(uncertain))
+        for (position, probability), draw in zip(uncertain, draws):
+            if draw < probability:
+                hit_tiles.add(position)
 
         return hit_tiles
 
@@ -52,136 +145,108 @@ class Card:
 
 
 class Thunder(Card):
+    BREAKS = {
+        (0, 0): [1, 1, 1],
+        (1, 0): [0.5, 1, 1],
+        (0, 1): [0.5, 1, 1],
+        (-1, 0): [0.5, 1, 1],
+        (0, -1): [0.5, 1, 1],
+    }
+    SPARES_DISTORTED_AT_MAX = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         self.level = level
-    
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0): [1, 1, 1],
-            (1, 0): [0.5, 1, 1],
-            (0, 1): [0.5, 1, 1],
-            (-1, 0): [0.5, 1, 1],
-            (0, -1): [0.5, 1, 1],
-        }
-
-        return super().get_hit_tiles(board, x, y, breaks)
 
     def __str__(self):
         return 'Thunder'
 
 
 class Tornado(Card):
+    BREAKS = {
+        (0, 0): [1, 1, 1],
+        (1, 1): [0.5, 1, 1],
+        (1, -1): [0.5, 1, 1],
+        (-1, 1): [0.5, 1, 1],
+        (-1, -1): [0.5, 1, 1],
+    }
+    SPARES_DISTORTED_AT_MAX = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
-    
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0): [1, 1, 1],
-            (1, 1): [0.5, 1, 1],
-            (1, -1): [0.5, 1, 1],
-            (-1, 1): [0.5, 1, 1],
-            (-1, -1): [0.5, 1, 1],
-        }
-
-        return super().get_hit_tiles(board, x, y, breaks)
 
     def __str__(self):
         return 'Tornado'
     
 
 class Purify(Card):
+    BREAKS = {
+        (0, 0): [1, 1, 1],
+        (1, 0): [0.5, 1, 1],
+        (-1, 0): [0.5, 1, 1],
+        (0, 1): [0, 0, 1],
+        (0, -1): [0, 0, 1],
+    }
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
-    
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0): [1, 1, 1],
-            (1, 0): [0.5, 1, 1],
-            (-1, 0): [0.5, 1, 1],
-            (0, 1): [0, 0, 1],
-            (0, -1): [0, 0, 1],
-        }
-
-        hit_tiles = set()
-        for (dx, dy), probabilities in breaks.items():
-            tile = board.get(x + dx, y + dy)
-            if not tile:
-                continue
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-            
-            if random.random() < probabilities[self.level.value]:
-                hit_tiles.add((x + dx, y + dy))
-
-        return hit_tiles
 
     def __str__(self):
         return 'Purify'
     
 
 class Tempest(Card):
+    ALWAYS_HITS_ORIGIN = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        hit_tiles = set()
-        hit_tiles.add((x, y))
-        for current_y in range(0, board.height):
-            tile = board.get(x, current_y)
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-
-            probability = max(0.1, 1 - (0.15 * abs(current_y - y)))
-            if random.random() < probability:
-                hit_tiles.add((x, current_y))
-
-        return hit_tiles
+    @classmethod
+    def get_footprint(cls,
+                      level: CardLevel,
+                      width: int,
+                      height: int,
+                      x: int,
+                      y: int) -> Dict[Tuple, float]:
+        return {(x, current_y): _falloff(abs(current_y - y))
+                for current_y in range(0, height)}
 
     def __str__(self):
         return 'Tempest'
 
 
 class Hellfire(Card):
+    BREAKS = {
+        (dx, dy): [1, 1, 1] if (dx, dy) == (0, 0) else [0.5, 1, 1]
+        for dx in range(-3, 4)
+        for dy in range(-3, 4)
+        if abs(dx) + abs(dy) <= 3
+    }
+    SPARES_DISTORTED_AT_MAX = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0): [1, 1, 1],
-        }
-        for x in range(4):
-            for y in range(4 - x):
-                if x == 0 and y == 0:
-                    continue
-                breaks[(x, y)] = [0.5, 1, 1]
-                breaks[(-x, y)] = [0.5, 1, 1]
-                breaks[(x, -y)] = [0.5, 1, 1]
-                breaks[(-x, -y)] = [0.5, 1, 1]
-
-        return super().get_hit_tiles(board, x, y, breaks)
-
     def __str__(self):
         return 'Hellfire'
 
 
 class Shockwave(Card):
+    BREAKS = {
+        (0, 0): [1, 1, 1],
+        (1, -1): [0.75, 1, 1],
+        (1, 0): [0.75, 1, 1],
+        (1, 1): [0.75, 1, 1],
+        (0, -1): [0.75, 1, 1],
+        (0, 1): [0.75, 1, 1],
+        (1, -1): [0.75, 1, 1],
+        (1, 0): [0.75, 1, 1],
+        (1, 1): [0.75, 1, 1],
+    }
+    SPARES_DISTORTED_AT_MAX = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0): [1, 1, 1],
-            (1, -1): [0.75, 1, 1],
-            (1, 0): [0.75, 1, 1],
-            (1, 1): [0.75, 1, 1],
-            (0, -1): [0.75, 1, 1],
-            (0, 1): [0.75, 1, 1],
-            (1, -1): [0.75, 1, 1],
-            (1, 0): [0.75, 1, 1],
-            (1, 1): [0.75, 1, 1],
-        }
-        return super().get_hit_tiles(board, x, y, breaks)
-
     def __str__(self):
         return 'Shockwave'
 
@@ -190,147 +255,189 @@ class Earthquake(Card):
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        hit_tiles = set()
-        for current_x in range(0, board.width):
-            tile = board.get(current_x, y)
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-
-            probability = max(0.1, 1 - (0.15 * abs(current_x - x)))
-            if random.random() < probability:
-                hit_tiles.add((current_x, y))
-
-        return hit_tiles
+    @classmethod
+    def get_footprint(cls,
+                      level: CardLevel,
+                      width: int,
+                      height: int,
+                      x: int,
+                      y: int) -> Dict[Tuple, float]:
+        return {(current_x, y): _falloff(abs(current_x - x))
+                for current_x in range(0, width)}
 
     def __str__(self):
         return 'Earthquake'
 
 
 class TidalWave(Card):
+    ALWAYS_HITS_ORIGIN = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        hit_tiles = set()
-        hit_tiles.add((x, y))
-        for current_x in range(0, board.width):
-            tile = board.get(current_x, y)
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-
-            probability = max(0.1, 1 - (0.15 * abs(current_x - x)))
-            if random.random() < probability:
-                hit_tiles.add((current_x, y))
-
-        for current_y in range(0, board.height):
-            tile = board.get(x, current_y)
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-
-            probability = max(0.1, 1 - (0.15 * abs(current_y - y)))
-            if random.random() < probability:
-                hit_tiles.add((x, current_y))
-
-        return hit_tiles
+    @classmethod
+    def get_footprint(cls,
+                      level: CardLevel,
+                      width: int,
+                      height: int,
+                      x: int,
+                      y: int) -> Dict[Tuple, float]:
+        footprint = Earthquake.get_footprint(level, width, height, x, y)
+        footprint.update(Tempest.get_footprint(level, width, height, x, y))
+        return footprint
 
     def __str__(self):
         return 'Tidal Wave'
 
 
 class Explosion(Card):
+    ALWAYS_HITS_ORIGIN = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        hit_tiles = set()
-        hit_tiles.add((x, y))
-        for delta in range(0, max(board.height, board.width)):
-            tiles = set([
-                (x + delta, y + delta),
-                (x - delta, y + delta),
-                (x + delta, y - delta),
-                (x - delta, y - delta),
-            ])
-            for cx, cy in tiles:
-                tile = board.get(cx, cy)
-                if not transcendence.Tile.is_breakable(tile):
-                    continue
-
-                probability = max(0.1, 1 - (0.15 * delta))
-                if random.random() < probability:
-                    hit_tiles.add((cx, cy))
-        
-        return hit_tiles
+    @classmethod
+    def get_footprint(cls,
+                      level: CardLevel,
+                      width: int,
+                      height: int,
+                      x: int,
+                      y: int) -> Dict[Tuple, float]:
+        # Each diagonal stops at the edge of the board.
+        footprint = {(x, y): _falloff(0)}
+        for dx, dy in [(1, 1), (-1, 1), (1, -1), (-1, -1)]:
+            reach = min(width - 1 - x if dx > 0 else x,
+                        height - 1 - y if dy > 0 else y)
+            for delta in range(1, reach + 1):
+                footprint[(x + dx * delta, y + dy * delta)] = _falloff(delta)
+        return footprint
 
     def __str__(self):
         return 'Explosion'
 
 
 class Lightning(Card):
+    TARGET_COUNT = [2, 4, 6]
+    SYMMETRIC = True
+
     def __init__(self, level: CardLevel=CardLevel.NORMAL):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
+    def use(self,
+            board: 'transcendence.TranscendenceBoard',
+            x: int,
+            y: int,
+            rng: 'randomness.RandomLike' = random) -> Set[tuple]:
         hit_tiles = {(x, y)}
-        target_count = [2, 4, 6]
-        additional_targets = random.randint(-1, target_count[self.level.value])
+        origin = board.index(x, y)
+        additional_targets = rng.randint(-1, self.TARGET_COUNT[self.level.value])
         if additional_targets < 0:
-            total_targets = min(-additional_targets, len(board.destroyed_tiles) + 1)
+            destroyed = board.destroyed_indices
+            total_targets = min(-additional_targets, len(destroyed) + 1)
             hit_tiles.symmetric_difference_update(
-                random.sample(board.destroyed_tiles.union({(x, y)}),
-                                k=total_targets))
+                board.position(index) for index
+                in destroyed.sample(total_targets, rng, include=origin))
         else:
-            total_targets = min(additional_targets, len(board.breakable_tiles) - 1)
+            breakable = board.breakable_indices
+            total_targets = min(additional_targets, len(breakable) - 1)
             hit_tiles.update(
-                random.sample(
-                    board.breakable_tiles.difference({(x, y)}),
-                    k=total_targets))
+                board.position(index) for index
+                in breakable.sample(max(total_targets, 0), rng, exclude=origin))
 
         return hit_tiles
 
+    def hit_distribution(self,
+                         board: 'transcendence.TranscendenceBoard',
+                         x: int,
+                         y: int) -> Dict[Tuple, float]:
+        # Averages over every outcome of the randint in use(), each of which
+        # samples uniformly without replacement.
+        max_targets = self.TARGET_COUNT[self.level.value]
+        outcome_probability = 1 / (max_targets + 2)
+        distribution = {(x, y): 0.0}
+
+        removal_pool = board.destroyed_tiles.union({(x, y)})
+        removed = min(1, len(board.destroyed_tiles) + 1) / len(removal_pool)
+        for position in removal_pool:
+            if position != (x, y):
+                distribution[position] = outcome_probability * removed
+        distribution[(x, y)] += outcome_probability * (1 - removed)
+
+        others = board.breakable_tiles.difference({(x, y)})
+        for additional_targets in range(0, max_targets + 1):
+            distribution[(x, y)] += outcome_probability
+            total_targets = max(0, min(additional_targets,
+                                       len(board.breakable_tiles) - 1))
+            if not total_targets:
+                continue
+            for position in others:
+                distribution[position] = (
+                    distribution.get(position, 0.0)
+                    + outcome_probability * total_targets / len(others))
+
+        return {position: probability
+                for position, probability in distribution.items()
+                if probability > 0}
+
+    def hit_outcomes(self,
+                     board: 'transcendence.TranscendenceBoard',
+                     x: int,
+                     y: int) -> Dict[FrozenSet[Tuple], float]:
+        # Each outcome of the randint in use() followed by every equally
+        # likely sample.
+        max_targets = self.TARGET_COUNT[self.level.value]
+        outcome_probability = 1 / (max_targets + 2)
+        outcomes = {}
+
+        def add(samples: List[Tuple], hit_tiles: Set[Tuple], operation) -> None:
+            for sample in samples:
+                hit = frozenset(operation(hit_tiles, sample))
+                outcomes[hit] = (outcomes.get(hit, 0.0)
+                                 + outcome_probability / len(samples))
+
+        removal_pool = sorted(board.destroyed_tiles.union({(x, y)}))
+        total_targets = min(1, len(board.destroyed_tiles) + 1)
+        add(list(itertools.combinations(removal_pool, total_targets)),
+            {(x, y)}, set.symmetric_difference)
+
+        others = sorted(board.breakable_tiles.difference({(x, y)}))
+        for additional_targets in range(0, max_targets + 1):
+            total_targets = min(additional_targets,
+                                len(board.breakable_tiles) - 1)
+            add(list(itertools.combinations(others, max(total_targets, 0))),
+                {(x, y)}, set.union)
+        return outcomes
+
     def __str__(self):
         return 'Lightning'
 
 
 class Tree(Card):
+    BREAKS = {
+        (0, 0): [1, 1, 1],
+        (1, 0): [1, 1, 1],
+        (2, 0): [1, 1, 1],
+        (-1, 0): [1, 1, 1],
+        (-2, 0): [1, 1, 1],
+        (0, 1): [1, 1, 1],
+        (0, 2): [1, 1, 1],
+        (0, -1): [1, 1, 1],
+        (0, -2): [1, 1, 1],
+    }
+
     def __init__(self, level: CardLevel=CardLevel.MAX):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        breaks = {
-            (0, 0),
-            (1, 0),
-            (2, 0),
-            (-1, 0),
-            (-2, 0),
-            (0, 1),
-            (0, 2),
-            (0, -1),
-            (0, -2),
-        }
-        hit_tiles = set()
-        for (dx, dy) in breaks:
-            tile = board.get(x + dx, y + dy)
-            if not tile:
-                continue
-            if not transcendence.Tile.is_breakable(tile):
-                continue
-            hit_tiles.add((x + dx, y + dy))
-
-        return hit_tiles
-
     def __str__(self):
         return 'World Tree'
 
 
 class Outburst(Card):
+    BREAKS = {}
+    ALWAYS_HITS_ORIGIN = True
+
     def __init__(self, level: CardLevel=CardLevel.MAX):
         super().__init__(level)
 
-    def use(self, board: 'transcendence.TranscendenceBoard', x: int, y: int) -> Set[tuple]:
-        hit_tiles = {(x, y)}
-        return hit_tiles
-
     def __str__(self):
-        return 'Outburst'
\ No newline at end of file
+        return 'Outburst'
@@ -0,0 +1,343 @@
+import argparse
+import importlib
+import json
+import math
+import sys
+
+from collections import Counter
+from statistics import NormalDist
+from typing import List, Tuple, Union
+
+from . import generators
+from . import layouts
+from . import randomness
+from . import rollouts
+from . import transcendence
+
+Policy = rollouts.Policy
+Layout = Union[str, 'layouts.BoardLayout']
+
+
+def _get_z(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(successes: int,
+                    trials: int,
+                    confidence: float = 0.95) -> Tuple[float, float]:
+    # Confidence interval of a success rate, which unlike the normal
+    # approximation stays inside [0, 1] and works for rates near either end.
+    if trials == 0:
+        return 0.0, 1.0
+    z = _get_z(confidence)
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    half_width = (z / denominator) * math.sqrt(
+        rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def make_game(layout: Layout,
+              turns: int,
+              changes: int = 0,
+              seed=None,
+              card_table: 'generators.AliasTable' = None,
+              tile_table: 'generators.AliasTable' = None
+    ) -> 'transcendence.TranscendenceGame':
+    # A fresh game on the layout with random hands and a special tile, all
+    # drawn from the game's rng. That is a StreamRandom seeded with seed, so
+    # games with the same seed draw the same cards and special tiles however
+    # they are played.
+    if isinstance(layout, str):
+        layout = layouts.get_layout(layout)
+    game = transcendence.TranscendenceGame(layout.create_board(),
+                                           rng=randomness.StreamRandom(seed),
+                                           card_table=card_table,
+                                           tile_table=tile_table)
+    game.hand_left = None
+    game.hand_right = None
+    game.hand_queue = []
+    game.fix_hand()
+    game.board.set_special_tile(randomness.get_stream(game.rng, 'tiles'),
+                                game.tile_table)
+    game.turns_left = turns
+    game.changes_left = changes
+    return game
+
+
+class Episode:
+    def __init__(self, seed: int, success: bool, turns_used: int,
+                 changes_used: int):
+        self.seed = seed
+        self.success = success
+        self.turns_used = turns_used
+        self.changes_used = changes_used
+
+
+def play_episode(policy: Policy,
+                 layout: Layout,
+                 turns: int,
+                 changes: int = 0,
+                 seed=None,
+                 card_table: 'generators.AliasTable' = None,
+                 tile_table: 'generators.AliasTable' = None) -> Episode:
+    game = make_game(layout, turns, changes, seed, card_table, tile_table)
+    turns_used = 0
+    changes_used = 0
+    while not game.is_over():
+        move = policy(game)
+        game.use_move(move)
+        if move.is_change:
+            changes_used += 1
+        else:
+            turns_used += 1
+    return Episode(seed, game.board.is_finished(), turns_used, changes_used)
+
+
+class PolicyStats:
+    # Outcomes of a policy's episodes: the success rate, and how many turns
+    # and changes the episodes used, kept as distributions.
+    def __init__(self, name: str = None):
+        self.name = name
+        self.episodes = 0
+        self.successes = 0
+        self.turns_used = Counter()
+        self.success_turns_used = Counter()
+        self.changes_used = Counter()
+        self.stop_reason: str = None
+
+    def add(self, episode: Episode) -> None:
+        self.episodes += 1
+        self.successes += episode.success
+        self.turns_used[episode.turns_used] += 1
+        self.changes_used[episode.changes_used] += 1
+        if episode.success:
+            self.success_turns_used[episode.turns_used] += 1
+
+    def get_success_rate(self) -> float:
+        return self.successes / self.episodes if self.episodes else 0.0
+
+    def get_success_interval(self,
+                             confidence: float = 0.95) -> Tuple[float, float]:
+        return wilson_interval(self.successes, self.episodes, confidence)
+
+    def get_turns_interval(self,
+                           confidence: float = 0.95,
+                           successes_only: bool = False
+        ) -> Tuple[float, float, float]:
+        # Mean turns used with a normal approximation interval, as
+        # (mean, low, high).
+        counts = self.success_turns_used if successes_only else self.turns_used
+        total = sum(counts.values())
+        if total == 0:
+            return 0.0, 0.0, 0.0
+        mean = sum(turns * count for turns, count in counts.items()) / total
+        if total == 1:
+            return mean, -math.inf, math.inf
+        variance = (sum(count * (turns - mean) ** 2
+                        for turns, count in counts.items()) / (total - 1))
+        half_width = _get_z(confidence) * math.sqrt(variance / total)
+        return mean, mean - half_width, mean + half_width
+
+    def to_dict(self, confidence: float = 0.95) -> dict:
+        return {
+            'name': self.name,
+            'episodes': self.episodes,
+            'successes': self.successes,
+            'success_rate': self.get_success_rate(),
+            'success_interval': self.get_success_interval(confidence),
+            'turns_used': self.get_turns_interval(confidence),
+            'success_turns_used': self.get_turns_interval(confidence, True),
+            'turns_used_distribution': dict(sorted(self.turns_used.items())),
+            'changes_used_distribution': dict(sorted(self.changes_used.items())),
+            'stop_reason': self.stop_reason,
+        }
+
+    def __str__(self) -> str:
+        low, high = self.get_success_interval()
+        mean, turns_low, turns_high = self.get_turns_interval()
+        lines = [f'{self.name or "policy"}: {self.get_success_rate():.4f}'
+                 f' success [{low:.4f}, {high:.4f}] over {self.episodes}'
+                 f' episodes ({self.stop_reason})',
+                 f' turns used {mean:.2f} [{turns_low:.2f}, {turns_high:.2f}]']
+        for turns, count in sorted(self.turns_used.items()):
+            lines.append(f' {turns:>4} {count / self.episodes:>7.2%}'
+                         f' {self.success_turns_used[turns] / count:>7.2%} won')
+        return '\n'.join(lines)
+
+
+def evaluate_policy(policy: Policy,
+                    layout: Layout,
+                    turns: int,
+                    changes: int = 0,
+                    precision: float = 0.01,
+                    confidence: float = 0.95,
+                    min_episodes: int = 100,
+                    max_episodes: int = 100000,
+                    seed=0,
+                    name: str = None) -> PolicyStats:
+    # Plays seeded episodes until the success rate interval is at most
+    # precision wide on either side, or max_episodes were played. Episode i
+    # is seeded from (seed, i), so runs with the same seed play the same
+    # games.
+    stats = PolicyStats(name)
+    stats.stop_reason = 'max_episodes'
+    for episode in range(max_episodes):
+        stats.add(play_episode(policy, layout, turns, changes,
+                               randomness.derive_seed(seed, episode)))
+        if stats.episodes >= min_episodes:
+            low, high = stats.get_success_interval(confidence)
+            if (high - low) / 2 <= precision:
+                stats.stop_reason = 'precision'
+                break
+    return stats
+
+
+class SequentialTest:
+    # Sequential probability ratio test of whether the first of two policies
+    # wins more often, on paired episodes. Only pairs where exactly one
+    # policy succeeded count; among those, the first policy's share of wins
+    # is tested for 0.5 - delta (the second is better) against 0.5 + delta
+    # (the first is better), with error rates alpha and beta.
+    def __init__(self, delta: float = 0.1, alpha: float = 0.05,
+                 beta: float = 0.05):
+        if not 0 < delta < 0.5:
+            raise ValueError('delta must be between 0 and 0.5')
+        self.delta = delta
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.llr = 0.0
+        self.first_wins = 0
+        self.second_wins = 0
+        self._win_step = math.log((0.5 + delta) / (0.5 - delta))
+
+    def add(self, first_success: bool, second_success: bool) -> None:
+        if first_success and not second_success:
+            self.first_wins += 1
+            self.llr += self._win_step
+        elif second_success and not first_success:
+            self.second_wins += 1
+            self.llr -= self._win_step
+
+    def get_decision(self) -> str:
+        # 'first' or 'second' once the better policy is settled, else None.
+        if self.llr >= self.upper:
+            return 'first'
+        if self.llr <= self.lower:
+            return 'second'
+        return None
+
+
+class Comparison:
+    def __init__(self, first: PolicyStats, second: PolicyStats,
+                 test: SequentialTest):
+        self.first = first
+        self.second = second
+        self.test = test
+
+    def get_decision(self) -> str:
+        return self.test.get_decision()
+
+    def to_dict(self, confidence: float = 0.95) -> dict:
+        return {'first': self.first.to_dict(confidence),
+                'second': self.second.to_dict(confidence),
+                'decision': self.get_decision(),
+                'llr': self.test.llr,
+                'first_wins': self.test.first_wins,
+                'second_wins': self.test.second_wins}
+
+    def __str__(self) -> str:
+        return (f'{self.first}\n{self.second}\n'
+                f'decision: {self.get_decision() or "inconclusive"}'
+                f' (llr {self.test.llr:.3f},'
+                f' {self.test.first_wins} to {self.test.second_wins})')
+
+
+def compare_policies(first: Policy,
+                     second: Policy,
+                     layout: Layout,
+                     turns: int,
+                     changes: int = 0,
+                     delta: float = 0.1,
+                     alpha: float = 0.05,
+                     beta: float = 0.05,
+                     max_episodes: int = 100000,
+                     seed=0,
+                     names: Tuple[str, str] = (None, None)) -> Comparison:
+    # Plays both policies on the same seeded games until the sequential test
+    # settles which one is better, or max_episodes pairs were played.
+    comparison = Comparison(PolicyStats(names[0]), PolicyStats(names[1]),
+                            SequentialTest(delta, alpha, beta))
+    reason = 'max_episodes'
+    for episode in range(max_episodes):
+        game_seed = randomness.derive_seed(seed, episode)
+        first_episode = play_episode(first, layout, turns, changes, game_seed)
+        second_episode = play_episode(second, layout, turns, changes, game_seed)
+        comparison.first.add(first_episode)
+        comparison.second.add(second_episode)
+        comparison.test.add(first_episode.success, second_episode.success)
+        if comparison.get_decision() is not None:
+            reason = 'sequential_test'
+            break
+    comparison.first.stop_reason = comparison.second.stop_reason = reason
+    return comparison
+
+
+def load_policy(spec: str) -> Policy:
+    # 'module:attribute.path', e.g.
+    # 'transcendence.generators:MoveGenerator.get_random_move'.
+    module_name, _, attributes = spec.partition(':')
+    if not attributes:
+        raise ValueError(f'Expected module:attribute, got {spec!r}')
+    policy = importlib.import_module(module_name)
+    for attribute in attributes.split('.'):
+        policy = getattr(policy, attribute)
+    return policy
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Evaluates one policy, or compares two, on seeded games.')
+    parser.add_argument('policies', nargs='+',
+                        help='One or two policies as module:attribute')
+    parser.add_argument('--layout', default='square6',
+                        choices=sorted(layouts.PRESETS))
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--changes', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--precision', type=float, default=0.01,
+                        help='Half width of the success interval to stop at')
+    parser.add_argument('--min-episodes', type=int, default=100)
+    parser.add_argument('--max-episodes', type=int, default=100000)
+    parser.add_argument('--delta', type=float, default=0.1,
+                        help='Share of won pairs above or below one half'
+                             ' that the comparison tests for')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--output', help='File to write the JSON results to')
+    args = parser.parse_args(argv)
+
+    if len(args.policies) > 2:
+        parser.error('At most two policies can be compared')
+    policies = [load_policy(spec) for spec in args.policies]
+    if len(policies) == 1:
+        result = evaluate_policy(policies[0], args.layout, args.turns,
+                                 args.changes, args.precision, args.confidence,
+                                 args.min_episodes, args.max_episodes,
+                                 args.seed, args.policies[0])
+    else:
+        result = compare_policies(policies[0], policies[1], args.layout,
+                                  args.turns, args.changes, args.delta,
+                                  args.alpha, args.beta, args.max_episodes,
+                                  args.seed, tuple(args.policies))
+    print(result)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result.to_dict(args.confidence), output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import unittest
+
+from . import evaluation
+from . import generators
+from . import layouts
+
+
+def _expected_breaks(game, move) -> float:
+    if move.is_change:
+        return -1.0
+    return sum(move.card.hit_distribution(game.board, move.x, move.y).values())
+
+
+def greedy(game):
+    return max(generators.MoveGenerator.get_valid_moves(game),
+               key=lambda move: _expected_breaks(game, move))
+
+
+def wasteful(game):
+    return min(generators.MoveGenerator.get_valid_moves(game),
+               key=lambda move: _expected_breaks(game, move) % 100)
+
+
+class TestEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.layout = layouts.BoardLayout('small', ['###', '###'])
+
+    def test_wilson_interval(self):
+        low, high = evaluation.wilson_interval(5, 10)
+        self.assertAlmostEqual(low + high, 1.0)
+        self.assertAlmostEqual(evaluation.wilson_interval(0, 10)[0], 0.0)
+        self.assertLess(evaluation.wilson_interval(50, 100)[1], high)
+
+    def test_stops_at_precision(self):
+        stats = evaluation.evaluate_policy(
+            generators.MoveGenerator.get_random_move, self.layout, 3,
+            precision=0.1, min_episodes=20, seed=1)
+        self.assertEqual(stats.stop_reason, 'precision')
+        low, high = stats.get_success_interval()
+        self.assertLessEqual((high - low) / 2, 0.1)
+        self.assertEqual(sum(stats.turns_used.values()), stats.episodes)
+
+        again = evaluation.evaluate_policy(
+            generators.MoveGenerator.get_random_move, self.layout, 3,
+            precision=0.1, min_episodes=20, seed=1)
+        self.assertEqual(again.to_dict(), stats.to_dict())
+
+    def test_sequential_comparison(self):
+        comparison = evaluation.compare_policies(greedy, wasteful, self.layout,
+                                                 3, max_episodes=1000)
+        self.assertEqual(comparison.get_decision(), 'first')
+        self.assertLess(comparison.first.episodes, 1000)
+        self.assertEqual(comparison.first.stop_reason, 'sequential_test')
+
+        tie = evaluation.compare_policies(greedy, greedy, self.layout, 3,
+                                          max_episodes=20)
+        self.assertIsNone(tie.get_decision())
+        self.assertEqual(tie.first.episodes, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
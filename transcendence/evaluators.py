@@ -0,0 +1,36 @@
+from typing import Any, List
+
+from . import generators
+from . import rollouts
+from . import transcendence
+
+
+class LeafEvaluator:
+    # Estimates the chance of clearing the board from the leaves of a
+    # search. The search calls prepare while the game is at a leaf and then
+    # evaluate once with what prepare returned for a batch of leaves, so an
+    # evaluator can do the costly part once per batch. prepare may change
+    # the game, which the search restores afterwards, but what it returns
+    # must not refer to the game.
+    def prepare(self, game: 'transcendence.TranscendenceGame') -> Any:
+        raise NotImplementedError()
+
+    def evaluate(self, prepared: List[Any]) -> List[float]:
+        raise NotImplementedError()
+
+    def __call__(self, game: 'transcendence.TranscendenceGame') -> float:
+        return self.evaluate([self.prepare(game)])[0]
+
+
+class PlayoutEvaluator(LeafEvaluator):
+    # Plays every leaf to the end with a policy, which is all the work, so
+    # batching gains nothing.
+    def __init__(self,
+                 policy: rollouts.Policy = generators.MoveGenerator.get_random_move):
+        self.policy = policy
+
+    def prepare(self, game: 'transcendence.TranscendenceGame') -> float:
+        return rollouts.play_out(game, self.policy)
+
+    def evaluate(self, prepared: List[float]) -> List[float]:
+        return prepared
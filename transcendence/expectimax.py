@@ -0,0 +1,342 @@
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterator, List, Sequence, Tuple
+
+from . import cards
+from . import generators
+from . import mcts
+from . import transcendence
+from . import zobrist
+
+
+class _PendingCard(cards.Card):
+    # A card that was drawn into the queue but not looked at yet. Draws do
+    # not depend on the state, so which card it is only needs to be decided
+    # once it is popped into a hand; until then every pending card hashes
+    # the same.
+    def __str__(self):
+        return 'Pending'
+
+
+class _Branch(Exception):
+    # Raised by _ChanceScript at a random draw it has no outcome for yet.
+    def __init__(self, count: int):
+        super().__init__(count)
+        self.count = count
+
+
+class _ChanceScript:
+    # Stands in for the game's rng and tables during one run of use_move.
+    # Each discrete draw takes the next outcome index from choices,
+    # multiplying in its probability. Without collapse, running out of
+    # choices raises _Branch so the caller can try every outcome; with
+    # collapse, the first outcome is taken and the probability is left
+    # alone. Card draws are pending cards unless resolutions says otherwise.
+    def __init__(self,
+                 choices: List[int],
+                 resolutions: Dict[Hashable, Tuple[type, float]],
+                 collapse: bool = False):
+        self.choices = choices
+        self.resolutions = resolutions
+        self.collapse = collapse
+        self.position = 0
+        self.probability = 1.0
+        for _, probability in resolutions.values():
+            self.probability *= probability
+        # (resolution key, card) of every pending card the run started with
+        # or drew.
+        self.pending: List[Tuple[Hashable, cards.Card]] = []
+        self.draws = 0
+
+    def _choose(self, outcomes: Sequence[Tuple[Any, float]]) -> Any:
+        if self.collapse:
+            return outcomes[0][0]
+        if self.position == len(self.choices):
+            raise _Branch(len(outcomes))
+        value, probability = outcomes[self.choices[self.position]]
+        self.position += 1
+        self.probability *= probability
+        return value
+
+    def _choose_uniform(self, values: Sequence[Any]) -> Any:
+        return self._choose([(value, 1 / len(values)) for value in values])
+
+    def choice(self, values: Sequence[Any]) -> Any:
+        return self._choose_uniform(values)
+
+    def randrange(self, count: int) -> int:
+        return self._choose_uniform(range(count))
+
+    def random(self) -> float:
+        raise NotImplementedError('Continuous draws can not be enumerated')
+
+    def resolve_queue(self, game: 'transcendence.TranscendenceGame') -> None:
+        for slot, card in enumerate(game.hand_queue):
+            if isinstance(card, _PendingCard):
+                key = ('queue', slot)
+                if key in self.resolutions:
+                    card = self.resolutions[key][0]()
+                    game.hand_queue[slot] = card
+                self.pending.append((key, card))
+
+    def draw_card(self) -> cards.Card:
+        key = ('draw', self.draws)
+        self.draws += 1
+        if key in self.resolutions:
+            card = self.resolutions[key][0]()
+        else:
+            card = _PendingCard()
+        self.pending.append((key, card))
+        return card
+
+    def get_popped(self,
+                   game: 'transcendence.TranscendenceGame') -> Hashable:
+        # The first pending card that left the queue for a hand, if any.
+        for key, card in self.pending:
+            if (isinstance(card, _PendingCard)
+                    and not any(card is queued for queued in game.hand_queue)):
+                return key
+        return None
+
+
+class _ScriptedTable:
+    # Draws the values of a weight table through a _ChanceScript.
+    def __init__(self, weights: Dict[Any, float], script: _ChanceScript):
+        self.outcomes = _normalize(weights)
+        self.script = script
+
+    def draw(self, rng: Any = None) -> Any:
+        return self.script._choose(self.outcomes)
+
+
+class _PendingCardTable:
+    # Card tables draw card types, which CardGenerator then instantiates.
+    def __init__(self, script: _ChanceScript):
+        self.script = script
+
+    def draw(self, rng: Any = None) -> Callable[[], cards.Card]:
+        return self.script.draw_card
+
+
+def _xor(values: Iterator[int]) -> int:
+    result = 0
+    for value in values:
+        result ^= value
+    return result
+
+
+def _normalize(weights: Dict[Any, float]) -> List[Tuple[Any, float]]:
+    total = sum(weight for weight in weights.values() if weight > 0)
+    return [(value, weight / total)
+            for value, weight in weights.items() if weight > 0]
+
+
+def _map_move_key(board: 'transcendence.TranscendenceBoard',
+                  move_key: 'generators.MoveKey',
+                  permutation: Sequence[int],
+                  inverse: bool = False) -> 'generators.MoveKey':
+    # The move key with its target moved by the tile permutation, or by its
+    # inverse.
+    if move_key is None or permutation is None or move_key[0] is None:
+        return move_key
+    x, y, is_left, is_change = move_key
+    index = board.index(x, y)
+    index = permutation.index(index) if inverse else permutation[index]
+    return board.position(index) + (is_left, is_change)
+
+
+class ExpectimaxSolver:
+    # Exact success probability and best move by expectimax over every hit,
+    # card draw, mystery and special tile outcome, memoized on state keys.
+    # Only practical for small boards with few turns left.
+    def __init__(self, capacity: int = 1 << 22):
+        self.table = zobrist.TranspositionTable(capacity)
+        self.states_explored = 0
+        # States on the current search path. Lightning can undo a destroyed
+        # tile while breaking a blessing, which may repeat a state; such a
+        # repeat is scored as a failure rather than recursing forever, which
+        # makes values on such cycles a lower bound.
+        self._path = set()
+
+    def get_hit_rate(self) -> float:
+        return self.table.get_hit_rate()
+
+    def clear(self) -> None:
+        self.table.clear()
+        self.states_explored = 0
+
+    def get_value(self, game: 'transcendence.TranscendenceGame') -> float:
+        return self.solve(game)[0]
+
+    def best_move(self,
+                  game: 'transcendence.TranscendenceGame'
+        ) -> 'transcendence.TranscendenceMove':
+        if game.is_over():
+            raise ValueError('The game is already over')
+        return mcts.make_move(game, self.solve(game)[1])
+
+    def solve(self,
+              game: 'transcendence.TranscendenceGame'
+        ) -> Tuple[float, 'generators.MoveKey']:
+        # The probability of clearing the board with optimal play, and the
+        # move that achieves it. The game is left as it was.
+        if game.board.is_finished():
+            return 1.0, None
+        if game.turns_left <= 0:
+            return 0.0, None
+
+        key, permutation = self._get_canonical_key(game)
+        result = self.table.get(key)
+        if result is not None:
+            # Entries hold the move in the orientation of the key.
+            value, move_key = result
+            return value, _map_move_key(game.board, move_key, permutation,
+                                        inverse=True)
+        if key in self._path:
+            return 0.0, None
+
+        self.states_explored += 1
+        self._path.add(key)
+        try:
+            best = (-1.0, None)
+            for move_key in generators.MoveGenerator.iter_move_keys(game):
+                value = self.get_move_value(game, move_key)
+                if value > best[0]:
+                    best = (value, move_key)
+                    if value >= 1.0:
+                        break
+        finally:
+            self._path.discard(key)
+        self.table.put(key, (best[0], _map_move_key(game.board, best[1],
+                                                    permutation)))
+        return best
+
+    def get_move_value(self,
+                       game: 'transcendence.TranscendenceGame',
+                       move_key: 'generators.MoveKey') -> float:
+        move = mcts.make_move(game, move_key)
+        if move.is_change:
+            hits = {None: 1.0}
+        else:
+            hits = move.card.hit_outcomes(game.board, move.x, move.y)
+
+        board = game.board
+        last_turn = game.turns_left == 1 and not move.is_change
+        value = 0.0
+        for hit_tiles, hit_probability in hits.items():
+            if last_turn and not any(board.get(x, y) is transcendence.Tile.BLESSING
+                                     for x, y in hit_tiles):
+                # The game ends with this move, so only the board matters.
+                snapshot = board.snapshot()
+                board.calculate_hit_tiles(hit_tiles, type(move.card))
+                if board.is_finished():
+                    value += hit_probability
+                board.restore(snapshot)
+                continue
+            for probability in self._iter_outcomes(game, move, hit_tiles):
+                value += hit_probability * probability * self.solve(game)[0]
+        return min(value, 1.0)
+
+    def _iter_outcomes(self,
+                       game: 'transcendence.TranscendenceGame',
+                       move: 'transcendence.TranscendenceMove',
+                       hit_tiles: FrozenSet[Tuple]) -> Iterator[float]:
+        # Leaves the game in each possible state after the move in turn,
+        # yielding its probability, and restores it at the end. Whether the
+        # game ends depends only on the hits, so once it does the draws that
+        # follow are not enumerated.
+        snapshot = game.snapshot()
+        card_outcomes = _normalize(self._get_card_weights(game))
+        try:
+            self._use_move(game, move, hit_tiles, _ChanceScript([], {}, True))
+            if game.is_over():
+                yield 1.0
+                return
+
+            pending = [([], {})]
+            while pending:
+                choices, resolutions = pending.pop()
+                game.restore(snapshot)
+                script = _ChanceScript(choices, resolutions)
+                try:
+                    self._use_move(game, move, hit_tiles, script)
+                    count = None
+                except _Branch as branch:
+                    count = branch.count
+                # Pending cards that reached a hand are decided first, since
+                # the run after they were popped used them unresolved.
+                popped = script.get_popped(game)
+                if popped is not None:
+                    pending.extend(
+                        (choices, {**resolutions, popped: outcome})
+                        for outcome in card_outcomes)
+                elif count is not None:
+                    pending.extend((choices + [index], resolutions)
+                                   for index in range(count))
+                else:
+                    yield script.probability
+        finally:
+            game.restore(snapshot)
+
+    def _get_card_weights(self,
+                          game: 'transcendence.TranscendenceGame'
+        ) -> Dict[type, float]:
+        if game.card_table is not None:
+            return game.card_table.weights
+        return generators.CardGenerator.get_probabilities()
+
+    def _use_move(self,
+                  game: 'transcendence.TranscendenceGame',
+                  move: 'transcendence.TranscendenceMove',
+                  hit_tiles: FrozenSet[Tuple],
+                  script: _ChanceScript) -> None:
+        # Observers only see moves that are actually played.
+        rng, card_table, tile_table = game.rng, game.card_table, game.tile_table
+        observers = game.observers
+        script.resolve_queue(game)
+        game.observers = []
+        game.rng = script
+        game.card_table = _PendingCardTable(script)
+        game.tile_table = _ScriptedTable(
+            tile_table.weights if tile_table is not None
+            else generators.TileGenerator.get_probabilities(), script)
+        try:
+            game.use_move(move, None if hit_tiles is None else set(hit_tiles))
+        finally:
+            game.rng, game.card_table, game.tile_table = (
+                rng, card_table, tile_table)
+            game.observers = observers
+
+    def get_state_key(self, game: 'transcendence.TranscendenceGame') -> Hashable:
+        return self._get_canonical_key(game)[0]
+
+    def _get_canonical_key(self,
+                           game: 'transcendence.TranscendenceGame'
+        ) -> Tuple[Hashable, Sequence[int]]:
+        # The smallest Zobrist hash of the game under the board symmetries
+        # every card is symmetric under, so mirrored positions share entries,
+        # and the tile permutation that gives it, or None for the identity.
+        # On the last action, unless a blessing tile can extend the game, no
+        # card leaves the queue and special tiles take effect only after the
+        # game ended, so the queue is left out and they count as normal.
+        board = game.board
+        tiles = board.tiles
+        base = game.zobrist_hash ^ board.zobrist_hash
+        if (game.turns_left == 1 and game.changes_left <= 0
+                and transcendence.Tile.BLESSING not in tiles):
+            for slot, card in enumerate(game.hand_queue):
+                base ^= zobrist.card_key(slot, card)
+            tiles = [transcendence.Tile.NORMAL
+                     if transcendence.Tile.is_special(tile) else tile
+                     for tile in tiles]
+        elif not generators.MoveGenerator.get_shared_symmetries(board):
+            return (board.width, board.height, game.zobrist_hash), None
+
+        permutations = ([None]
+                        + generators.MoveGenerator.get_shared_symmetries(board))
+        hashes = [
+            _xor(zobrist.tile_key(index if permutation is None
+                                  else permutation[index], tile)
+                 for index, tile in enumerate(tiles))
+            for permutation in permutations]
+        board_hash = min(hashes)
+        return ((board.width, board.height, base ^ board_hash),
+                permutations[hashes.index(board_hash)])
@@ -0,0 +1,136 @@
+import random
+import unittest
+
+from . import cards
+from . import expectimax
+from . import generators
+from . import transcendence
+
+
+class TestHitOutcomes(unittest.TestCase):
+    def setUp(self):
+        self.board = transcendence.TranscendenceBoard(4, 4)
+        self.board.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        self.board.set_tile(2, 1, transcendence.Tile.DESTROYED)
+
+    def test_matches_hit_distribution(self):
+        for card in [cards.Thunder(), cards.Hellfire(), cards.Tempest(),
+                     cards.Lightning(), cards.Lightning(cards.CardLevel.MAX)]:
+            outcomes = card.hit_outcomes(self.board, 1, 1)
+            self.assertAlmostEqual(sum(outcomes.values()), 1.0)
+            marginals = {}
+            for hit_tiles, probability in outcomes.items():
+                for position in hit_tiles:
+                    marginals[position] = marginals.get(position, 0.0) + probability
+            expected = card.hit_distribution(self.board, 1, 1)
+            self.assertEqual(set(marginals), set(expected))
+            for position, probability in expected.items():
+                self.assertAlmostEqual(marginals[position], probability)
+
+
+class TestExpectimaxSolver(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(3, 1)
+        self.game = transcendence.TranscendenceGame(board, rng=0)
+        self.game.hand_left = cards.Thunder()
+        self.game.hand_right = cards.Outburst()
+        self.game.turns_left = 1
+
+    def test_last_turn(self):
+        # Thunder in the middle needs both neighbors to break.
+        solver = expectimax.ExpectimaxSolver()
+        self.assertEqual(solver.solve(self.game), (0.25, (1, 0, True, False)))
+        move = solver.best_move(self.game)
+        self.assertIs(move.card, self.game.hand_left)
+
+    def test_matches_playouts(self):
+        self.game.turns_left = 2
+        solver = expectimax.ExpectimaxSolver()
+        value = solver.get_value(self.game)
+        snapshot = self.game.snapshot()
+
+        wins = 0
+        games = 2000
+        rng = random.Random(0)
+        for _ in range(games):
+            self.game.restore(snapshot)
+            self.game.rng = random.Random(rng.getrandbits(32))
+            while not self.game.is_over():
+                self.game.use_move(solver.best_move(self.game))
+            wins += self.game.board.is_finished()
+        self.assertAlmostEqual(wins / games, value, delta=0.03)
+
+    def test_memoizes_states(self):
+        self.game.turns_left = 2
+        solver = expectimax.ExpectimaxSolver()
+        hash_before = self.game.zobrist_hash
+        value = solver.get_value(self.game)
+        self.assertEqual(self.game.zobrist_hash, hash_before)
+        explored = solver.states_explored
+        self.assertGreater(explored, 1)
+        self.assertEqual(solver.get_value(self.game), value)
+        self.assertEqual(solver.states_explored, explored)
+        self.assertGreater(solver.get_hit_rate(), 0)
+
+    def test_mirrored_boards_share_keys(self):
+        # Shockwave only reaches to its right, so only boards mirrored top
+        # to bottom are equivalent.
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(3, 3))
+        game.board.set_tile(1, 0, transcendence.Tile.DESTROYED)
+        solver = expectimax.ExpectimaxSolver()
+        key = solver.get_state_key(game)
+        game.board.set_tile(1, 0, transcendence.Tile.NORMAL)
+        game.board.set_tile(1, 2, transcendence.Tile.DESTROYED)
+        self.assertEqual(solver.get_state_key(game), key)
+        game.board.set_tile(1, 2, transcendence.Tile.NORMAL)
+        game.board.set_tile(0, 1, transcendence.Tile.DESTROYED)
+        self.assertNotEqual(solver.get_state_key(game), key)
+
+    def test_solve_matches_brute_force(self):
+        # Earthquake, drawn after the Outbursts are used, breaks only its
+        # row, so the diagonal mirror of this board is not a symmetry.
+        board = transcendence.TranscendenceBoard(3, 3)
+        for x, y in board.breakable_tiles:
+            if (x, y) not in [(0, 0), (1, 0), (0, 1)]:
+                board.set_tile(x, y, transcendence.Tile.DESTROYED)
+        game = transcendence.TranscendenceGame(board)
+        game.hand_left = cards.Outburst()
+        game.hand_right = cards.Outburst()
+        game.hand_queue = [cards.Earthquake(), cards.Outburst(),
+                           cards.Outburst()]
+        game.turns_left = 2
+        solver = expectimax.ExpectimaxSolver()
+        value, move_key = solver.solve(game)
+        values = {key: solver.get_move_value(game, key) for key
+                  in generators.MoveGenerator.iter_move_keys(game, reduce=False)}
+        self.assertAlmostEqual(value, max(values.values()))
+        self.assertAlmostEqual(values[move_key], value)
+        self.assertEqual(move_key[:2], (0, 1))
+
+
+    def test_mirrored_boards_get_their_own_moves(self):
+        # Both boards share a key, so the second is answered from the entry
+        # of the first and its move has to be mirrored back.
+        games = []
+        for row in [0, 2]:
+            board = transcendence.TranscendenceBoard(3, 3)
+            for x, y in board.breakable_tiles:
+                if (x, y) not in [(0, row), (1, row)]:
+                    board.set_tile(x, y, transcendence.Tile.DESTROYED)
+            game = transcendence.TranscendenceGame(board)
+            game.hand_left = cards.Thunder()
+            game.hand_right = cards.Outburst()
+            game.turns_left = 1
+            games.append(game)
+        solver = expectimax.ExpectimaxSolver()
+        self.assertEqual(solver.get_state_key(games[0]),
+                         solver.get_state_key(games[1]))
+        self.assertEqual(solver.solve(games[0]), (0.5, (0, 0, True, False)))
+        self.assertEqual(solver.solve(games[1]), (0.5, (0, 2, True, False)))
+        move = solver.best_move(games[1])
+        self.assertEqual((move.x, move.y), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import itertools
+
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from . import batch
+from . import medium
+from . import transcendence
+
+Tile = transcendence.Tile
+
+EMPTY = batch.EMPTY
+NUM_TILES = batch.NUM_TILES
+NUM_LEVELS = batch.NUM_LEVELS
+# One-hot tile planes followed by the left and right hand planes.
+NUM_PLANES = NUM_TILES + 2
+NUM_SCALARS = 2
+
+_TILE_VALUES = {tile: tile.value for tile in Tile}
+
+
+class FeatureExtractor:
+    # Turns games of one board size into rows of a float32 matrix for learned
+    # evaluators. Every row holds, in order:
+    # - NUM_TILES one-hot planes of the tiles, one per Tile value,
+    # - a plane per hand, left then right, holding the expected number of
+    #   tiles hit when that card is played at each cell, as the sum of
+    #   Card.hit_distribution, and 0 where the card can not be played,
+    # - the medium._CardConstants ids of the queued cards, EMPTY when the
+    #   queue is short,
+    # - turns_left and changes_left.
+    # planes, queue and scalars return views of those parts of the rows.
+    def __init__(self, width: int, height: int, queue_size: int = 3):
+        self.width = width
+        self.height = height
+        self.queue_size = queue_size
+        self.size = width * height
+        self.num_features = (NUM_PLANES * self.size + queue_size
+                             + NUM_SCALARS)
+        self._queue_start = NUM_PLANES * self.size
+        self._scalars_start = self._queue_start + queue_size
+        self._tables = batch._Tables.get(width, height)
+        self._cells = np.arange(self.size)
+        # Hit probability of every cell from its own origin, per card and
+        # level, for cards whose origin is always hit.
+        self._origin_probabilities = np.diagonal(
+            self._tables.probabilities, axis1=2, axis2=3)
+
+    def allocate(self, count: int) -> np.ndarray:
+        return np.zeros((count, self.num_features), dtype=np.float32)
+
+    def planes(self, features: np.ndarray) -> np.ndarray:
+        return features[:, :self._queue_start].reshape(
+            len(features), NUM_PLANES, self.height, self.width)
+
+    def queue(self, features: np.ndarray) -> np.ndarray:
+        return features[:, self._queue_start:self._scalars_start]
+
+    def scalars(self, features: np.ndarray) -> np.ndarray:
+        return features[:, self._scalars_start:]
+
+    def encode(self, game: 'transcendence.TranscendenceGame') -> Tuple:
+        # What the features of a game depend on, as plain values that stay
+        # valid after the game moves on.
+        if (game.board.width, game.board.height) != (self.width, self.height):
+            raise ValueError(f'Expected {self.width}x{self.height} boards,'
+                             f' got {game.board.width}x{game.board.height}')
+        card_to_int = medium._CardConstants.CARD_TO_INT
+        queue = [card_to_int[type(card)]
+                 for card in game.hand_queue[:self.queue_size]]
+        queue += [EMPTY] * (self.queue_size - len(queue))
+        return (tuple(game.board.tiles),
+                (card_to_int[type(game.hand_left)],
+                 card_to_int[type(game.hand_right)]),
+                (game.hand_left.level.value, game.hand_right.level.value),
+                queue, game.turns_left, game.changes_left)
+
+    def extract(self,
+                games: Sequence['transcendence.TranscendenceGame'],
+                out: np.ndarray = None) -> np.ndarray:
+        # Features of the games, written into the first len(games) rows of
+        # out when it is given.
+        return self.extract_encoded([self.encode(game) for game in games], out)
+
+    def extract_encoded(self,
+                        codes: Sequence[Tuple],
+                        out: np.ndarray = None) -> np.ndarray:
+        # As extract, from what encode returned for each game.
+        count = len(codes)
+        tiles = np.fromiter(
+            map(_TILE_VALUES.__getitem__,
+                itertools.chain.from_iterable(code[0] for code in codes)),
+            dtype=np.intp, count=count * self.size).reshape(count, self.size)
+        hands, hand_levels, queues = (
+            np.array([code[part] for code in codes],
+                     dtype=np.intp).reshape(count, -1)
+            for part in range(1, 4))
+        turns_left, changes_left = (
+            np.fromiter((code[part] for code in codes), dtype=np.intp,
+                        count=count)
+            for part in range(4, 6))
+        return self._fill(tiles, hands, hand_levels, queues, turns_left,
+                          changes_left, out)
+
+    def extract_batch(self,
+                      games: 'batch.BatchGame',
+                      out: np.ndarray = None) -> np.ndarray:
+        # Features of every game of a BatchGame, whose hands must be full.
+        if (games.width, games.height) != (self.width, self.height):
+            raise ValueError(f'Expected {self.width}x{self.height} boards,'
+                             f' got {games.width}x{games.height}')
+        if (games.hands == EMPTY).any():
+            raise ValueError('Every hand must hold a card')
+        queues = np.full((len(games), self.queue_size), EMPTY, dtype=np.intp)
+        shown = min(self.queue_size, games.queues.shape[1])
+        queues[:, :shown] = games.queues[:, :shown]
+        return self._fill(games.tiles.astype(np.intp),
+                          games.hands.astype(np.intp),
+                          games.hand_levels.astype(np.intp), queues,
+                          games.turns_left, games.changes_left, out)
+
+    def _fill(self,
+              tiles: np.ndarray,
+              hands: np.ndarray,
+              hand_levels: np.ndarray,
+              queues: np.ndarray,
+              turns_left: np.ndarray,
+              changes_left: np.ndarray,
+              out: np.ndarray) -> np.ndarray:
+        count = len(tiles)
+        if out is None:
+            out = self.allocate(count)
+        else:
+            if (out.ndim != 2 or out.shape[0] < count
+                    or out.shape[1] != self.num_features):
+                raise ValueError(f'Expected a buffer of at least {count} rows'
+                                 f' of {self.num_features} features, got'
+                                 f' {out.shape}')
+            out = out[:count]
+
+        planes = out[:, :self._queue_start].reshape(count, NUM_PLANES,
+                                                    self.size)
+        planes[:, :NUM_TILES] = 0
+        planes[np.arange(count)[:, None], tiles, self._cells] = 1
+        planes[:, NUM_TILES:] = self._get_expected_hits(tiles, hands,
+                                                        hand_levels)
+        out[:, self._queue_start:self._scalars_start] = queues
+        out[:, self._scalars_start] = turns_left
+        out[:, self._scalars_start + 1] = changes_left
+        return out
+
+    def _get_expected_hits(self,
+                           tiles: np.ndarray,
+                           hands: np.ndarray,
+                           hand_levels: np.ndarray) -> np.ndarray:
+        # As the sum of Card.hit_distribution at every origin, computed once
+        # per card and level in the batch.
+        tables = self._tables
+        expected = np.zeros(hands.shape + (self.size,))
+        hittable = batch.HITTABLE[tiles]
+        distorted = tiles == Tile.DISTORTED.value
+        keys = hands * NUM_LEVELS + hand_levels
+        for key in np.unique(keys):
+            card_id, level = divmod(int(key), NUM_LEVELS)
+            rows, sides = np.nonzero(keys == key)
+            if card_id == batch.LIGHTNING:
+                expected[rows, sides] = self._get_lightning_hits(
+                    tiles[rows], level)[:, None]
+                continue
+            targets = hittable[rows]
+            if (tables.spares_distorted_at_max[card_id]
+                    and level == batch.MAX_LEVEL):
+                targets = targets & ~distorted[rows]
+            probabilities = tables.probabilities[card_id, level]
+            hits = targets @ probabilities.T
+            if tables.always_hits_origin[card_id]:
+                hits += 1 - targets * self._origin_probabilities[card_id, level]
+            expected[rows, sides] = hits
+        return expected * batch.IN_BREAKABLE[tiles][:, None]
+
+    def _get_lightning_hits(self, tiles: np.ndarray, level: int) -> np.ndarray:
+        # As in cards.Lightning.hit_distribution, which does not depend on
+        # the origin: each of the max_targets + 2 outcomes is equally likely.
+        # The first undoes the origin or a destroyed tile, and the others hit
+        # the origin and up to max_targets other breakable tiles.
+        max_targets = int(self._tables.lightning_targets[level])
+        destroyed = (tiles == Tile.DESTROYED.value).sum(axis=1)
+        others = batch.IN_BREAKABLE[tiles].sum(axis=1) - 1
+        targets = np.arange(max_targets + 1)
+        other_hits = np.minimum(targets, np.maximum(others, 0)[:, None])
+        return ((2 * destroyed / (destroyed + 1) + max_targets + 1
+                 + other_hits.sum(axis=1)) / (max_targets + 2))
@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+
+from . import batch
+from . import cards
+from . import features
+from . import medium
+from . import transcendence
+
+Tile = transcendence.Tile
+
+
+class TestFeatureExtractor(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(4, 3)
+        board.set_tile(0, 0, Tile.NONE)
+        board.set_tile(1, 2, Tile.DESTROYED)
+        board.set_tile(2, 1, Tile.DISTORTED)
+        board.set_tile(3, 2, Tile.BLESSING)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Explosion(cards.CardLevel.ENHANCED)
+        self.game.hand_right = cards.Purify(cards.CardLevel.MAX)
+        self.game.hand_queue = [cards.Lightning(), cards.Tree()]
+        self.game.turns_left = 5
+        self.game.changes_left = 2
+        self.extractor = features.FeatureExtractor(4, 3)
+
+    def get_expected_hits(self, game, card):
+        expected = np.zeros((game.board.height, game.board.width))
+        for x, y in game.board.breakable_tiles:
+            expected[y, x] = sum(card.hit_distribution(game.board, x,
+                                                       y).values())
+        return expected
+
+    def test_features(self):
+        result = self.extractor.extract([self.game])
+        planes = self.extractor.planes(result)[0]
+        for index, tile in enumerate(self.game.board.tiles):
+            x, y = self.game.board.position(index)
+            self.assertEqual(planes[:features.NUM_TILES, y, x].argmax(),
+                             tile.value)
+        self.assertEqual(planes[:features.NUM_TILES].sum(), 12)
+        card_to_int = medium._CardConstants.CARD_TO_INT
+        self.assertListEqual(
+            list(self.extractor.queue(result)[0]),
+            [card_to_int[cards.Lightning], card_to_int[cards.Tree],
+             features.EMPTY])
+        self.assertListEqual(list(self.extractor.scalars(result)[0]), [5, 2])
+
+    def test_expected_hits_match_hit_distribution(self):
+        for card_type in medium._CardConstants.CARD_TO_INT:
+            for level in cards.CardLevel:
+                card = card_type(level)
+                self.game.hand_left = card
+                planes = self.extractor.planes(
+                    self.extractor.extract([self.game]))
+                np.testing.assert_allclose(
+                    planes[0, features.NUM_TILES],
+                    self.get_expected_hits(self.game, card), rtol=1e-6,
+                    err_msg=f'{card_type.__name__} {level}')
+
+    def test_writes_into_buffer(self):
+        games = batch.BatchGame.new_games(6, 4, 3, 5, seed=0)
+        games.step_random()
+        buffer = self.extractor.allocate(10)
+        buffer[:] = -1
+        result = self.extractor.extract_batch(games, out=buffer)
+        self.assertTrue(np.shares_memory(result, buffer))
+        self.assertTrue((buffer[6:] == -1).all())
+        np.testing.assert_array_equal(
+            result, self.extractor.extract(games.to_games()))
+        self.assertTrue(np.shares_memory(self.extractor.planes(result), buffer))
+
+        with self.assertRaises(ValueError):
+            self.extractor.extract(games.to_games(), out=buffer[:3])
+        with self.assertRaises(ValueError):
+            features.FeatureExtractor(3, 3).extract([self.game])
+
+
+if __name__ == '__main__':
+    unittest.main()
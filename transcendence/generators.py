@@ -1,49 +1,298 @@
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
 
 from . import cards
+from . import kernels
+from . import randomness
 from . import transcendence
+from . import zobrist
 
 import random
 
+# (x, y, is_left, is_change), the fields of a TranscendenceMove without the
+# card, which is the one in that hand.
+MoveKey = Tuple
+
+
+def _get_transforms(width: int, height: int) -> List:
+    transforms = [
+        lambda x, y: (width - 1 - x, y),
+        lambda x, y: (x, height - 1 - y),
+        lambda x, y: (width - 1 - x, height - 1 - y),
+    ]
+    if width == height:
+        transforms += [
+            lambda x, y: (y, x),
+            lambda x, y: (width - 1 - y, height - 1 - x),
+            lambda x, y: (width - 1 - y, x),
+            lambda x, y: (y, height - 1 - x),
+        ]
+    return transforms
+
+
+def unwrap_table(table: Any) -> Any:
+    # The table under a wrapper that watches a game's draws, such as
+    # reweighting.DrawRecorder. Searches draw from it while they play
+    # simulated moves on the game, so only moves actually played are seen.
+    return getattr(table, 'table', table)
+
+
+class AliasTable:
+    # Vose's alias method: O(1) weighted draws from a fixed weight table.
+    def __init__(self, weights: Dict[Any, float]):
+        self.weights = dict(weights)
+        self.values = [value for value, weight in weights.items() if weight > 0]
+        if not self.values:
+            raise ValueError('At least one weight must be positive')
+        total = sum(weights[value] for value in self.values)
+        count = len(self.values)
+        scaled = [weights[value] * count / total for value in self.values]
+
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [index for index, weight in enumerate(scaled) if weight < 1]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def _pick(self, uniform: float) -> Any:
+        # One uniform picks both the column and the coin flip.
+        scaled = uniform * len(self.values)
+        column = int(scaled)
+        if scaled - column >= self.probabilities[column]:
+            column = self.aliases[column]
+        return self.values[column]
+
+    def draw(self, rng: 'randomness.RandomLike' = random) -> Any:
+        return self._pick(rng.random())
+
+    def draw_many(self,
+                  count: int,
+                  rng: 'randomness.RandomLike' = random) -> List[Any]:
+        return [self._pick(uniform)
+                for uniform in randomness.uniforms(rng, count)]
+
+
 class CardGenerator:
+    _probabilities = None
+    _table = None
+
+    @classmethod
+    def get_probabilities(cls) -> Dict[type, int]:
+        # Built on first use, since cards and tiles import this module.
+        if cls._probabilities is None:
+            cls._probabilities = {
+                cards.Thunder: 150,
+                cards.Hellfire: 115,
+                cards.Shockwave: 95,
+                cards.TidalWave: 55,
+                cards.Explosion: 105,
+                cards.Tempest: 70,
+                cards.Lightning: 90,
+                cards.Earthquake: 70,
+                cards.Purify: 100,
+                cards.Tornado: 150,
+            }
+        return cls._probabilities
+
+    @classmethod
+    def get_table(cls) -> AliasTable:
+        if cls._table is None:
+            cls._table = AliasTable(cls.get_probabilities())
+        return cls._table
+
+    @classmethod
+    def get_random_card(cls,
+                        rng: 'randomness.RandomLike' = random,
+                        table: AliasTable = None) -> 'cards.Card':
+        return (table or cls.get_table()).draw(rng)()
+
     @classmethod
-    def get_random_card(cls) -> 'cards.Card':
-        probabilities = {
-            cards.Thunder: 150,
-            cards.Hellfire: 115,
-            cards.Shockwave: 95,
-            cards.TidalWave: 55,
-            cards.Explosion: 105,
-            cards.Tempest: 70,
-            cards.Lightning: 90,
-            cards.Earthquake: 70,
-            cards.Purify: 100,
-            cards.Tornado: 150,
-        }
-        cards_probs = list(probabilities.keys())
-        chosen_card = (
-            random.choices(
-                cards_probs,
-                [probabilities[card_prob] for card_prob in cards_probs]))
-        return chosen_card[0]()
+    def get_random_cards(cls,
+                         count: int,
+                         rng: 'randomness.RandomLike' = random,
+                         table: AliasTable = None) -> List['cards.Card']:
+        return [card_type() for card_type
+                in (table or cls.get_table()).draw_many(count, rng)]
+
 
 class TileGenerator:
+    _probabilities = None
+    _table = None
+
     @classmethod
-    def get_random_tile(cls) -> 'transcendence.Tile':
-        probabilities = {
-            transcendence.Tile.ENHANCEMENT: 160,
-            transcendence.Tile.ADDITION: 235,
-            transcendence.Tile.CLONE: 160,
-            transcendence.Tile.RELOCATION: 0, # normally 170,
-            transcendence.Tile.MYSTERY: 160,
-            transcendence.Tile.BLESSING: 115,
-        }
-        tiles = list(probabilities.keys())
-        chosen_tile = (
-            random.choices(tiles, [probabilities[tile] for tile in tiles]))
-        return chosen_tile[0]
+    def get_probabilities(cls) -> Dict['transcendence.Tile', int]:
+        if cls._probabilities is None:
+            cls._probabilities = {
+                transcendence.Tile.ENHANCEMENT: 160,
+                transcendence.Tile.ADDITION: 235,
+                transcendence.Tile.CLONE: 160,
+                transcendence.Tile.RELOCATION: 0, # normally 170,
+                transcendence.Tile.MYSTERY: 160,
+                transcendence.Tile.BLESSING: 115,
+            }
+        return cls._probabilities
+
+    @classmethod
+    def get_table(cls) -> AliasTable:
+        if cls._table is None:
+            cls._table = AliasTable(cls.get_probabilities())
+        return cls._table
+
+    @classmethod
+    def get_random_tile(cls,
+                        rng: 'randomness.RandomLike' = random,
+                        table: AliasTable = None) -> 'transcendence.Tile':
+        return (table or cls.get_table()).draw(rng)
+
+    @classmethod
+    def get_random_tiles(cls,
+                         count: int,
+                         rng: 'randomness.RandomLike' = random,
+                         table: AliasTable = None) -> List['transcendence.Tile']:
+        return (table or cls.get_table()).draw_many(count, rng)
 
 class MoveGenerator:
+    # Every card that can reach a hand, either drawn or from a mystery tile.
+    CARD_TYPES = [cards.Thunder, cards.Tornado, cards.Purify, cards.Tempest,
+                  cards.Hellfire, cards.Shockwave, cards.Earthquake,
+                  cards.TidalWave, cards.Explosion, cards.Lightning,
+                  cards.Tree, cards.Outburst]
+    # Tile index permutations of every mirroring and rotation of a board
+    # other than the identity, by board size.
+    _symmetries: Dict[Tuple, List[Tuple[int, ...]]] = {}
+    # The symmetries every card in CARD_TYPES is symmetric under, by board
+    # size.
+    _shared_symmetries: Dict[Tuple, List[Tuple[int, ...]]] = {}
+    # Whether a card's footprint maps onto itself under a symmetry.
+    _card_symmetries: Dict[Tuple, bool] = {}
+    # Reduced targets of recently seen boards.
+    _targets = zobrist.TranspositionTable(1 << 16)
+
+    @classmethod
+    def get_symmetries(cls, width: int, height: int) -> List[Tuple[int, ...]]:
+        key = (width, height)
+        symmetries = cls._symmetries.get(key)
+        if symmetries is None:
+            symmetries = []
+            for transform in _get_transforms(width, height):
+                permutation = []
+                for index in range(width * height):
+                    x, y = transform(index % width, index // width)
+                    permutation.append(y * width + x)
+                symmetries.append(tuple(permutation))
+            cls._symmetries[key] = symmetries
+        return symmetries
+
+    @classmethod
+    def get_board_symmetries(cls,
+            board: 'transcendence.TranscendenceBoard'
+        ) -> List[Tuple[int, ...]]:
+        # The symmetries that leave every tile of the board unchanged.
+        # Boards seen in play are rarely symmetric, so each permutation is
+        # checked tile by tile until the first mismatch.
+        tiles = board.tiles
+        symmetries = []
+        for permutation in cls.get_symmetries(board.width, board.height):
+            for index, tile in enumerate(tiles):
+                if tiles[permutation[index]] is not tile:
+                    break
+            else:
+                symmetries.append(permutation)
+        return symmetries
+
+    @classmethod
+    def is_card_symmetric(cls,
+            card: 'cards.Card',
+            board: 'transcendence.TranscendenceBoard',
+            permutation: Tuple[int, ...]
+        ) -> bool:
+        if card.SYMMETRIC is not None:
+            return card.SYMMETRIC
+        key = (type(card), card.level, board.width, board.height, permutation)
+        symmetric = cls._card_symmetries.get(key)
+        if symmetric is None:
+            # Holes are never hit, so the card is compared on the full
+            # rectangle and the board's own symmetries handle its holes.
+            kernel = kernels.KernelRegistry.get_kernel(
+                type(card), card.level, board.width, board.height)
+            symmetric = all(
+                {(index, probability) for index, _, probability
+                 in kernel.footprints[permutation[origin]]}
+                == {(permutation[index], probability) for index, _, probability
+                    in kernel.footprints[origin]}
+                for origin in range(board.width * board.height))
+            cls._card_symmetries[key] = symmetric
+        return symmetric
+
+    @classmethod
+    def get_shared_symmetries(cls,
+            board: 'transcendence.TranscendenceBoard'
+        ) -> List[Tuple[int, ...]]:
+        # The symmetries of the board size that every card in CARD_TYPES, at
+        # every level, is symmetric under. A symmetry of the board and the
+        # cards in hand alone is not enough, since cards drawn later are
+        # played on the mapped board too.
+        key = (board.width, board.height)
+        symmetries = cls._shared_symmetries.get(key)
+        if symmetries is None:
+            symmetries = [
+                permutation for permutation in cls.get_symmetries(*key)
+                if all(cls.is_card_symmetric(card_type(level), board,
+                                             permutation)
+                       for card_type in cls.CARD_TYPES
+                       for level in cards.CardLevel)]
+            cls._shared_symmetries[key] = symmetries
+        return symmetries
+
+    @classmethod
+    def get_targets(cls,
+            board: 'transcendence.TranscendenceBoard'
+        ) -> Tuple[Tuple[int, int], ...]:
+        # The breakable tiles, keeping only the first of the tiles that a
+        # shared symmetry of the board maps onto each other.
+        key = (board.width, board.height, board.zobrist_hash)
+        targets = cls._targets.get(key)
+        if targets is None:
+            shared = cls.get_shared_symmetries(board)
+            permutations = [
+                permutation for permutation in cls.get_board_symmetries(board)
+                if permutation in shared]
+            targets = tuple(
+                (x, y) for x, y in board.breakable_tiles
+                if all(permutation[board.index(x, y)] >= board.index(x, y)
+                       for permutation in permutations))
+            cls._targets.put(key, targets)
+        return targets
+
+    @classmethod
+    def iter_move_keys(cls,
+            game: 'transcendence.TranscendenceGame',
+            reduce: bool = True
+        ) -> Iterator[MoveKey]:
+        # Lazily yields the valid moves as keys. With reduce, moves that lead
+        # to equivalent positions are yielded once: the right hand is skipped
+        # when it holds the same card as the left, and symmetric targets are
+        # dropped as in get_targets.
+        board = game.board
+        hands = [(True, game.hand_left), (False, game.hand_right)]
+        if reduce and game.hand_left == game.hand_right:
+            hands = hands[:1]
+        targets = cls.get_targets(board) if reduce else board.breakable_tiles
+        for is_left, _ in hands:
+            for x, y in targets:
+                yield (x, y, is_left, False)
+        if game.changes_left > 0:
+            for is_left, _ in hands:
+                yield (None, None, is_left, True)
+
     @classmethod
     def get_valid_moves(cls,
             game: 'transcendence.TranscendenceGame'
@@ -64,7 +313,7 @@ class MoveGenerator:
                                                    y=None,
                                                    is_left=True,
                                                    is_change=True)
-            right = transcendence.TranscendenceMove(game.hand_left,
+            right = transcendence.TranscendenceMove(game.hand_right,
                                                     x=None,
                                                     y=None,
                                                     is_left=False,
@@ -77,5 +326,5 @@ class MoveGenerator:
     def get_random_move(cls,
             game: 'transcendence.TranscendenceGame'
         ) -> List['transcendence.TranscendenceMove']:
-        return random.choice(MoveGenerator.get_valid_moves(game))
+        return game.rng.choice(MoveGenerator.get_valid_moves(game))
 
@@ -0,0 +1,90 @@
+import time
+
+from collections import Counter
+from typing import Dict
+
+# The stats use_move records into, or None while instrumentation is off.
+# TranscendenceGame.use_move only checks this before every phase, so turning
+# it off costs one global lookup per phase.
+active: 'MoveStats' = None
+
+PHASES = ['use_move', 'hit_tiles', 'calculate_hit_tiles', 'special_tiles',
+          'fix_hand', 'set_special_tile']
+
+
+class MoveStats:
+    # Call counts and total seconds per phase of use_move, plus how often
+    # every special tile effect fired. Stats from different processes are
+    # combined with merge or +.
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.times: Counter = Counter()
+
+    def record(self, phase: str, start: float) -> float:
+        # Adds the time since start to the phase and returns the current
+        # time, so phases can be timed back to back.
+        now = time.perf_counter()
+        self.counts[phase] += 1
+        self.times[phase] += now - start
+        return now
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counts[name] += value
+
+    def merge(self, other: 'MoveStats') -> 'MoveStats':
+        self.counts.update(other.counts)
+        self.times.update(other.times)
+        return self
+
+    def __add__(self, other: 'MoveStats') -> 'MoveStats':
+        return MoveStats().merge(self).merge(other)
+
+    def reset(self) -> None:
+        self.counts.clear()
+        self.times.clear()
+
+    def get_mean(self, phase: str) -> float:
+        count = self.counts[phase]
+        return self.times[phase] / count if count else 0.0
+
+    def to_dict(self) -> Dict[str, dict]:
+        return {'counts': dict(self.counts), 'times': dict(self.times)}
+
+    @classmethod
+    def from_dict(cls, stats_dict: Dict[str, dict]) -> 'MoveStats':
+        stats = cls()
+        stats.counts.update(stats_dict.get('counts', {}))
+        stats.times.update(stats_dict.get('times', {}))
+        return stats
+
+    def __str__(self) -> str:
+        total = self.times['use_move']
+        lines = []
+        for phase in PHASES:
+            if not self.counts[phase]:
+                continue
+            share = self.times[phase] / total if total else 0.0
+            lines.append(f'{phase:<20} {self.counts[phase]:>10}'
+                         f' {self.get_mean(phase) * 1e6:>10.2f} us'
+                         f' {share:>7.1%}')
+        for name in sorted(set(self.counts) - set(PHASES)):
+            lines.append(f'{name:<20} {self.counts[name]:>10}')
+        return '\n'.join(lines)
+
+
+def enable(stats: MoveStats = None) -> MoveStats:
+    # Starts recording into stats, or into new stats.
+    global active
+    active = stats if stats is not None else MoveStats()
+    return active
+
+
+def disable() -> MoveStats:
+    # Stops recording and returns what was recorded.
+    global active
+    stats, active = active, None
+    return stats
+
+
+def get_stats() -> MoveStats:
+    return active
@@ -0,0 +1,59 @@
+import pickle
+import unittest
+
+from . import cards
+from . import instrumentation
+from . import transcendence
+
+
+class TestMoveStats(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(4, 4)
+        board.set_tile(0, 0, transcendence.Tile.BLESSING)
+        self.game = transcendence.TranscendenceGame(board, rng=0)
+        self.game.turns_left = 5
+        self.game.changes_left = 1
+
+    def tearDown(self):
+        instrumentation.disable()
+
+    def test_disabled_by_default(self):
+        self.game.use_left(0, 0)
+        self.assertIsNone(instrumentation.get_stats())
+
+    def test_records_phases(self):
+        stats = instrumentation.enable()
+        move = transcendence.TranscendenceMove(cards.Thunder(), 0, 0)
+        self.game.use_move(move)
+        change = transcendence.TranscendenceMove(self.game.hand_left, None,
+                                                 None, is_change=True)
+        self.game.use_move(change)
+        self.assertIs(instrumentation.disable(), stats)
+
+        self.assertEqual(stats.counts['use_move'], 2)
+        self.assertEqual(stats.counts['fix_hand'], 2)
+        for phase in ['hit_tiles', 'calculate_hit_tiles', 'special_tiles',
+                      'set_special_tile']:
+            self.assertEqual(stats.counts[phase], 1)
+        self.assertEqual(stats.counts['effect.blessing'], 1)
+        self.assertGreaterEqual(stats.times['use_move'],
+                                stats.times['hit_tiles'])
+
+    def test_merge_across_processes(self):
+        first = instrumentation.MoveStats()
+        first.count('use_move', 2)
+        first.times['use_move'] = 1.0
+        second = pickle.loads(pickle.dumps(first))
+        second.count('effect.clone')
+
+        merged = first + second
+        self.assertEqual(merged.counts['use_move'], 4)
+        self.assertEqual(merged.times['use_move'], 2.0)
+        self.assertEqual(merged.get_mean('use_move'), 0.5)
+        self.assertEqual(instrumentation.MoveStats.from_dict(
+            merged.to_dict()).counts, merged.counts)
+        self.assertEqual(first.counts['use_move'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+# A footprint entry is (tile index, (x, y), probability), clipped to the board
+# and to its usable tiles.
+FootprintEntry = Tuple[int, Tuple[int, int], float]
+Footprint = Tuple[FootprintEntry, ...]
+
+
+class CardKernel:
+    # Precomputed footprints of one card type and level for every origin of a
+    # board of the given size and holes.
+    def __init__(self,
+                 width: int,
+                 height: int,
+                 footprints: List[Footprint],
+                 unusable_mask: int = 0):
+        self.width = width
+        self.height = height
+        self.footprints = footprints
+        self.unusable_mask = unusable_mask
+
+    def footprint(self, x: int, y: int) -> Footprint:
+        return self.footprints[y * self.width + x]
+
+
+class KernelRegistry:
+    # Kernels by card type, level, board size and mask of Tile.NONE holes.
+    # Holes never change during a game, so a board's layout picks the same
+    # kernel on every use.
+    _kernels: Dict[Tuple, CardKernel] = {}
+
+    @classmethod
+    def get_kernel(cls,
+                   card_type: type,
+                   level: 'cards.CardLevel',
+                   width: int,
+                   height: int,
+                   unusable_mask: int = 0) -> CardKernel:
+        key = (card_type, level, width, height, unusable_mask)
+        kernel = cls._kernels.get(key)
+        if kernel is None:
+            kernel = cls._build_kernel(card_type, level, width, height,
+                                       unusable_mask)
+            cls._kernels[key] = kernel
+        return kernel
+
+    @classmethod
+    def _build_kernel(cls,
+                      card_type: type,
+                      level: 'cards.CardLevel',
+                      width: int,
+                      height: int,
+                      unusable_mask: int = 0) -> CardKernel:
+        footprints = []
+        for y in range(height):
+            for x in range(width):
+                cells = card_type.get_footprint(level, width, height, x, y)
+                footprints.append(tuple(
+                    (ty * width + tx, (tx, ty), probability)
+                    for (tx, ty), probability in cells.items()
+                    if 0 <= tx < width and 0 <= ty < height
+                    and not unusable_mask >> (ty * width + tx) & 1))
+        return CardKernel(width, height, footprints, unusable_mask)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._kernels.clear()
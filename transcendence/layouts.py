@@ -0,0 +1,148 @@
+from typing import Dict, List, Tuple
+
+from . import cards
+from . import kernels
+from . import transcendence
+
+# Layout rows use one character per tile: '#' is a usable tile and '.' is a
+# Tile.NONE hole.
+_USABLE = '#'
+_HOLE = '.'
+
+
+class BoardLayout:
+    # The shape of a board: its size and which tiles are holes.
+    def __init__(self, name: str, rows: List[str]):
+        if not rows or any(len(row) != len(rows[0]) for row in rows):
+            raise ValueError('Layout rows must be non-empty and equally long')
+        self.name = name
+        self.width = len(rows[0])
+        self.height = len(rows)
+        self.unusable_mask = 0
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell == _HOLE:
+                    self.unusable_mask |= 1 << (y * self.width + x)
+                elif cell != _USABLE:
+                    raise ValueError(f'Unknown layout cell {cell!r}')
+
+    @classmethod
+    def from_board(cls,
+                   board: 'transcendence.TranscendenceBoard',
+                   name: str = None) -> 'BoardLayout':
+        return cls(name, [
+            ''.join(_HOLE if tile is transcendence.Tile.NONE else _USABLE
+                    for tile in row)
+            for row in board.grid])
+
+    @property
+    def rows(self) -> List[str]:
+        return [''.join(_HOLE if self.unusable_mask >> (y * self.width + x) & 1
+                        else _USABLE for x in range(self.width))
+                for y in range(self.height)]
+
+    def create_board(self) -> 'transcendence.TranscendenceBoard':
+        tiles = [transcendence.Tile.NONE if self.unusable_mask >> index & 1
+                 else transcendence.Tile.NORMAL
+                 for index in range(self.width * self.height)]
+        return transcendence.TranscendenceBoard(self.width, self.height, tiles)
+
+    def get_tables(self) -> 'LayoutTables':
+        return LayoutTables.get(self.width, self.height, self.unusable_mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, BoardLayout):
+            return NotImplemented
+        return ((self.width, self.height, self.unusable_mask)
+                == (other.width, other.height, other.unusable_mask))
+
+    def __hash__(self):
+        return hash((self.width, self.height, self.unusable_mask))
+
+    def __str__(self):
+        return '\n'.join(self.rows)
+
+
+PRESETS: Dict[str, BoardLayout] = {layout.name: layout for layout in [
+    BoardLayout('square6', ['######'] * 6),
+    BoardLayout('square7', ['#######'] * 7),
+    BoardLayout('square8', ['########'] * 8),
+    BoardLayout('diamond7', ['...#...',
+                             '..###..',
+                             '.#####.',
+                             '#######',
+                             '.#####.',
+                             '..###..',
+                             '...#...']),
+    BoardLayout('cross7', ['..###..',
+                           '..###..',
+                           '#######',
+                           '#######',
+                           '#######',
+                           '..###..',
+                           '..###..']),
+    BoardLayout('octagon8', ['..####..',
+                             '.######.',
+                             '########',
+                             '########',
+                             '########',
+                             '########',
+                             '.######.',
+                             '..####..']),
+]}
+
+
+def get_layout(name: str) -> BoardLayout:
+    layout = PRESETS.get(name)
+    if layout is None:
+        raise ValueError(f'Unknown layout {name!r},'
+                         f' expected one of {sorted(PRESETS)}')
+    return layout
+
+
+def create_board(name: str) -> 'transcendence.TranscendenceBoard':
+    return get_layout(name).create_board()
+
+
+class LayoutTables:
+    # What a layout's boards share and never change during a game, built
+    # once per size and holes: the usable tiles as a mask and as indices,
+    # and the card kernels, whose footprints already leave out the edges
+    # and holes of the layout.
+    _tables: Dict[Tuple, 'LayoutTables'] = {}
+
+    @classmethod
+    def get(cls,
+            width: int,
+            height: int,
+            unusable_mask: int = 0) -> 'LayoutTables':
+        key = (width, height, unusable_mask)
+        tables = cls._tables.get(key)
+        if tables is None:
+            tables = cls(width, height, unusable_mask)
+            cls._tables[key] = tables
+        return tables
+
+    @classmethod
+    def for_board(cls,
+                  board: 'transcendence.TranscendenceBoard') -> 'LayoutTables':
+        return cls.get(board.width, board.height, board.unusable_mask)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._tables.clear()
+
+    def __init__(self, width: int, height: int, unusable_mask: int = 0):
+        self.width = width
+        self.height = height
+        self.unusable_mask = unusable_mask
+        self.valid_mask = ((1 << (width * height)) - 1) & ~unusable_mask
+        self.valid_indices = tuple(index for index in range(width * height)
+                                   if self.valid_mask >> index & 1)
+
+    def get_kernel(self,
+                   card_type: type,
+                   level: 'cards.CardLevel' = cards.CardLevel.NORMAL
+        ) -> 'kernels.CardKernel':
+        return kernels.KernelRegistry.get_kernel(
+            card_type, level, self.width, self.height, self.unusable_mask)
@@ -0,0 +1,60 @@
+import random
+import unittest
+
+from . import cards
+from . import layouts
+from . import transcendence
+
+
+class TestBoardLayout(unittest.TestCase):
+    def test_presets_create_boards_with_holes(self):
+        board = layouts.create_board('diamond7')
+        self.assertEqual((board.width, board.height), (7, 7))
+        self.assertIs(board.get(0, 0), transcendence.Tile.NONE)
+        self.assertIs(board.get(3, 0), transcendence.Tile.NORMAL)
+        self.assertEqual(len(board.breakable_tiles), 25)
+        self.assertEqual(layouts.BoardLayout.from_board(board),
+                         layouts.get_layout('diamond7'))
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ValueError):
+            layouts.get_layout('missing')
+        with self.assertRaises(ValueError):
+            layouts.BoardLayout('bad', ['##', '#'])
+
+
+class TestLayoutTables(unittest.TestCase):
+    def setUp(self):
+        self.layout = layouts.BoardLayout('test', ['.##',
+                                                   '###',
+                                                   '##.'])
+        self.tables = self.layout.get_tables()
+
+    def test_tables_are_cached(self):
+        self.assertIs(layouts.LayoutTables.for_board(self.layout.create_board()),
+                      self.tables)
+
+    def test_valid_tiles_skip_holes(self):
+        self.assertEqual(self.tables.valid_indices, (1, 2, 3, 4, 5, 6, 7))
+        self.assertEqual(self.tables.valid_mask,
+                         0b111111111 & ~self.layout.unusable_mask)
+
+    def test_kernels_skip_holes(self):
+        kernel = self.tables.get_kernel(cards.Explosion)
+        self.assertEqual({index for index, _, _ in kernel.footprint(1, 1)},
+                         {2, 4, 6})
+        self.assertIs(cards.Explosion().get_kernel(self.layout.create_board()),
+                      kernel)
+
+    def test_hits_never_reach_holes(self):
+        board = self.layout.create_board()
+        rng = random.Random(0)
+        for card_type in [cards.Thunder, cards.Tempest, cards.Earthquake,
+                          cards.TidalWave, cards.Explosion, cards.Hellfire]:
+            for x, y in board.breakable_tiles:
+                hit_tiles = card_type(cards.CardLevel.MAX).use(board, x, y, rng)
+                self.assertFalse(hit_tiles & set(board.unusable_tiles))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import math
+import random
+import time
+
+from typing import Dict, Hashable, List
+
+from . import evaluators
+from . import generators
+from . import rollouts
+from . import transcendence
+
+MoveKey = generators.MoveKey
+
+
+def move_key(move: 'transcendence.TranscendenceMove') -> MoveKey:
+    return (move.x, move.y, move.is_left, move.is_change)
+
+
+def make_move(game: 'transcendence.TranscendenceGame',
+              key: MoveKey) -> 'transcendence.TranscendenceMove':
+    x, y, is_left, is_change = key
+    card = game.hand_left if is_left else game.hand_right
+    return transcendence.TranscendenceMove(card, x, y, is_left, is_change)
+
+
+def state_key(game: 'transcendence.TranscendenceGame') -> Hashable:
+    return game.zobrist_hash
+
+
+class DecisionNode:
+    # A state where the player picks a move.
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.visits = 0
+        self.total = 0.0
+        self.untried: List[MoveKey] = None
+        self.children: Dict[MoveKey, 'ChanceNode'] = {}
+
+
+class ChanceNode:
+    # A move whose result depends on breaks, card draws and special tiles.
+    # Every sampled result gets its own decision node.
+    def __init__(self, move: MoveKey):
+        self.move = move
+        self.visits = 0
+        self.total = 0.0
+        self.children: Dict[Hashable, DecisionNode] = {}
+
+    def get_mean(self) -> float:
+        return self.total / self.visits if self.visits else 0.0
+
+
+class MCTSSolver:
+    # Leaves are valued by evaluator, which defaults to playouts with policy.
+    # With leaf_batch_size above 1, that many leaves are selected before
+    # they are evaluated together. Each selected leaf's path counts as a
+    # visit with no reward until then, which steers the other selections
+    # of the batch elsewhere.
+    def __init__(self,
+                 exploration: float = math.sqrt(2),
+                 policy: rollouts.Policy = generators.MoveGenerator.get_random_move,
+                 seed: int = None,
+                 evaluator: 'evaluators.LeafEvaluator' = None,
+                 leaf_batch_size: int = 1):
+        if leaf_batch_size < 1:
+            raise ValueError('leaf_batch_size must be positive')
+        self.exploration = exploration
+        self.policy = policy
+        if evaluator is None:
+            evaluator = evaluators.PlayoutEvaluator(policy)
+        self.evaluator = evaluator
+        self.leaf_batch_size = leaf_batch_size
+        self.rng = random.Random(seed)
+        self.root: DecisionNode = None
+        self._last_move: MoveKey = None
+
+    def best_move(self,
+                  game: 'transcendence.TranscendenceGame',
+                  iterations: int = None,
+                  time_budget: float = None) -> 'transcendence.TranscendenceMove':
+        if iterations is None and time_budget is None:
+            raise ValueError('Either iterations or time_budget is required')
+        if game.is_over():
+            raise ValueError('The game is already over')
+
+        self._advance_root(game)
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        done = 0
+        # At least one batch runs whatever the time budget, so the root has
+        # a move to return.
+        while iterations is None or done < iterations:
+            if (deadline is not None and done
+                    and time.monotonic() >= deadline):
+                break
+            count = self.leaf_batch_size
+            if iterations is not None:
+                count = min(count, iterations - done)
+            self._iterate(game, count)
+            done += count
+
+        best = max(self.root.children.values(),
+                   key=lambda child: (child.visits, child.get_mean()))
+        self._last_move = best.move
+        return make_move(game, best.move)
+
+    def _advance_root(self, game: 'transcendence.TranscendenceGame') -> None:
+        # Reuses the subtree of the position reached by the last move.
+        key = state_key(game)
+        if self.root is not None:
+            if self.root.key == key:
+                return
+            chance = self.root.children.get(self._last_move)
+            if chance is not None and key in chance.children:
+                self.root = chance.children[key]
+                return
+        self.root = DecisionNode(key)
+
+    def _iterate(self,
+                 game: 'transcendence.TranscendenceGame',
+                 count: int = 1) -> None:
+        # Searches draw from the solver's rng so a seeded solver repeats
+        # its results. Observers and recorded tables only see moves that are
+        # actually played.
+        snapshot = game.snapshot()
+        game_rng, observers = game.rng, game.observers
+        card_table, tile_table = game.card_table, game.tile_table
+        game.rng = self.rng
+        game.observers = []
+        game.card_table = generators.unwrap_table(card_table)
+        game.tile_table = generators.unwrap_table(tile_table)
+        paths = []
+        prepared = []
+        try:
+            for _ in range(count):
+                path = self._search(game)
+                for visited in path:
+                    visited.visits += 1
+                paths.append(path)
+                prepared.append(self.evaluator.prepare(game))
+                game.restore(snapshot)
+            rewards = self.evaluator.evaluate(prepared)
+        except BaseException:
+            for path in paths:
+                for visited in path:
+                    visited.visits -= 1
+            raise
+        finally:
+            game.restore(snapshot)
+            game.rng = game_rng
+            game.observers = observers
+            game.card_table, game.tile_table = card_table, tile_table
+
+        for path, reward in zip(paths, rewards):
+            for visited in path:
+                visited.total += reward
+
+    def _search(self, game: 'transcendence.TranscendenceGame') -> list:
+        # Plays from the root to a new or final position and returns the
+        # nodes on the way.
+        node = self.root
+        path = [node]
+        while not game.is_over():
+            if node.untried is None:
+                node.untried = list(
+                    generators.MoveGenerator.iter_move_keys(game))
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                chance = ChanceNode(node.untried.pop())
+                node.children[chance.move] = chance
+            else:
+                chance = self._select(node)
+            game.use_move(make_move(game, chance.move))
+            key = state_key(game)
+            child = chance.children.get(key)
+            expanded = child is None
+            if expanded:
+                child = DecisionNode(key)
+                chance.children[key] = child
+            path.extend([chance, child])
+            node = child
+            if expanded:
+                break
+        return path
+
+    def _select(self, node: DecisionNode) -> ChanceNode:
+        log_visits = math.log(node.visits)
+
+        def score(child: ChanceNode) -> float:
+            return (child.get_mean()
+                    + self.exploration * math.sqrt(log_visits / child.visits))
+
+        return max(node.children.values(), key=score)
@@ -0,0 +1,50 @@
+import unittest
+
+from . import cards
+from . import mcts
+from . import transcendence
+
+
+class TestMCTSSolver(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(4, 1)
+        board.set_tile(3, 0, transcendence.Tile.DESTROYED)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Thunder(cards.CardLevel.MAX)
+        self.game.hand_right = cards.Outburst()
+        self.game.turns_left = 1
+
+    def test_finds_clearing_move(self):
+        solver = mcts.MCTSSolver(seed=0)
+        move = solver.best_move(self.game, iterations=200)
+        self.assertEqual((move.x, move.y, move.is_left), (1, 0, True))
+        self.assertIs(move.card, self.game.hand_left)
+
+    def test_reuses_tree_for_same_state(self):
+        solver = mcts.MCTSSolver(seed=0)
+        solver.best_move(self.game, iterations=50)
+        root = solver.root
+        solver.best_move(self.game, iterations=50)
+        self.assertIs(solver.root, root)
+        self.assertEqual(root.visits, 100)
+
+    def test_batches_leaves(self):
+        solver = mcts.MCTSSolver(seed=0, leaf_batch_size=16)
+        move = solver.best_move(self.game, iterations=200)
+        self.assertEqual((move.x, move.y, move.is_left), (1, 0, True))
+        self.assertEqual(solver.root.visits, 200)
+        self.assertEqual(solver.root.visits,
+                         sum(child.visits
+                             for child in solver.root.children.values()))
+
+    def test_exhausted_time_budget(self):
+        move = mcts.MCTSSolver(seed=0).best_move(self.game, time_budget=0)
+        self.assertIsNotNone(move)
+
+    def test_requires_budget(self):
+        with self.assertRaises(ValueError):
+            mcts.MCTSSolver().best_move(self.game)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,31 +5,84 @@ from . import cards
 from . import transcendence
 
 
-from typing import List
+from collections import deque
+from typing import Iterable, List, Sequence, Tuple
 
-class GameWrapper:
-    def __init__(self, game: 'transcendence.TranscendenceGame'):
-        self.game = game
 
-    def make_move(self, move: 'transcendence.TranscendenceMove'):
-        output = []
-        board1 = str(self.game).split('\n')
-        move_list = str(move).split('\n')
+def render_tiles(tiles: Sequence['transcendence.Tile'], width: int) -> List[str]:
+    # The lines of str(board) for the given tiles, ending with an empty line.
+    text = transcendence.TILE_TEXT
+    rows = [' '.join([text[tile] for tile in tiles[start:start + width]])
+            for start in range(0, len(tiles), width)]
+    rows.append('')
+    return rows
+
+
+def _join_columns(columns: List[List[str]]) -> str:
+    # Places the columns side by side, each padded to its longest line plus
+    # one space.
+    output = []
+    for column in columns:
+        column_width = max(len(line) for line in column) + 1
+        output = [left + right.ljust(column_width) for left, right
+                  in itertools.zip_longest(output, column, fillvalue='')]
+    return '\n'.join(output)
+
 
-        self.game.use_move(move)
+class MoveDiff:
+    # A move and the tile changes it made, as (x, y, old tile) in the order
+    # they happened.
+    def __init__(self,
+                 move: 'transcendence.TranscendenceMove',
+                 tile_changes: List[Tuple]):
+        self.move = move
+        self.tile_changes = tile_changes
+
+    def revert(self, tiles: List['transcendence.Tile'], width: int) -> None:
+        for x, y, tile in reversed(self.tile_changes):
+            tiles[y * width + x] = tile
+
+
+class GameWrapper:
+    # Plays moves and keeps the tile changes of the last history_size of
+    # them, so any of those moves can be rendered later as the board before
+    # it, the move and the board after it. Headless wrappers never render on
+    # their own. Boards are rebuilt from the current tiles by reverting the
+    # recorded changes, so the game should only be played through the
+    # wrapper.
+    def __init__(self,
+                 game: 'transcendence.TranscendenceGame',
+                 headless: bool = False,
+                 history_size: int = 64):
+        self.game = game
+        self.headless = headless
+        self.history = deque(maxlen=history_size)
 
-        board2 = str(self.game).split('\n')
+    def play(self, move: 'transcendence.TranscendenceMove') -> MoveDiff:
+        undo = self.game.use_move_with_undo(move)
+        diff = MoveDiff(move, undo.tile_changes)
+        self.history.append(diff)
+        return diff
 
-        to_add = [board1, move_list, board2]
-        for right_list in to_add:
-            right_len = max([len(x) + 1 for x in right_list])
-            new_output = []
-            for (left, right) in itertools.zip_longest(
-                output, right_list, fillvalue=''):
-                new_output.append(left + str.ljust(right, right_len))
-            output = new_output
+    def make_move(self, move: 'transcendence.TranscendenceMove') -> str:
+        # The rendered move, or None when headless.
+        self.play(move)
+        if self.headless:
+            return None
+        return self.render()
 
-        return '\n'.join(output)
+    def render(self, position: int = -1) -> str:
+        # Renders the move at position in history, the last one by default.
+        diff = self.history[position]
+        history = list(self.history)
+        board = self.game.board
+        tiles = list(board.tiles)
+        for later in reversed(history[position % len(history) + 1:]):
+            later.revert(tiles, board.width)
+        after = render_tiles(tiles, board.width)
+        diff.revert(tiles, board.width)
+        before = render_tiles(tiles, board.width)
+        return _join_columns([before, str(diff.move).split('\n'), after])
 
 
 class _CardConstants:
@@ -64,12 +117,9 @@ class ToJson:
     def dict_to_board(cls, board_dict: dict):
         width = board_dict.get('width')
         height = board_dict.get('height')
-        board = transcendence.TranscendenceBoard(width, height)
         raw_grid = board_dict.get('grid')
-        for x in range(width):
-            for y in range(height):
-                board.set_tile(x, y, transcendence.Tile(raw_grid[y][x]))
-        return board
+        tiles = [transcendence.Tile(value) for row in raw_grid for value in row]
+        return transcendence.TranscendenceBoard(width, height, tiles)
 
     @classmethod
     def card_to_serializable(cls, card: 'cards.Card'):
@@ -82,7 +132,7 @@ class ToJson:
         if not card:
             raise ValueError()
         card_class = _CardConstants.INT_TO_CARD[card[0]]
-        card_level = card[1]
+        card_level = cards.CardLevel(card[1])
         return card_class(card_level)
 
     @classmethod
@@ -131,4 +181,145 @@ class ToJson:
                                     in game_dict.get('hand_queue')]
         game.turns_left = game_dict.get('turns_left')
         game.changes_left = game_dict.get('changes_left')
-        return game
\ No newline at end of file
+        return game
+
+
+_TILES = {tile.value: tile for tile in transcendence.Tile}
+
+
+def _write_varint(output: bytearray, value: int) -> None:
+    # Zigzag encoded so negative counters stay small.
+    value = (value << 1) ^ (value >> 63)
+    while value > 0x7f:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), offset
+
+
+class ToBinary:
+    # Compact encoding of games and moves. A game is its board size and
+    # queue size as varints, tiles as packed nibbles, one byte per card
+    # (_CardConstants id in the low nibble, level above it) and the
+    # counters as varints. Records are self-delimiting, so many of them can
+    # be concatenated.
+    @classmethod
+    def _card_to_byte(cls, card: 'cards.Card') -> int:
+        return _CardConstants.CARD_TO_INT[type(card)] | card.level.value << 4
+
+    @classmethod
+    def _byte_to_card(cls, value: int) -> 'cards.Card':
+        return _CardConstants.INT_TO_CARD[value & 0xf](cards.CardLevel(value >> 4))
+
+    @classmethod
+    def write_game(cls,
+                   output: bytearray,
+                   game: 'transcendence.TranscendenceGame') -> None:
+        board = game.board
+        _write_varint(output, board.width)
+        _write_varint(output, board.height)
+        _write_varint(output, len(game.hand_queue))
+        values = [tile.value for tile in board.tiles]
+        if len(values) % 2:
+            values.append(0)
+        output.extend(values[index] | values[index + 1] << 4
+                      for index in range(0, len(values), 2))
+        output.append(cls._card_to_byte(game.hand_left))
+        output.append(cls._card_to_byte(game.hand_right))
+        output.extend(cls._card_to_byte(card) for card in game.hand_queue)
+        _write_varint(output, game.turns_left)
+        _write_varint(output, game.changes_left)
+
+    @classmethod
+    def read_game(cls,
+                  data: bytes,
+                  offset: int = 0
+                  ) -> Tuple['transcendence.TranscendenceGame', int]:
+        width, offset = _read_varint(data, offset)
+        height, offset = _read_varint(data, offset)
+        queue_size, offset = _read_varint(data, offset)
+        size = width * height
+        packed = data[offset:offset + (size + 1) // 2]
+        offset += len(packed)
+        tiles = []
+        for byte in packed:
+            tiles.append(_TILES[byte & 0xf])
+            tiles.append(_TILES[byte >> 4])
+        board = transcendence.TranscendenceBoard(
+            width, height, tiles[:size])
+
+        game = transcendence.TranscendenceGame(board)
+        game.hand_left = cls._byte_to_card(data[offset])
+        game.hand_right = cls._byte_to_card(data[offset + 1])
+        offset += 2
+        game.hand_queue = [cls._byte_to_card(value)
+                           for value in data[offset:offset + queue_size]]
+        game.hand_queue_size = queue_size
+        offset += queue_size
+        game.turns_left, offset = _read_varint(data, offset)
+        game.changes_left, offset = _read_varint(data, offset)
+        return game, offset
+
+    @classmethod
+    def game_to_bytes(cls, game: 'transcendence.TranscendenceGame') -> bytes:
+        output = bytearray()
+        cls.write_game(output, game)
+        return bytes(output)
+
+    @classmethod
+    def bytes_to_game(cls, data: bytes) -> 'transcendence.TranscendenceGame':
+        return cls.read_game(data)[0]
+
+    @classmethod
+    def games_to_bytes(cls,
+                       games: Iterable['transcendence.TranscendenceGame']
+                       ) -> bytes:
+        output = bytearray()
+        for game in games:
+            cls.write_game(output, game)
+        return bytes(output)
+
+    @classmethod
+    def bytes_to_games(cls,
+                       data: bytes) -> List['transcendence.TranscendenceGame']:
+        games = []
+        offset = 0
+        while offset < len(data):
+            game, offset = cls.read_game(data, offset)
+            games.append(game)
+        return games
+
+    @classmethod
+    def move_to_bytes(cls, move: 'transcendence.TranscendenceMove') -> bytes:
+        # Positions are stored plus one, so change moves can use 0 for None.
+        output = bytearray()
+        _write_varint(output, 0 if move.x is None else move.x + 1)
+        _write_varint(output, 0 if move.y is None else move.y + 1)
+        output.append(move.is_left | move.is_change << 1)
+        output.append(cls._card_to_byte(move.card))
+        return bytes(output)
+
+    @classmethod
+    def bytes_to_move(cls, data: bytes) -> 'transcendence.TranscendenceMove':
+        x, offset = _read_varint(data, 0)
+        y, offset = _read_varint(data, offset)
+        flags = data[offset]
+        return transcendence.TranscendenceMove(
+            cls._byte_to_card(data[offset + 1]),
+            x=None if x == 0 else x - 1,
+            y=None if y == 0 else y - 1,
+            is_left=bool(flags & 1),
+            is_change=bool(flags & 2))
+
@@ -0,0 +1,114 @@
+import itertools
+import random
+import unittest
+
+from . import cards
+from . import generators
+from . import mcts
+from . import medium
+from . import transcendence
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(5, 3)
+        board.set_tile(0, 0, transcendence.Tile.NONE)
+        board.set_tile(4, 2, transcendence.Tile.MYSTERY)
+        board.set_tile(2, 1, transcendence.Tile.DESTROYED)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Explosion(cards.CardLevel.MAX)
+        self.game.turns_left = 300
+        self.game.changes_left = 2
+
+    def assertGamesEqual(self, expected, actual):
+        self.assertEqual(expected.board.tiles, actual.board.tiles)
+        self.assertEqual(expected.board.breakable_mask,
+                         actual.board.breakable_mask)
+        self.assertEqual(expected.board.special_mask, actual.board.special_mask)
+        self.assertEqual(expected.hand_left, actual.hand_left)
+        self.assertEqual(expected.hand_right, actual.hand_right)
+        self.assertListEqual(expected.hand_queue, actual.hand_queue)
+        self.assertEqual(expected.turns_left, actual.turns_left)
+        self.assertEqual(expected.changes_left, actual.changes_left)
+        self.assertEqual(expected.zobrist_hash, actual.zobrist_hash)
+
+    def test_binary_round_trip(self):
+        data = medium.ToBinary.game_to_bytes(self.game)
+        self.assertLess(len(data), len(medium.ToJson.game_to_json(self.game)) / 10)
+        self.assertGamesEqual(self.game, medium.ToBinary.bytes_to_game(data))
+
+    def test_binary_bulk_round_trip(self):
+        games = [self.game]
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(4, 4), rng=random.Random(1))
+        game.turns_left = 6
+        while not game.is_over():
+            game.use_move(generators.MoveGenerator.get_random_move(game))
+            games.append(medium.ToBinary.bytes_to_game(
+                medium.ToBinary.game_to_bytes(game)))
+        decoded = medium.ToBinary.bytes_to_games(
+            medium.ToBinary.games_to_bytes(games))
+        self.assertEqual(len(decoded), len(games))
+        for expected, actual in zip(games, decoded):
+            self.assertGamesEqual(expected, actual)
+
+    def test_binary_move_round_trip(self):
+        for move in [transcendence.TranscendenceMove(cards.Tree(), 3, 0, False),
+                     transcendence.TranscendenceMove(cards.Thunder(), None, None,
+                                                     True, True)]:
+            decoded = medium.ToBinary.bytes_to_move(
+                medium.ToBinary.move_to_bytes(move))
+            self.assertEqual((move.x, move.y, move.is_left, move.is_change),
+                             (decoded.x, decoded.y, decoded.is_left,
+                              decoded.is_change))
+            self.assertEqual(move.card, decoded.card)
+
+    def test_json_round_trip_keeps_levels(self):
+        game = medium.ToJson.json_to_game(medium.ToJson.game_to_json(self.game))
+        self.assertGamesEqual(self.game, game)
+
+
+class TestGameWrapper(unittest.TestCase):
+    def make_game(self):
+        board = transcendence.TranscendenceBoard(4, 3)
+        board.set_tile(0, 0, transcendence.Tile.NONE)
+        game = transcendence.TranscendenceGame(board, rng=3)
+        game.turns_left = 6
+        game.changes_left = 1
+        return game
+
+    def test_matches_full_rendering(self):
+        # Renders every move the way make_move did before it kept diffs.
+        game = self.make_game()
+        wrapper = medium.GameWrapper(self.make_game())
+        chooser = random.Random(0)
+        while not game.is_over():
+            move = chooser.choice(generators.MoveGenerator.get_valid_moves(game))
+            columns = [str(game).split('\n'), str(move).split('\n')]
+            game.use_move(move)
+            columns.append(str(game).split('\n'))
+            output = []
+            for column in columns:
+                width = max(len(line) + 1 for line in column)
+                output = [left + right.ljust(width) for left, right
+                          in itertools.zip_longest(output, column, fillvalue='')]
+            wrapper_move = mcts.make_move(wrapper.game, mcts.move_key(move))
+            self.assertEqual(wrapper.make_move(wrapper_move), '\n'.join(output))
+
+    def test_headless_renders_on_demand(self):
+        game = self.make_game()
+        rendered = []
+        wrapper = medium.GameWrapper(game)
+        headless = medium.GameWrapper(self.make_game(), headless=True)
+        chooser = random.Random(0)
+        while not game.is_over():
+            move = chooser.choice(generators.MoveGenerator.get_valid_moves(game))
+            rendered.append(wrapper.make_move(move))
+            headless_move = mcts.make_move(headless.game, mcts.move_key(move))
+            self.assertIsNone(headless.make_move(headless_move))
+        self.assertEqual([headless.render(position)
+                          for position in range(len(rendered))], rendered)
+
+
+if __name__ == '__main__':
+    unittest.main()
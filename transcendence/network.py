@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from . import evaluators
+from . import features
+from . import transcendence
+from . import zobrist
+
+
+class MLP:
+    # A dense network with ReLU between layers and a sigmoid on its single
+    # output, read as the chance of clearing the board. weights[i] has shape
+    # (inputs, outputs) of layer i.
+    def __init__(self, weights: Sequence[np.ndarray], biases: Sequence[np.ndarray]):
+        if not weights or len(weights) != len(biases):
+            raise ValueError('Expected a bias for each of at least one layer')
+        self.weights = [np.asarray(weight, dtype=np.float32) for weight in weights]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        inputs = self.weights[0].shape[0]
+        for layer, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            if weight.ndim != 2 or weight.shape[0] != inputs:
+                raise ValueError(f'Layer {layer} expects {weight.shape[0]}'
+                                 f' inputs, got {inputs}')
+            if bias.shape != (weight.shape[1],):
+                raise ValueError(f'Layer {layer} has {weight.shape[1]} outputs'
+                                 f' but a bias of shape {bias.shape}')
+            inputs = weight.shape[1]
+        if inputs != 1:
+            raise ValueError(f'Expected a single output, got {inputs}')
+
+    @classmethod
+    def random(cls, layer_sizes: Sequence[int], seed=None) -> 'MLP':
+        # He initialized, e.g. as a starting point for training.
+        rng = np.random.default_rng(seed)
+        sizes = list(layer_sizes) + [1]
+        weights = [rng.normal(0, np.sqrt(2 / inputs), (inputs, outputs))
+                   for inputs, outputs in zip(sizes, sizes[1:])]
+        biases = [np.zeros(outputs) for outputs in sizes[1:]]
+        return cls(weights, biases)
+
+    @classmethod
+    def load(cls, path: str) -> 'MLP':
+        # An .npz file of weight_0, bias_0, weight_1, bias_1 and so on.
+        with np.load(path) as arrays:
+            layers = len([name for name in arrays.files
+                          if name.startswith('weight_')])
+            try:
+                return cls([arrays[f'weight_{layer}'] for layer in range(layers)],
+                           [arrays[f'bias_{layer}'] for layer in range(layers)])
+            except KeyError as error:
+                raise ValueError(f'{path} is missing {error}') from None
+
+    def save(self, path: str) -> None:
+        arrays = {}
+        for layer, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'weight_{layer}'] = weight
+            arrays[f'bias_{layer}'] = bias
+        np.savez(path, **arrays)
+
+    @property
+    def input_size(self) -> int:
+        return self.weights[0].shape[0]
+
+    def forward(self, inputs: np.ndarray) -> np.ndarray:
+        # Outputs for a (count, input_size) batch, as a (count,) array.
+        if inputs.ndim != 2 or inputs.shape[1] != self.input_size:
+            raise ValueError(f'Expected inputs of shape (count,'
+                             f' {self.input_size}), got {inputs.shape}')
+        values = inputs
+        for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+            values = values @ weight
+            values += bias
+            np.maximum(values, 0, out=values)
+        logits = (values @ self.weights[-1] + self.biases[-1])[:, 0]
+        return 1 / (1 + np.exp(-logits))
+
+
+class ValueNetworkEvaluator(evaluators.LeafEvaluator):
+    # Values leaves with a network over features.FeatureExtractor rows, with
+    # one forward pass per batch of leaves. Values are cached by board size
+    # and Zobrist hash, and finished games get their exact value.
+    def __init__(self, network: MLP, queue_size: int = 3,
+                 cache_size: int = 1 << 16):
+        self.network = network
+        self.queue_size = queue_size
+        self.cache = zobrist.TranspositionTable(cache_size)
+        self._extractors: Dict[Tuple[int, int], features.FeatureExtractor] = {}
+        self._buffer = np.zeros((0, network.input_size), dtype=np.float32)
+
+    def _get_extractor(self, width: int,
+                       height: int) -> 'features.FeatureExtractor':
+        key = (width, height)
+        if key not in self._extractors:
+            extractor = features.FeatureExtractor(width, height,
+                                                  self.queue_size)
+            if extractor.num_features != self.network.input_size:
+                raise ValueError(f'The network takes {self.network.input_size}'
+                                 f' inputs, but {width}x{height} boards have'
+                                 f' {extractor.num_features} features')
+            self._extractors[key] = extractor
+        return self._extractors[key]
+
+    def prepare(self, game: 'transcendence.TranscendenceGame') -> Any:
+        # The value when it is known, else the cache key and the encoded
+        # game.
+        if game.is_over():
+            return float(game.board.is_finished())
+        key = (game.board.width, game.board.height, game.zobrist_hash)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        extractor = self._get_extractor(game.board.width, game.board.height)
+        return key, extractor, extractor.encode(game)
+
+    def evaluate(self, prepared: List[Any]) -> List[float]:
+        # One forward pass for the distinct uncached games, which are
+        # extracted together per board size.
+        pending: Dict[features.FeatureExtractor, Dict] = {}
+        for item in prepared:
+            if not isinstance(item, float):
+                key, extractor, code = item
+                pending.setdefault(extractor, {}).setdefault(key, code)
+        values = {}
+        for extractor, codes in pending.items():
+            if len(self._buffer) < len(codes):
+                self._buffer = extractor.allocate(len(codes))
+            inputs = extractor.extract_encoded(list(codes.values()),
+                                               self._buffer)
+            for key, value in zip(codes, self.network.forward(inputs)):
+                values[key] = float(value)
+                self.cache.put(key, values[key])
+        return [item if isinstance(item, float) else values[item[0]]
+                for item in prepared]
+
+    def evaluate_games(self,
+                       games: Sequence['transcendence.TranscendenceGame']
+        ) -> np.ndarray:
+        # Values of games of one board size with a single feature
+        # extraction, bypassing the cache.
+        extractor = self._get_extractor(games[0].board.width,
+                                        games[0].board.height)
+        if len(self._buffer) < len(games):
+            self._buffer = extractor.allocate(len(games))
+        values = self.network.forward(extractor.extract(games, self._buffer))
+        for row, game in enumerate(games):
+            if game.is_over():
+                values[row] = float(game.board.is_finished())
+        return values
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import cards
+from . import features
+from . import mcts
+from . import network
+from . import transcendence
+
+
+class TestValueNetwork(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(3, 2)
+        board.set_tile(2, 1, transcendence.Tile.DESTROYED)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Thunder()
+        self.game.hand_right = cards.Explosion()
+        self.game.turns_left = 2
+        self.extractor = features.FeatureExtractor(3, 2)
+        self.network = network.MLP.random(
+            [self.extractor.num_features, 16, 8], seed=0)
+
+    def test_forward(self):
+        inputs = self.extractor.extract([self.game])
+        hidden = np.maximum(inputs @ self.network.weights[0]
+                            + self.network.biases[0], 0)
+        hidden = np.maximum(hidden @ self.network.weights[1]
+                            + self.network.biases[1], 0)
+        logit = hidden @ self.network.weights[2] + self.network.biases[2]
+        np.testing.assert_allclose(self.network.forward(inputs),
+                                   1 / (1 + np.exp(-logit[:, 0])), rtol=1e-5)
+        with self.assertRaises(ValueError):
+            self.network.forward(inputs[:, 1:])
+        with self.assertRaises(ValueError):
+            network.MLP(self.network.weights, self.network.biases[:-1])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'network.npz')
+            self.network.save(path)
+            loaded = network.MLP.load(path)
+        inputs = self.extractor.extract([self.game])
+        np.testing.assert_array_equal(loaded.forward(inputs),
+                                      self.network.forward(inputs))
+
+    def test_evaluator_batches_and_caches(self):
+        evaluator = network.ValueNetworkEvaluator(self.network)
+        other = transcendence.TranscendenceGame(self.game.board.copy())
+        other.turns_left = 1
+        prepared = [evaluator.prepare(self.game), evaluator.prepare(other),
+                    evaluator.prepare(self.game)]
+        values = evaluator.evaluate(prepared)
+        np.testing.assert_allclose(
+            values, evaluator.evaluate_games([self.game, other, self.game]),
+            rtol=1e-6)
+        self.assertEqual(values[0], values[2])
+        self.assertEqual(len(evaluator.cache), 2)
+        self.assertEqual(evaluator.prepare(self.game), values[0])
+
+        self.game.turns_left = 0
+        self.assertEqual(evaluator(self.game), 0.0)
+        larger = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(4, 4))
+        larger.turns_left = 1
+        with self.assertRaises(ValueError):
+            evaluator(larger)
+
+    def test_search_with_network(self):
+        evaluator = network.ValueNetworkEvaluator(self.network)
+        solver = mcts.MCTSSolver(seed=0, evaluator=evaluator,
+                                 leaf_batch_size=8)
+        move = solver.best_move(self.game, iterations=50)
+        self.assertIn(move.card, [self.game.hand_left, self.game.hand_right])
+        self.assertEqual(solver.root.visits, 50)
+        self.assertGreater(len(evaluator.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
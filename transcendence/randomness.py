@@ -0,0 +1,129 @@
+import random
+
+from typing import Any, List
+
+# Anything with the interface of random.Random, including the random module.
+RandomLike = Any
+
+
+class NumpyRandom(random.Random):
+    # random.Random interface over a NumPy Generator. Overriding random() and
+    # getrandbits() is enough for choice, choices, randint, sample and the
+    # rest to draw from the generator.
+    def __init__(self, generator):
+        self.generator = generator
+        super().__init__()
+
+    def seed(self, *args, **kwargs) -> None:
+        # The state lives in the generator.
+        pass
+
+    def random(self) -> float:
+        return float(self.generator.random())
+
+    def getrandbits(self, k: int) -> int:
+        value = int.from_bytes(self.generator.bytes((k + 7) // 8), 'little')
+        return value >> (-k % 8)
+
+    def random_batch(self, count: int) -> List[float]:
+        return self.generator.random(count).tolist()
+
+    def __reduce__(self):
+        return (NumpyRandom, (self.generator,))
+
+
+class UniformRandom(random.Random):
+    # Defining random() makes random.Random draw integers, choices and
+    # samples from it too, so generators that only change random() stay in
+    # step with each other draw for draw.
+    def random(self) -> float:
+        return super().random()
+
+
+class AntitheticRandom(UniformRandom):
+    # Mirrors every uniform of a UniformRandom with the same seed. Break
+    # rolls and alias table draws, which compare uniforms to thresholds,
+    # come out negatively correlated. As a UniformRandom, its integer draws,
+    # choices and samples are also derived from the mirrored uniforms, so
+    # the pair stays in step draw for draw, though an integer k is not
+    # mapped to n - 1 - k.
+    def random(self) -> float:
+        uniform = super().random()
+        # 1 - 0 would leave [0, 1), and 0 is its own mirror image anyway.
+        return 1.0 - uniform if uniform else 0.0
+
+
+# What the game draws for, each from its own stream of a StreamRandom.
+PURPOSES = ('hits', 'cards', 'tiles', 'mystery')
+
+
+class StreamRandom(UniformRandom):
+    # One independent stream per purpose in streams, with the generator
+    # itself left to policies. Two games given StreamRandoms with the same
+    # seed draw the same cards, special tiles and mystery results in the
+    # same order however differently they are played, which makes playouts
+    # of different moves common random numbers. With antithetic, every
+    # stream is mirrored as by AntitheticRandom.
+    def __init__(self, seed: Any = None, antithetic: bool = False):
+        self.antithetic = antithetic
+        self.streams = {}
+        super().__init__(seed)
+
+    def seed(self, a: Any = None, version: int = 2) -> None:
+        super().seed(a, version)
+        if a is None:
+            a = super().getrandbits(64)
+        stream_type = AntitheticRandom if self.antithetic else UniformRandom
+        self.streams = {purpose: stream_type(derive_seed(a, purpose))
+                        for purpose in PURPOSES}
+
+    def random(self) -> float:
+        uniform = super().random()
+        if self.antithetic and uniform:
+            return 1.0 - uniform
+        return uniform
+
+    def getstate(self) -> tuple:
+        return (super().getstate(), self.antithetic,
+                {purpose: stream.getstate()
+                 for purpose, stream in self.streams.items()})
+
+    def setstate(self, state: tuple) -> None:
+        base_state, self.antithetic, stream_states = state
+        super().setstate(base_state)
+        stream_type = AntitheticRandom if self.antithetic else UniformRandom
+        self.streams = {}
+        for purpose, stream_state in stream_states.items():
+            stream = stream_type()
+            stream.setstate(stream_state)
+            self.streams[purpose] = stream
+
+
+def get_stream(rng: RandomLike, purpose: str) -> RandomLike:
+    # The stream of rng for purpose if it is a StreamRandom, otherwise rng.
+    if isinstance(rng, StreamRandom):
+        return rng.streams[purpose]
+    return rng
+
+
+def make_rng(rng: Any = None) -> random.Random:
+    # Accepts None, a seed, a random.Random or a NumPy Generator.
+    if rng is None or isinstance(rng, (int, str, bytes)):
+        return random.Random(rng)
+    if isinstance(rng, random.Random):
+        return rng
+    if hasattr(rng, 'bit_generator'):
+        return NumpyRandom(rng)
+    raise ValueError(f'Unsupported random number generator {rng!r}')
+
+
+def derive_seed(seed: Any, *keys: Any) -> int:
+    # Independent, reproducible seeds for workers and tasks.
+    return random.Random(repr((seed,) + keys)).getrandbits(64)
+
+
+def uniforms(rng: RandomLike, count: int) -> List[float]:
+    random_batch = getattr(rng, 'random_batch', None)
+    if random_batch is not None:
+        return random_batch(count)
+    return [rng.random() for _ in range(count)]
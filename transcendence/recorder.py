@@ -0,0 +1,247 @@
+import json
+import os
+
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from . import medium
+from . import transcendence
+
+INDEX_FILE = 'index.json'
+
+
+def _get_columns(size: int, queue_size: int) -> Dict[str, Tuple]:
+    # Column name to (dtype, shape of one row). Moves are (x, y, is_left,
+    # is_change) with -1 for the missing position of change moves, cards are
+    # ToBinary card bytes and outcome is NaN until the game ends.
+    return {
+        'game': ('int64', ()),
+        'step': ('int32', ()),
+        'tiles': ('uint8', (size,)),
+        'hands': ('uint8', (2,)),
+        'queue': ('uint8', (queue_size,)),
+        'turns_left': ('int32', ()),
+        'changes_left': ('int32', ()),
+        'move': ('int16', (4,)),
+        'tile_counter': ('int16', (len(transcendence.Tile),)),
+        'outcome': ('float32', ()),
+    }
+
+
+def _chunk_path(path: str, chunk: int, column: str) -> str:
+    return os.path.join(path, f'chunk-{chunk:05d}.{column}.npy')
+
+
+class TrajectoryRecorder:
+    # Streams one row per TranscendenceGame.use_move of every attached game
+    # into preallocated memory-mapped .npy files, one per column. A new
+    # chunk is started every chunk_size rows, and index.json lists the
+    # chunks and how many of their rows are filled.
+    def __init__(self,
+                 path: str,
+                 width: int,
+                 height: int,
+                 queue_size: int = 3,
+                 chunk_size: int = 1 << 16):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.queue_size = queue_size
+        self.chunk_size = chunk_size
+        self.columns = _get_columns(width * height, queue_size)
+        os.makedirs(path, exist_ok=True)
+
+        self._chunks: List[int] = []
+        self._arrays: Dict[str, np.memmap] = None
+        self._row = 0
+        self._next_game = 0
+        self._games: Dict[int, int] = {}
+        self._steps: Dict[int, int] = {}
+        # Rows of games that are still running, waiting for the outcome.
+        self._pending: Dict[int, List[Tuple[int, int]]] = {}
+        self._pending_chunks: Counter = Counter()
+        self._open_chunks: Dict[int, Dict[str, np.memmap]] = {}
+        self._states: Dict[int, Tuple] = {}
+        self._start_chunk()
+
+    def _start_chunk(self) -> None:
+        chunk = len(self._chunks)
+        self._chunks.append(0)
+        self._arrays = {}
+        for column, (dtype, shape) in self.columns.items():
+            self._arrays[column] = np.lib.format.open_memmap(
+                _chunk_path(self.path, chunk, column), mode='w+',
+                dtype=dtype, shape=(self.chunk_size,) + shape)
+        self._arrays['outcome'][:] = np.nan
+        self._open_chunks[chunk] = self._arrays
+        self._row = 0
+        self._write_index()
+
+    def _write_index(self) -> None:
+        index = {
+            'width': self.width,
+            'height': self.height,
+            'queue_size': self.queue_size,
+            'chunk_size': self.chunk_size,
+            'columns': {column: [dtype, list(shape)]
+                        for column, (dtype, shape) in self.columns.items()},
+            'chunks': self._chunks,
+        }
+        with open(os.path.join(self.path, INDEX_FILE), 'w') as index_file:
+            json.dump(index, index_file)
+
+    def attach(self, game: 'transcendence.TranscendenceGame') -> int:
+        if (game.board.width, game.board.height) != (self.width, self.height):
+            raise ValueError('The board size does not match the recorder')
+        game_id = self._next_game
+        self._next_game += 1
+        self._games[id(game)] = game_id
+        self._steps[game_id] = 0
+        self._pending[game_id] = []
+        game.observers.append(self)
+        return game_id
+
+    def detach(self, game: 'transcendence.TranscendenceGame') -> None:
+        # Games detach themselves once they are over.
+        game_id = self._games.pop(id(game), None)
+        if game_id is None:
+            return
+        game.observers.remove(self)
+        self._finish_game(game_id, np.nan)
+
+    def before_move(self,
+                    game: 'transcendence.TranscendenceGame',
+                    move: 'transcendence.TranscendenceMove') -> None:
+        card_to_byte = medium.ToBinary._card_to_byte
+        self._states[id(game)] = (
+            [tile.value for tile in game.board.tiles],
+            [card_to_byte(game.hand_left), card_to_byte(game.hand_right)],
+            [card_to_byte(card) for card in game.hand_queue],
+            game.turns_left,
+            game.changes_left)
+
+    def after_move(self,
+                   game: 'transcendence.TranscendenceGame',
+                   move: 'transcendence.TranscendenceMove',
+                   tile_counter: Counter) -> None:
+        if self._row == self.chunk_size:
+            self._start_chunk()
+        game_id = self._games[id(game)]
+        chunk = len(self._chunks) - 1
+        row = self._row
+        tiles, hands, queue, turns_left, changes_left = self._states.pop(id(game))
+
+        arrays = self._arrays
+        arrays['game'][row] = game_id
+        arrays['step'][row] = self._steps[game_id]
+        arrays['tiles'][row] = tiles
+        arrays['hands'][row] = hands
+        arrays['queue'][row] = queue
+        arrays['turns_left'][row] = turns_left
+        arrays['changes_left'][row] = changes_left
+        arrays['move'][row] = [-1 if move.x is None else move.x,
+                               -1 if move.y is None else move.y,
+                               move.is_left, move.is_change]
+        counts = arrays['tile_counter'][row]
+        counts[:] = 0
+        for tile, count in tile_counter.items():
+            counts[tile.value] = count
+
+        self._row += 1
+        self._chunks[chunk] = self._row
+        self._steps[game_id] += 1
+        self._pending[game_id].append((chunk, row))
+        self._pending_chunks[chunk] += 1
+
+        if game.is_over():
+            game.observers.remove(self)
+            del self._games[id(game)]
+            self._finish_game(game_id, float(game.board.is_finished()))
+
+    def _finish_game(self, game_id: int, outcome: float) -> None:
+        for chunk, row in self._pending.pop(game_id):
+            self._open_chunks[chunk]['outcome'][row] = outcome
+            self._pending_chunks[chunk] -= 1
+        del self._steps[game_id]
+        self._close_finished_chunks()
+
+    def _close_finished_chunks(self) -> None:
+        current = len(self._chunks) - 1
+        for chunk in list(self._open_chunks):
+            if chunk != current and not self._pending_chunks[chunk]:
+                for array in self._open_chunks.pop(chunk).values():
+                    array.flush()
+                del self._pending_chunks[chunk]
+
+    def flush(self) -> None:
+        for arrays in self._open_chunks.values():
+            for array in arrays.values():
+                array.flush()
+        self._write_index()
+
+    def close(self) -> None:
+        # Games that are still running keep a NaN outcome.
+        for game_id in list(self._pending):
+            self._finish_game(game_id, np.nan)
+        self._games.clear()
+        self.flush()
+        self._open_chunks.clear()
+        self._arrays = None
+
+    def __enter__(self) -> 'TrajectoryRecorder':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class TrajectoryReader:
+    # Read-only, memory-mapped access to a recording. Arrays returned for a
+    # single chunk are views of the files and are never copied.
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as index_file:
+            self.index = json.load(index_file)
+        self.chunk_sizes = self.index['chunks']
+        self.columns = list(self.index['columns'])
+        self._offsets = np.concatenate([[0], np.cumsum(self.chunk_sizes)])
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def get_chunk(self, chunk: int) -> Dict[str, np.ndarray]:
+        rows = self.chunk_sizes[chunk]
+        return {column: np.load(_chunk_path(self.path, chunk, column),
+                                mmap_mode='r')[:rows]
+                for column in self.columns}
+
+    def iter_chunks(self) -> Iterator[Dict[str, np.ndarray]]:
+        for chunk in range(len(self.chunk_sizes)):
+            yield self.get_chunk(chunk)
+
+    def read(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        # Views when the rows are in one chunk; rows spanning chunks are
+        # concatenated into new arrays. Reads past the end are cut short,
+        # down to empty arrays.
+        stop = min(stop, len(self))
+        if start >= stop:
+            return {column: np.empty((0,) + tuple(shape), dtype=dtype)
+                    for column, (dtype, shape)
+                    in self.index['columns'].items()}
+        first = int(np.searchsorted(self._offsets, start, side='right')) - 1
+        last = int(np.searchsorted(self._offsets, max(start, stop - 1),
+                                   side='right')) - 1
+        parts = []
+        for chunk in range(first, last + 1):
+            offset = self._offsets[chunk]
+            arrays = self.get_chunk(chunk)
+            begin = max(start - offset, 0)
+            end = min(stop - offset, self.chunk_sizes[chunk])
+            parts.append({column: array[begin:end]
+                          for column, array in arrays.items()})
+        if len(parts) == 1:
+            return parts[0]
+        return {column: np.concatenate([part[column] for part in parts])
+                for column in self.columns}
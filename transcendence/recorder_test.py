@@ -0,0 +1,116 @@
+import math
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import generators
+from . import mcts
+from . import recorder
+from . import rollouts
+from . import transcendence
+
+
+class TestTrajectoryRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def new_game(self, seed):
+        board = transcendence.TranscendenceBoard(3, 2)
+        game = transcendence.TranscendenceGame(board, rng=seed)
+        game.turns_left = 4
+        return game
+
+    def play(self, game):
+        steps = 0
+        while not game.is_over():
+            game.use_move(generators.MoveGenerator.get_random_move(game))
+            steps += 1
+        return steps
+
+    def test_records_games_across_chunks(self):
+        games = [self.new_game(seed) for seed in range(3)]
+        with recorder.TrajectoryRecorder(self.path, 3, 2, chunk_size=4) as rec:
+            for game in games:
+                rec.attach(game)
+            steps = [self.play(game) for game in games]
+            for game in games:
+                self.assertEqual(game.observers, [])
+
+        reader = recorder.TrajectoryReader(self.path)
+        self.assertEqual(len(reader), sum(steps))
+        rows = reader.read(0, len(reader))
+        for game_id, game in enumerate(games):
+            mask = rows['game'] == game_id
+            self.assertEqual(list(rows['step'][mask]), list(range(steps[game_id])))
+            outcome = float(game.board.is_finished())
+            self.assertTrue((rows['outcome'][mask] == outcome).all())
+
+    def test_first_row_is_state_before_move(self):
+        game = self.new_game(0)
+        tiles = [tile.value for tile in game.board.tiles]
+        with recorder.TrajectoryRecorder(self.path, 3, 2) as rec:
+            rec.attach(game)
+            move = generators.MoveGenerator.get_random_move(game)
+            tile_counter = game.use_move(move)
+            rec.detach(game)
+
+        rows = recorder.TrajectoryReader(self.path).read(0, 1)
+        self.assertEqual(list(rows['tiles'][0]), tiles)
+        self.assertEqual(list(rows['move'][0]),
+                         [move.x, move.y, move.is_left, move.is_change])
+        for tile, count in tile_counter.items():
+            self.assertEqual(rows['tile_counter'][0][tile.value], count)
+        self.assertTrue(math.isnan(rows['outcome'][0]))
+
+    def test_searches_are_not_recorded(self):
+        game = self.new_game(0)
+        solver = mcts.MCTSSolver(seed=0)
+        evaluators = [
+            rollouts.RolloutEvaluator(10, workers=1, seed=0),
+            rollouts.RolloutEvaluator(10, workers=1, seed=0,
+                                      common_random_numbers=True)]
+        with recorder.TrajectoryRecorder(self.path, 3, 2) as rec:
+            rec.attach(game)
+            steps = 0
+            while not game.is_over():
+                for evaluator in evaluators:
+                    evaluator.evaluate(game)
+                game.use_move(solver.best_move(game, iterations=20))
+                steps += 1
+                self.assertEqual(game.observers,
+                                 [] if game.is_over() else [rec])
+
+        reader = recorder.TrajectoryReader(self.path)
+        self.assertEqual(len(reader), steps)
+        self.assertEqual(list(reader.read(0, steps)['step']),
+                         list(range(steps)))
+
+    def test_empty_reads(self):
+        game = self.new_game(0)
+        with recorder.TrajectoryRecorder(self.path, 3, 2) as rec:
+            reader = recorder.TrajectoryReader(self.path)
+            rows = reader.read(0, 10)
+            self.assertEqual(rows['tiles'].shape, (0, 6))
+            rec.attach(game)
+            steps = self.play(game)
+
+        reader = recorder.TrajectoryReader(self.path)
+        for start in [steps, steps + 1]:
+            rows = reader.read(start, steps + 5)
+            self.assertEqual(set(rows), set(reader.columns))
+            self.assertEqual(rows['move'].shape, (0, 4))
+            self.assertEqual(rows['outcome'].dtype, np.float32)
+
+    def test_rejects_other_board_size(self):
+        with recorder.TrajectoryRecorder(self.path, 4, 4) as rec:
+            with self.assertRaises(ValueError):
+                rec.attach(self.new_game(0))
+
+
+if __name__ == '__main__':
+    unittest.main()
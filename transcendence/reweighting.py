@@ -0,0 +1,306 @@
+import argparse
+import json
+import math
+import random
+import sys
+
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from . import evaluation
+from . import generators
+from . import randomness
+from . import transcendence
+
+Weights = Dict[Any, float]
+
+
+def _get_log_probabilities(weights: Weights) -> Dict[Any, float]:
+    total = sum(weight for weight in weights.values() if weight > 0)
+    return {value: math.log(weight / total) if weight > 0 else -math.inf
+            for value, weight in weights.items()}
+
+
+class DrawRecorder:
+    # Stands in for an AliasTable as a game's card_table or tile_table,
+    # drawing from it and counting every value drawn along with the total
+    # log-probability of the draws. Searches that play simulated moves on
+    # the game draw from the table underneath, see generators.unwrap_table,
+    # so only draws of moves actually played are counted.
+    def __init__(self, table: 'generators.AliasTable'):
+        self.table = table
+        self.weights = table.weights
+        self.log_probabilities = _get_log_probabilities(table.weights)
+        self.counts = Counter()
+        self.log_probability = 0.0
+
+    def draw(self, rng: 'randomness.RandomLike' = random) -> Any:
+        value = self.table.draw(rng)
+        self.counts[value] += 1
+        self.log_probability += self.log_probabilities[value]
+        return value
+
+    def draw_many(self,
+                  count: int,
+                  rng: 'randomness.RandomLike' = random) -> List[Any]:
+        return [self.draw(rng) for _ in range(count)]
+
+    def reset(self) -> None:
+        self.counts = Counter()
+        self.log_probability = 0.0
+
+
+class Estimate:
+    # A self-normalized importance sampling estimate. The effective sample
+    # size is how many unweighted runs the estimate is worth; when it is a
+    # small share of the runs, a few runs dominate and the estimate should
+    # not be trusted whatever its standard error says.
+    def __init__(self, mean: float, std_error: float,
+                 effective_sample_size: float, runs: int):
+        self.mean = mean
+        self.std_error = std_error
+        self.effective_sample_size = effective_sample_size
+        self.runs = runs
+
+    def to_dict(self) -> dict:
+        return {'mean': self.mean, 'std_error': self.std_error,
+                'effective_sample_size': self.effective_sample_size,
+                'runs': self.runs}
+
+    def __str__(self) -> str:
+        return (f'{self.mean:.4f} +/- {self.std_error:.4f}'
+                f' (ESS {self.effective_sample_size:.0f} of {self.runs})')
+
+
+class RecordedRuns:
+    # Outcomes of episodes played with known card and special tile weights,
+    # with the number of times each card and tile was drawn in every
+    # episode. Only draws depend on the weights, so the same episodes
+    # estimate outcomes under other weights by importance sampling, weighting
+    # each episode by how much likelier its draws are under them.
+    def __init__(self, card_weights: Weights, tile_weights: Weights):
+        self.card_weights = dict(card_weights)
+        self.tile_weights = dict(tile_weights)
+        self.successes: List[bool] = []
+        self.turns_used: List[int] = []
+        self.card_counts: List[Counter] = []
+        self.tile_counts: List[Counter] = []
+        self.log_probabilities: List[float] = []
+
+    def add(self,
+            episode: 'evaluation.Episode',
+            cards: DrawRecorder,
+            tiles: DrawRecorder) -> None:
+        self.successes.append(episode.success)
+        self.turns_used.append(episode.turns_used)
+        self.card_counts.append(cards.counts)
+        self.tile_counts.append(tiles.counts)
+        self.log_probabilities.append(cards.log_probability
+                                      + tiles.log_probability)
+
+    def __len__(self) -> int:
+        return len(self.successes)
+
+    def get_log_weights(self,
+                        card_weights: Weights = None,
+                        tile_weights: Weights = None) -> List[float]:
+        # Log of the likelihood ratio of every episode's draws under the
+        # given weights to the recorded ones. Weights left out are the
+        # recorded ones.
+        log_weights = [0.0] * len(self)
+        for recorded, target, counts in [
+                (self.card_weights, card_weights, self.card_counts),
+                (self.tile_weights, tile_weights, self.tile_counts)]:
+            if target is None:
+                continue
+            never_drawn = [value for value, weight in target.items()
+                           if weight > 0 and recorded.get(value, 0) <= 0]
+            if never_drawn:
+                raise ValueError(f'{never_drawn} were never drawn in the'
+                                 ' recorded runs, so their effect can not be'
+                                 ' estimated from them')
+            recorded_logs = _get_log_probabilities(recorded)
+            target_logs = _get_log_probabilities(target)
+            ratios = {value: target_logs.get(value, -math.inf) - log
+                      for value, log in recorded_logs.items()
+                      if log > -math.inf}
+            for run, run_counts in enumerate(counts):
+                log_weights[run] += sum(ratios[value] * count
+                                        for value, count in run_counts.items())
+        return log_weights
+
+    def reweight(self,
+                 card_weights: Weights = None,
+                 tile_weights: Weights = None,
+                 outcome: str = 'success') -> Estimate:
+        # Estimated mean of outcome, 'success' or 'turns_used', under the
+        # given weights.
+        values = self.successes if outcome == 'success' else self.turns_used
+        log_weights = self.get_log_weights(card_weights, tile_weights)
+        if not values:
+            raise ValueError('No recorded runs')
+        top = max(log_weights)
+        if top == -math.inf:
+            return Estimate(0.0, math.inf, 0.0, len(values))
+        weights = [math.exp(log_weight - top) for log_weight in log_weights]
+        total = sum(weights)
+        mean = sum(weight * value for weight, value in zip(weights, values)) / total
+        std_error = math.sqrt(sum((weight * (value - mean)) ** 2
+                                  for weight, value in zip(weights, values))) / total
+        effective_sample_size = total ** 2 / sum(weight * weight
+                                                 for weight in weights)
+        return Estimate(mean, std_error, effective_sample_size, len(values))
+
+    def sweep(self,
+              variants: Dict[str, Tuple[Weights, Weights]],
+              outcome: str = 'success') -> Dict[str, Estimate]:
+        # Estimates for every named (card weights, tile weights) variant,
+        # where either may be None to keep the recorded weights.
+        return {name: self.reweight(card_weights, tile_weights, outcome)
+                for name, (card_weights, tile_weights) in variants.items()}
+
+    def to_dict(self) -> dict:
+        # Cards are stored by class name and tiles by name.
+        def encode(weights_or_counts: dict) -> dict:
+            return {_get_name(value): count
+                    for value, count in weights_or_counts.items()}
+
+        return {
+            'card_weights': encode(self.card_weights),
+            'tile_weights': encode(self.tile_weights),
+            'successes': self.successes,
+            'turns_used': self.turns_used,
+            'card_counts': [encode(counts) for counts in self.card_counts],
+            'tile_counts': [encode(counts) for counts in self.tile_counts],
+            'log_probabilities': self.log_probabilities,
+        }
+
+    @classmethod
+    def from_dict(cls, runs_dict: dict) -> 'RecordedRuns':
+        card_types = {card_type.__name__: card_type for card_type
+                      in generators.CardGenerator.get_probabilities()}
+
+        def decode(names: Dict[str, Any], values: Dict[str, Any]) -> dict:
+            return {values[name]: count for name, count in names.items()}
+
+        runs = cls(decode(runs_dict['card_weights'], card_types),
+                   decode(runs_dict['tile_weights'], transcendence.Tile.__members__))
+        runs.successes = list(runs_dict['successes'])
+        runs.turns_used = list(runs_dict['turns_used'])
+        runs.card_counts = [Counter(decode(counts, card_types))
+                            for counts in runs_dict['card_counts']]
+        runs.tile_counts = [
+            Counter(decode(counts, transcendence.Tile.__members__))
+            for counts in runs_dict['tile_counts']]
+        runs.log_probabilities = list(runs_dict['log_probabilities'])
+        return runs
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as output:
+            json.dump(self.to_dict(), output)
+
+    @classmethod
+    def load(cls, path: str) -> 'RecordedRuns':
+        with open(path) as runs_file:
+            return cls.from_dict(json.load(runs_file))
+
+
+def _get_name(value: Any) -> str:
+    if isinstance(value, transcendence.Tile):
+        return value.name
+    return value.__name__
+
+
+def record_runs(policy: 'evaluation.Policy',
+                layout: 'evaluation.Layout',
+                turns: int,
+                changes: int = 0,
+                episodes: int = 1000,
+                seed=0,
+                card_weights: Weights = None,
+                tile_weights: Weights = None) -> RecordedRuns:
+    # Plays seeded episodes as evaluation.evaluate_policy does, drawing
+    # cards and special tiles from the given weights, or the generators'
+    # defaults, and records every draw. A policy that simulates moves on
+    # the game must draw from generators.unwrap_table of its tables, as the
+    # searches here do, or its draws are weighted as part of the episode.
+    if card_weights is None:
+        card_weights = generators.CardGenerator.get_probabilities()
+    if tile_weights is None:
+        tile_weights = generators.TileGenerator.get_probabilities()
+    card_table = generators.AliasTable(card_weights)
+    tile_table = generators.AliasTable(tile_weights)
+    runs = RecordedRuns(card_weights, tile_weights)
+    for episode in range(episodes):
+        cards = DrawRecorder(card_table)
+        tiles = DrawRecorder(tile_table)
+        runs.add(evaluation.play_episode(
+                     policy, layout, turns, changes,
+                     randomness.derive_seed(seed, episode), cards, tiles),
+                 cards, tiles)
+    return runs
+
+
+def _apply_overrides(weights: Weights,
+                     overrides: Dict[str, float]) -> Weights:
+    # The weights with the ones named in overrides replaced.
+    names = {_get_name(value): value for value in weights}
+    unknown = [name for name in overrides if name not in names]
+    if unknown:
+        raise ValueError(f'Unknown values {unknown}, expected some of'
+                         f' {sorted(names)}')
+    result = dict(weights)
+    for name, weight in overrides.items():
+        result[names[name]] = weight
+    return result
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Records episodes once and estimates success rates under'
+                    ' other card and tile weights from them.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help='Play and record episodes')
+    record.add_argument('policy', help='Policy as module:attribute')
+    record.add_argument('output', help='File to write the runs to')
+    record.add_argument('--layout', default='square6')
+    record.add_argument('--turns', type=int, default=10)
+    record.add_argument('--changes', type=int, default=2)
+    record.add_argument('--episodes', type=int, default=10000)
+    record.add_argument('--seed', type=int, default=0)
+    sweep = commands.add_parser('sweep', help='Reweight recorded episodes')
+    sweep.add_argument('runs', help='File written by record')
+    sweep.add_argument('variants',
+                       help='JSON file mapping variant names to'
+                            ' {"cards": {...}, "tiles": {...}} weight'
+                            ' overrides by card class or tile name')
+    sweep.add_argument('--outcome', choices=['success', 'turns_used'],
+                       default='success')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        runs = record_runs(evaluation.load_policy(args.policy), args.layout,
+                           args.turns, args.changes, args.episodes, args.seed)
+        runs.save(args.output)
+        print(f'{len(runs)} runs: {runs.reweight()}')
+        return 0
+
+    runs = RecordedRuns.load(args.runs)
+    with open(args.variants) as variants_file:
+        variant_overrides = json.load(variants_file)
+    variants = {
+        name: (_apply_overrides(runs.card_weights, overrides.get('cards', {})),
+               _apply_overrides(runs.tile_weights, overrides.get('tiles', {})))
+        for name, overrides in variant_overrides.items()}
+    print(f'{"recorded":<30} {runs.reweight(outcome=args.outcome)}')
+    for name, (card_weights, tile_weights) in variants.items():
+        try:
+            estimate = runs.reweight(card_weights, tile_weights, args.outcome)
+        except ValueError as error:
+            estimate = error
+        print(f'{name:<30} {estimate}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
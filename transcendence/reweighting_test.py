@@ -0,0 +1,90 @@
+import unittest
+
+from . import cards
+from . import generators
+from . import layouts
+from . import mcts
+from . import reweighting
+from . import rollouts
+from . import transcendence
+
+
+class TestReweighting(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.layout = layouts.BoardLayout('small', ['####', '####', '####'])
+        cls.runs = reweighting.record_runs(
+            generators.MoveGenerator.get_random_move, cls.layout, 4, 1,
+            episodes=1500, seed=0)
+
+    def test_records_every_draw(self):
+        card_table = generators.AliasTable(
+            generators.CardGenerator.get_probabilities())
+        recorder = reweighting.DrawRecorder(card_table)
+        game = transcendence.TranscendenceGame(
+            self.layout.create_board(), rng=0, card_table=recorder)
+        game.hand_left = None
+        game.hand_right = None
+        game.hand_queue = []
+        game.fix_hand()
+        self.assertEqual(sum(recorder.counts.values()), 5)
+        self.assertAlmostEqual(
+            recorder.log_probability,
+            sum(recorder.log_probabilities[card_type] * count
+                for card_type, count in recorder.counts.items()))
+
+    def test_search_draws_are_not_recorded(self):
+        solver = mcts.MCTSSolver(seed=0)
+        evaluator = rollouts.RolloutEvaluator(5, workers=1, seed=0)
+
+        def policy(game):
+            recorders = [game.card_table, game.tile_table]
+            before = [(sum(recorder.counts.values()), recorder.log_probability)
+                      for recorder in recorders]
+            evaluator.evaluate(game)
+            move = solver.best_move(game, iterations=20)
+            self.assertEqual([game.card_table, game.tile_table], recorders)
+            self.assertEqual(
+                [(sum(recorder.counts.values()), recorder.log_probability)
+                 for recorder in recorders], before)
+            return move
+
+        runs = reweighting.record_runs(policy, self.layout, 4, 1, episodes=3)
+        self.assertEqual(len(runs), 3)
+
+    def test_recorded_weights_are_unweighted(self):
+        estimate = self.runs.reweight(
+            generators.CardGenerator.get_probabilities(),
+            generators.TileGenerator.get_probabilities())
+        self.assertAlmostEqual(estimate.mean,
+                               sum(self.runs.successes) / len(self.runs))
+        self.assertAlmostEqual(estimate.effective_sample_size, len(self.runs))
+
+    def test_matches_direct_simulation(self):
+        weights = dict(generators.CardGenerator.get_probabilities())
+        weights[cards.Hellfire] *= 2
+        estimate = self.runs.reweight(weights)
+        self.assertLess(estimate.effective_sample_size, len(self.runs))
+
+        direct = reweighting.record_runs(
+            generators.MoveGenerator.get_random_move, self.layout, 4, 1,
+            episodes=1500, seed=1, card_weights=weights)
+        rate = sum(direct.successes) / len(direct)
+        self.assertAlmostEqual(estimate.mean, rate,
+                               delta=4 * (estimate.std_error + 0.012))
+
+    def test_unsupported_weights(self):
+        weights = dict(generators.TileGenerator.get_probabilities())
+        weights[transcendence.Tile.RELOCATION] = 170
+        with self.assertRaises(ValueError):
+            self.runs.reweight(tile_weights=weights)
+
+    def test_round_trip(self):
+        runs = reweighting.RecordedRuns.from_dict(self.runs.to_dict())
+        self.assertEqual(runs.card_counts, self.runs.card_counts)
+        self.assertEqual(runs.tile_weights, self.runs.tile_weights)
+        self.assertEqual(str(runs.reweight()), str(self.runs.reweight()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+import math
+import os
+import random
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, List, Tuple
+
+from . import generators
+from . import randomness
+from . import transcendence
+
+Policy = Callable[['transcendence.TranscendenceGame'],
+                  'transcendence.TranscendenceMove']
+
+
+def play_out(game: 'transcendence.TranscendenceGame',
+             policy: Policy = generators.MoveGenerator.get_random_move) -> float:
+    # Plays the game to the end in place. 1 if the board was cleared.
+    while not game.is_over():
+        game.use_move(policy(game))
+    return float(game.board.is_finished())
+
+
+def _run_rollouts(game: 'transcendence.TranscendenceGame',
+                  move: 'transcendence.TranscendenceMove',
+                  count: int,
+                  policy: Policy,
+                  seed: int) -> Tuple[int, float, float]:
+    # Observers and recorded tables only see moves that are actually
+    # played.
+    total = 0.0
+    total_squares = 0.0
+    snapshot = game.snapshot()
+    game_rng, observers = game.rng, game.observers
+    card_table, tile_table = game.card_table, game.tile_table
+    game.rng = random.Random(seed)
+    game.observers = []
+    game.card_table = generators.unwrap_table(card_table)
+    game.tile_table = generators.unwrap_table(tile_table)
+    try:
+        for _ in range(count):
+            game.restore(snapshot)
+            game.use_move(move)
+            outcome = play_out(game, policy)
+            total += outcome
+            total_squares += outcome * outcome
+    finally:
+        game.restore(snapshot)
+        game.rng = game_rng
+        game.observers = observers
+        game.card_table, game.tile_table = card_table, tile_table
+    return count, total, total_squares
+
+
+def _run_common_rollouts(game: 'transcendence.TranscendenceGame',
+                         move: 'transcendence.TranscendenceMove',
+                         start: int,
+                         count: int,
+                         policy: Policy,
+                         seed: int,
+                         antithetic: bool) -> List[float]:
+    # Rollout r draws from a StreamRandom seeded from (seed, r) whatever the
+    # move, so rollout r of every move sees the same cards, special tiles,
+    # break rolls and mystery results for as long as their games allow.
+    # With antithetic, rollouts 2i and 2i + 1 share a seed and the second
+    # is mirrored.
+    outcomes = []
+    snapshot = game.snapshot()
+    game_rng, observers = game.rng, game.observers
+    card_table, tile_table = game.card_table, game.tile_table
+    game.observers = []
+    game.card_table = generators.unwrap_table(card_table)
+    game.tile_table = generators.unwrap_table(tile_table)
+    try:
+        for rollout in range(start, start + count):
+            game.restore(snapshot)
+            game.rng = randomness.StreamRandom(
+                randomness.derive_seed(seed,
+                                       rollout // 2 if antithetic else rollout),
+                antithetic=antithetic and rollout % 2 == 1)
+            game.use_move(move)
+            outcomes.append(play_out(game, policy))
+    finally:
+        game.restore(snapshot)
+        game.rng = game_rng
+        game.observers = observers
+        game.card_table, game.tile_table = card_table, tile_table
+    return outcomes
+
+
+def _get_std_error(values: List[float]) -> float:
+    if len(values) < 2:
+        return math.inf
+    mean = sum(values) / len(values)
+    variance = sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+    return math.sqrt(variance / len(values))
+
+
+class MoveScore:
+    def __init__(self,
+                 move: 'transcendence.TranscendenceMove',
+                 rollouts: int,
+                 total: float,
+                 total_squares: float,
+                 outcomes: List[float] = None,
+                 group_size: int = 1):
+        self.move = move
+        self.rollouts = rollouts
+        self.mean = total / rollouts if rollouts else 0.0
+        if rollouts > 1:
+            variance = max(0.0, (total_squares - rollouts * self.mean ** 2)
+                           / (rollouts - 1))
+            self.std_error = math.sqrt(variance / rollouts)
+        else:
+            self.std_error = math.inf
+        # Outcomes of every rollout in order, kept under common random
+        # numbers, where rollouts of different moves are paired. Antithetic
+        # rollouts are not independent, so they are averaged in groups of
+        # group_size before errors are estimated.
+        self.outcomes = outcomes
+        self.group_size = group_size
+        if outcomes is not None:
+            self.std_error = _get_std_error(self._get_groups(outcomes))
+
+    def _get_groups(self, values: List[float]) -> List[float]:
+        size = self.group_size
+        return [sum(values[start:start + size]) / len(values[start:start + size])
+                for start in range(0, len(values), size)]
+
+    def compare(self, other: 'MoveScore') -> Tuple[float, float]:
+        # How much better this move scores than other, with the standard
+        # error of the difference. Paired rollouts share their noise, which
+        # then cancels out of the difference.
+        difference = self.mean - other.mean
+        if (self.outcomes is not None and other.outcomes is not None
+                and len(self.outcomes) == len(other.outcomes)):
+            return difference, _get_std_error(self._get_groups(
+                [mine - theirs for mine, theirs
+                 in zip(self.outcomes, other.outcomes)]))
+        return difference, math.sqrt(self.std_error ** 2
+                                     + other.std_error ** 2)
+
+    def __str__(self) -> str:
+        return (f'{str(self.move)}\n'
+                f' {self.mean:.4f} +/- {self.std_error:.4f}'
+                f' ({self.rollouts} rollouts)')
+
+
+class RolloutEvaluator:
+    # Scores every valid move by the mean outcome of its playouts. Playouts
+    # are cut into batches of at most batch_size and spread over a process
+    # pool, so every worker gets a similar share however many moves there
+    # are. Every batch has its own seed, so results only depend on seed.
+    # With common_random_numbers, rollout k of every move replays the same
+    # random streams instead, so MoveScore.compare sees the difference the
+    # moves make rather than the luck of their playouts; antithetic then
+    # mirrors every other rollout.
+    def __init__(self,
+                 rollouts_per_move: int = 100,
+                 workers: int = None,
+                 batch_size: int = None,
+                 policy: Policy = generators.MoveGenerator.get_random_move,
+                 seed: int = None,
+                 common_random_numbers: bool = False,
+                 antithetic: bool = False):
+        if antithetic and not common_random_numbers:
+            raise ValueError('antithetic needs common_random_numbers')
+        self.rollouts_per_move = rollouts_per_move
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.policy = policy
+        self.seed = seed
+        self.common_random_numbers = common_random_numbers
+        self.antithetic = antithetic
+        self._evaluations = 0
+        self._executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> 'RolloutEvaluator':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _get_batch_size(self, move_count: int) -> int:
+        if self.batch_size:
+            return self.batch_size
+        # Aim for a few batches per worker to even out uneven playouts.
+        total = move_count * self.rollouts_per_move
+        return max(1, math.ceil(total / (self.workers * 4)))
+
+    def evaluate(self,
+                 game: 'transcendence.TranscendenceGame') -> List[MoveScore]:
+        moves = generators.MoveGenerator.get_valid_moves(game)
+        batch_size = self._get_batch_size(len(moves))
+        self._evaluations += 1
+        if self.common_random_numbers:
+            return self._evaluate_common(game, moves, batch_size)
+        tasks = []
+        for index in range(len(moves)):
+            remaining = self.rollouts_per_move
+            while remaining > 0:
+                count = min(batch_size, remaining)
+                seed = randomness.derive_seed(self.seed, self._evaluations,
+                                              len(tasks))
+                tasks.append((index, count, seed))
+                remaining -= count
+
+        totals = [[0, 0.0, 0.0] for _ in moves]
+        if self.workers == 1:
+            results = [_run_rollouts(game, moves[index], count, self.policy, seed)
+                       for index, count, seed in tasks]
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(_run_rollouts, game, moves[index],
+                                       count, self.policy, seed)
+                       for index, count, seed in tasks]
+            results = [future.result() for future in futures]
+
+        for (index, _, _), result in zip(tasks, results):
+            for slot, value in enumerate(result):
+                totals[index][slot] += value
+
+        return [MoveScore(move, *total) for move, total in zip(moves, totals)]
+
+    def _evaluate_common(self,
+                         game: 'transcendence.TranscendenceGame',
+                         moves: List['transcendence.TranscendenceMove'],
+                         batch_size: int) -> List[MoveScore]:
+        seed = randomness.derive_seed(self.seed, self._evaluations)
+        tasks = [(index, start, min(batch_size, self.rollouts_per_move - start))
+                 for index in range(len(moves))
+                 for start in range(0, self.rollouts_per_move, batch_size)]
+        arguments = [(game, moves[index], start, count, self.policy, seed,
+                      self.antithetic) for index, start, count in tasks]
+        if self.workers == 1:
+            results = [_run_common_rollouts(*task) for task in arguments]
+        else:
+            executor = self._get_executor()
+            futures = [executor.submit(_run_common_rollouts, *task)
+                       for task in arguments]
+            results = [future.result() for future in futures]
+
+        outcomes = [[] for _ in moves]
+        for (index, _, _), result in zip(tasks, results):
+            outcomes[index].extend(result)
+        return [MoveScore(move, len(values), sum(values),
+                          sum(value * value for value in values), values,
+                          2 if self.antithetic else 1)
+                for move, values in zip(moves, outcomes)]
+
+    def best_move(self,
+                  game: 'transcendence.TranscendenceGame'
+                  ) -> 'transcendence.TranscendenceMove':
+        return max(self.evaluate(game), key=lambda score: score.mean).move
@@ -0,0 +1,71 @@
+import pickle
+import unittest
+
+from . import evaluation
+from . import generators
+from . import randomness
+from . import rollouts
+from . import transcendence
+
+
+class TestRolloutEvaluator(unittest.TestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(3, 3)
+        for x in range(3):
+            for y in range(3):
+                if (x, y) != (0, 0):
+                    board.set_tile(x, y, transcendence.Tile.DESTROYED)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.turns_left = 1
+
+    def test_finishing_moves_score_one(self):
+        evaluator = rollouts.RolloutEvaluator(rollouts_per_move=5, workers=1,
+                                              batch_size=2, seed=0)
+        scores = evaluator.evaluate(self.game)
+        self.assertEqual(len(scores), 2)
+        for score in scores:
+            self.assertEqual(score.rollouts, 5)
+            self.assertEqual(score.mean, 1.0)
+            self.assertEqual(score.std_error, 0.0)
+
+    def test_evaluate_leaves_game_untouched(self):
+        evaluator = rollouts.RolloutEvaluator(rollouts_per_move=3, workers=1)
+        evaluator.evaluate(self.game)
+        self.assertEqual(self.game.turns_left, 1)
+        self.assertIn((0, 0), self.game.board.breakable_tiles)
+
+
+class TestCommonRandomNumbers(unittest.TestCase):
+    def setUp(self):
+        self.game = evaluation.make_game('square6', 3, 1, seed=0)
+
+    def test_streams_are_independent(self):
+        first = randomness.StreamRandom(7)
+        second = randomness.StreamRandom(7)
+        first.streams['hits'].random()
+        first.random()
+        self.assertEqual(
+            generators.CardGenerator.get_random_cards(5, first.streams['cards']),
+            generators.CardGenerator.get_random_cards(5, second.streams['cards']))
+        copy = pickle.loads(pickle.dumps(first))
+        self.assertEqual(copy.streams['tiles'].random(),
+                         first.streams['tiles'].random())
+
+        mirrored = randomness.StreamRandom(7, antithetic=True)
+        self.assertAlmostEqual(second.streams['hits'].random()
+                               + mirrored.streams['hits'].random(), 1.0)
+
+    def test_rollouts_do_not_depend_on_batches(self):
+        scores = [rollouts.RolloutEvaluator(
+                      rollouts_per_move=6, workers=1, batch_size=batch_size,
+                      seed=0, common_random_numbers=True,
+                      antithetic=True).evaluate(self.game)
+                  for batch_size in [1, 4]]
+        self.assertEqual([score.outcomes for score in scores[0]],
+                         [score.outcomes for score in scores[1]])
+        self.assertEqual(len(scores[0][0].outcomes), 6)
+        self.assertEqual(scores[0][0].compare(scores[0][0]), (0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
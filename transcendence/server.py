@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from . import expectimax
+from . import mcts
+from . import medium
+from . import transcendence
+from . import zobrist
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8421
+
+# Anything with best_move(game, **solve_kwargs) returning a move.
+SolverFactory = Callable[[], Any]
+
+SOLVERS: Dict[str, Tuple[SolverFactory, dict]] = {
+    'mcts': (mcts.MCTSSolver, {'iterations': 1000}),
+    'expectimax': (expectimax.ExpectimaxSolver, {}),
+}
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# The solver of the current worker. Every worker builds one when it starts
+# and keeps it, with its caches, for every batch it is given.
+_worker_solver = None
+_worker_kwargs: dict = {}
+
+
+def _init_worker(solver_factory: SolverFactory, solve_kwargs: dict) -> None:
+    global _worker_solver, _worker_kwargs
+    _worker_solver = solver_factory()
+    _worker_kwargs = solve_kwargs
+
+
+def _solve_batch(game_jsons: List[str]) -> List[Tuple[bool, str]]:
+    # (True, move JSON) or (False, error message) for every game.
+    results = []
+    for game_json in game_jsons:
+        try:
+            game = medium.ToJson.json_to_game(game_json)
+            move = _worker_solver.best_move(game, **_worker_kwargs)
+            results.append((True, medium.ToJson.move_to_json(move)))
+        except Exception as error:
+            results.append((False, f'{type(error).__name__}: {error}'))
+    return results
+
+
+def _state_key(game: 'transcendence.TranscendenceGame') -> Hashable:
+    return (game.board.width, game.board.height, game.zobrist_hash)
+
+
+class SolveServer:
+    # Answers POST /solve with the move for a game in ToJson.game_to_json
+    # format, as ToJson.move_to_json. Requests that arrive within batch_delay
+    # of each other are sent to the worker pool together, up to batch_size
+    # at a time. Requests for a state that is already being solved wait for
+    # that result, and recent results are answered from a cache. With one
+    # worker, solving happens on a thread of this process.
+    def __init__(self,
+                 solver_factory: SolverFactory = mcts.MCTSSolver,
+                 solve_kwargs: dict = None,
+                 workers: int = 1,
+                 batch_size: int = 8,
+                 batch_delay: float = 0.005,
+                 cache_size: int = 1 << 12):
+        if workers < 1 or batch_size < 1:
+            raise ValueError('workers and batch_size must be positive')
+        self.solver_factory = solver_factory
+        self.solve_kwargs = ({'iterations': 1000} if solve_kwargs is None
+                             else solve_kwargs)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.cache = zobrist.TranspositionTable(cache_size)
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0,
+                      'batches': 0, 'solved': 0, 'errors': 0}
+        self._executor: Executor = None
+        self._server: asyncio.AbstractServer = None
+        self._queue: asyncio.Queue = None
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._tasks = set()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            executor_type = (ThreadPoolExecutor if self.workers == 1
+                             else ProcessPoolExecutor)
+            self._executor = executor_type(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(self.solver_factory, self.solve_kwargs))
+        return self._executor
+
+    async def start(self,
+                    host: str = DEFAULT_HOST,
+                    port: int = DEFAULT_PORT,
+                    path: str = None) -> None:
+        # Listens on the Unix socket at path if given, otherwise on host and
+        # port. Port 0 picks a free port, see address.
+        self._queue = asyncio.Queue()
+        self._spawn(self._collect_batches())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, host, port)
+
+    @property
+    def address(self) -> Any:
+        return self._server.sockets[0].getsockname()
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def __aenter__(self) -> 'SolveServer':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def solve(self, game_json: str) -> str:
+        # Raises ValueError for games that can not be solved and
+        # RuntimeError if the solver failed.
+        self.stats['requests'] += 1
+        try:
+            game = medium.ToJson.json_to_game(game_json)
+            over = game.is_over()
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError(f'Invalid game: {error!r}') from error
+        if over:
+            raise ValueError('The game is already over')
+
+        key = _state_key(game)
+        move_json = self.cache.get(key)
+        if move_json is not None:
+            self.stats['cache_hits'] += 1
+            return move_json
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            self._queue.put_nowait((key, game_json))
+        else:
+            self.stats['coalesced'] += 1
+        return await asyncio.shield(future)
+
+    async def _collect_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._spawn(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[Hashable, str]]) -> None:
+        self.stats['batches'] += 1
+        keys = [key for key, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _solve_batch,
+                [game_json for _, game_json in batch])
+        except Exception as error:
+            results = [(False, f'{type(error).__name__}: {error}')] * len(batch)
+
+        for key, (solved, value) in zip(keys, results):
+            future = self._pending.pop(key, None)
+            if solved:
+                self.stats['solved'] += 1
+                self.cache.put(key, value)
+            else:
+                self.stats['errors'] += 1
+            if future is None or future.done():
+                continue
+            if solved:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, str]:
+        if target == '/solve':
+            if method != 'POST':
+                return 405, json.dumps({'error': 'Use POST'})
+            try:
+                return 200, await self.solve(body.decode('utf-8'))
+            except ValueError as error:
+                return 400, json.dumps({'error': str(error)})
+            except RuntimeError as error:
+                return 500, json.dumps({'error': str(error)})
+        if target == '/stats':
+            return 200, json.dumps(dict(self.stats,
+                                        cache_size=len(self.cache),
+                                        cache_hit_rate=self.cache.get_hit_rate()))
+        return 404, json.dumps({'error': f'Unknown path {target}'})
+
+    async def _handle_connection(self,
+                                 reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        # Minimal HTTP/1.1 with keep-alive: one request line, headers and a
+        # Content-Length body per request.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or length < 0:
+                    status, payload = 400, json.dumps({'error': 'Bad request'})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self._route(parts[0], parts[1], body)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(_format_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _format_response(status: int, payload: str, keep_alive: bool) -> bytes:
+    body = payload.encode('utf-8')
+    head = (f'HTTP/1.1 {status} {_REASONS[status]}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def request(method: str,
+                  target: str,
+                  body: str = '',
+                  host: str = DEFAULT_HOST,
+                  port: int = DEFAULT_PORT,
+                  path: str = None) -> Tuple[int, str]:
+    # One request to a SolveServer, returning the status and body.
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        data = body.encode('utf-8')
+        writer.write((f'{method} {target} HTTP/1.1\r\n'
+                      f'Host: {host}\r\n'
+                      f'Content-Length: {len(data)}\r\n'
+                      'Connection: close\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+        status_line = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        payload = await reader.readexactly(int(headers.get('content-length', 0)))
+        return int(status_line.split()[1]), payload.decode('utf-8')
+    finally:
+        writer.close()
+
+
+async def request_move(game: 'transcendence.TranscendenceGame',
+                       host: str = DEFAULT_HOST,
+                       port: int = DEFAULT_PORT,
+                       path: str = None) -> 'transcendence.TranscendenceMove':
+    status, payload = await request('POST', '/solve',
+                                    medium.ToJson.game_to_json(game),
+                                    host, port, path)
+    if status == 400:
+        raise ValueError(json.loads(payload)['error'])
+    if status != 200:
+        raise RuntimeError(json.loads(payload)['error'])
+    return medium.ToJson.json_to_move(payload)
+
+
+def solve_remote(game: 'transcendence.TranscendenceGame',
+                 host: str = DEFAULT_HOST,
+                 port: int = DEFAULT_PORT,
+                 path: str = None) -> 'transcendence.TranscendenceMove':
+    # The move a running SolveServer recommends for game.
+    return asyncio.run(request_move(game, host, port, path))
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Serves solver moves to local clients over HTTP.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help='Unix socket to listen on instead')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='mcts')
+    parser.add_argument('--iterations', type=int,
+                        help='Iterations per move of the mcts solver')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--batch-delay', type=float, default=0.005)
+    parser.add_argument('--cache-size', type=int, default=1 << 12)
+    args = parser.parse_args(argv)
+
+    solver_factory, solve_kwargs = SOLVERS[args.solver]
+    if args.iterations is not None and args.solver == 'mcts':
+        solve_kwargs = dict(solve_kwargs, iterations=args.iterations)
+
+    async def serve() -> None:
+        async with SolveServer(solver_factory, solve_kwargs, args.workers,
+                               args.batch_size, args.batch_delay,
+                               args.cache_size) as server:
+            await server.start(args.host, args.port, args.unix)
+            print(f'Serving on {server.address}')
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
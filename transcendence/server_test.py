@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from . import cards
+from . import expectimax
+from . import medium
+from . import server
+from . import transcendence
+
+
+class TestSolveServer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        board = transcendence.TranscendenceBoard(3, 1)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Thunder()
+        self.game.hand_right = cards.Outburst()
+        self.game.turns_left = 1
+        self.game_json = medium.ToJson.game_to_json(self.game)
+
+    async def asyncSetUp(self):
+        self.server = server.SolveServer(expectimax.ExpectimaxSolver, {},
+                                         batch_delay=0.05)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'solve.sock')
+        await self.server.start(path=self.path)
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.directory.cleanup()
+
+    async def test_solves_over_http(self):
+        move = await server.request_move(self.game, path=self.path)
+        self.assertEqual((move.x, move.y, move.is_left, move.is_change),
+                         (1, 0, True, False))
+        status, payload = await server.request('GET', '/stats', path=self.path)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(payload)['solved'], 1)
+
+    async def test_coalesces_and_caches(self):
+        self.game.turns_left = 2
+        second_json = medium.ToJson.game_to_json(self.game)
+        results = await asyncio.gather(self.server.solve(self.game_json),
+                                       self.server.solve(self.game_json),
+                                       self.server.solve(second_json))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(self.server.stats['coalesced'], 1)
+        self.assertEqual(self.server.stats['batches'], 1)
+        self.assertEqual(self.server.stats['solved'], 2)
+
+        self.assertEqual(await self.server.solve(self.game_json), results[0])
+        self.assertEqual(self.server.stats['cache_hits'], 1)
+        self.assertEqual(self.server.stats['batches'], 1)
+
+    async def test_bad_requests(self):
+        status, _ = await server.request('POST', '/solve', '{}', path=self.path)
+        self.assertEqual(status, 400)
+        self.game.turns_left = 0
+        with self.assertRaises(ValueError):
+            await server.request_move(self.game, path=self.path)
+        status, _ = await server.request('GET', '/missing', path=self.path)
+        self.assertEqual(status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
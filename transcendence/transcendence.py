@@ -1,10 +1,15 @@
 from enum import Enum
-from typing import Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 from collections import Counter
+from collections.abc import Set as AbstractSet
 from . import cards
 from . import generators
+from . import instrumentation
+from . import randomness
+from . import zobrist
 
 import random
+import time
 
 
 class Tile(Enum):
@@ -19,70 +24,263 @@ class Tile(Enum):
     MYSTERY = 8
     ENHANCEMENT = 9
 
+    # Tuples rather than sets: members compare by identity, which is much
+    # cheaper than hashing them.
     @classmethod
     def is_breakable(cls, tile: 'Tile'):
-        if tile in {Tile.NONE, Tile.DESTROYED}:
+        if tile in (Tile.NONE, Tile.DESTROYED):
             return False
         return True
 
     @classmethod
     def is_special(cls, tile: 'Tile'):
-        if tile in {Tile.ADDITION, Tile.RELOCATION,
-                    Tile.CLONE, Tile.BLESSING, Tile.MYSTERY, Tile.ENHANCEMENT}:
+        if tile in (Tile.ADDITION, Tile.RELOCATION,
+                    Tile.CLONE, Tile.BLESSING, Tile.MYSTERY, Tile.ENHANCEMENT):
             return True
         return False
 
 
+# How each tile is drawn in boards rendered as text.
+TILE_TEXT = {tile: str(tile.value) for tile in Tile}
+
+
+def _iter_bits(mask: int) -> Iterator[int]:
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class IndexedTileSet:
+    # Tile indices in a dense list plus a map from index to its slot in that
+    # list, so adding, removing, uniform choice and sampling are all O(1) per
+    # item. Removal moves the last item into the freed slot.
+    def __init__(self, indices: Iterable[int] = ()):
+        self._items: List[int] = []
+        self._slots: Dict[int, int] = {}
+        for index in indices:
+            self.add(index)
+
+    def add(self, index: int) -> None:
+        if index not in self._slots:
+            self._slots[index] = len(self._items)
+            self._items.append(index)
+
+    def discard(self, index: int) -> None:
+        slot = self._slots.pop(index, None)
+        if slot is None:
+            return
+        last = self._items.pop()
+        if last != index:
+            self._items[slot] = last
+            self._slots[last] = slot
+
+    def copy(self) -> 'IndexedTileSet':
+        result = IndexedTileSet()
+        result._items = list(self._items)
+        result._slots = dict(self._slots)
+        return result
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._slots
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def choice(self, rng: 'randomness.RandomLike' = random) -> int:
+        if not self._items:
+            raise IndexError('Cannot choose from an empty set')
+        return self._items[rng.randrange(len(self._items))]
+
+    def sample(self,
+               count: int,
+               rng: 'randomness.RandomLike' = random,
+               include: int = None,
+               exclude: int = None) -> List[int]:
+        # count distinct indices drawn uniformly from the set, with include
+        # added to it and exclude removed from it, using Floyd's algorithm so
+        # only the chosen slots are touched.
+        items = self._items
+        size = len(items)
+        excluded = self._slots.get(exclude)
+        if excluded is not None:
+            size -= 1
+        included = include is not None and include not in self._slots
+
+        def get(slot: int) -> int:
+            if slot == size:
+                return include
+            if slot == excluded:
+                return items[-1]
+            return items[slot]
+
+        population = size + included
+        if count > population:
+            raise ValueError('Sample larger than population')
+        chosen = set()
+        for upper in range(population - count, population):
+            slot = rng.randrange(upper + 1)
+            chosen.add(upper if slot in chosen else slot)
+        return [get(slot) for slot in sorted(chosen)]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({sorted(self._items)!r})'
+
+
+class TileMaskView(AbstractSet):
+    # Read-only set of (x, y) positions backed by one of the board's masks.
+    # Kept so callers can keep treating tile categories as sets.
+    def __init__(self, board: 'TranscendenceBoard', mask_name: str):
+        self._board = board
+        self._mask_name = mask_name
+
+    @classmethod
+    def _from_iterable(cls, iterable) -> Set[Tuple]:
+        return set(iterable)
+
+    @property
+    def mask(self) -> int:
+        return getattr(self._board, self._mask_name)
+
+    def __contains__(self, position) -> bool:
+        try:
+            x, y = position
+        except (TypeError, ValueError):
+            return False
+        if x is None or y is None or not self._board.in_board(x, y):
+            return False
+        return bool(self.mask >> self._board.index(x, y) & 1)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        width = self._board.width
+        for index in _iter_bits(self.mask):
+            yield (index % width, index // width)
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def union(self, *others) -> Set[Tuple]:
+        return set(self).union(*others)
+
+    def difference(self, *others) -> Set[Tuple]:
+        return set(self).difference(*others)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({set(self)!r})'
+
+
 class TranscendenceBoard:
     # TODO: Add a function for relocation.
-    def __init__(self, width: int, height: int):
+    # Tiles are stored row-major in a flat list, and every tile category is
+    # an integer bitmask over the same indices (bit y * width + x).
+    def __init__(self, width: int, height: int, tiles: List[Tile] = None):
         self.width = width
         self.height = height
-        self.grid = [[Tile.NORMAL for _ in range(width)] for _ in range(height)]
-        self.breakable_tiles = set()
-        self.distorted_tiles = set()
-        self.destroyed_tiles = set()
-        self.unusable_tiles = set()
-        self.special_tiles = set()
+        if tiles is None:
+            self.tiles = [Tile.NORMAL] * (width * height)
+        else:
+            if len(tiles) != width * height:
+                raise ValueError(f'Expected {width * height} tiles,'
+                                 f' got {len(tiles)}')
+            self.tiles = list(tiles)
+        self.breakable_mask = 0
+        self.distorted_mask = 0
+        self.destroyed_mask = 0
+        self.unusable_mask = 0
+        self.special_mask = 0
+        # Random access copies of breakable_mask and destroyed_mask, which
+        # special tiles and Lightning draw from.
+        self.breakable_indices = IndexedTileSet()
+        self.destroyed_indices = IndexedTileSet()
+        self.zobrist_hash = 0
+        # When set, (x, y, old tile) of every tile change is appended to it.
+        self._tile_log = None
         self._populate_tiles()
 
-    def _add_tile_metadata(self, x: int, y: int, tile: Tile):
+    @property
+    def grid(self) -> Tuple[Tuple[Tile, ...], ...]:
+        # The rows of tiles, read only. Tiles are changed through set_tile,
+        # which keeps the masks and hashes in step.
+        return tuple(tuple(self.tiles[y * self.width:(y + 1) * self.width])
+                     for y in range(self.height))
+
+    @property
+    def breakable_tiles(self) -> TileMaskView:
+        return TileMaskView(self, 'breakable_mask')
+
+    @property
+    def distorted_tiles(self) -> TileMaskView:
+        return TileMaskView(self, 'distorted_mask')
+
+    @property
+    def destroyed_tiles(self) -> TileMaskView:
+        return TileMaskView(self, 'destroyed_mask')
+
+    @property
+    def unusable_tiles(self) -> TileMaskView:
+        return TileMaskView(self, 'unusable_mask')
+
+    @property
+    def special_tiles(self) -> TileMaskView:
+        return TileMaskView(self, 'special_mask')
+
+    def index(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def position(self, index: int) -> Tuple[int, int]:
+        return (index % self.width, index // self.width)
+
+    def _add_tile_metadata(self, index: int, tile: Tile):
+        bit = 1 << index
         if tile is Tile.NONE:
-            self.unusable_tiles.add((x, y))
+            self.unusable_mask |= bit
         elif tile is Tile.DISTORTED:
-            self.distorted_tiles.add((x, y))
+            self.distorted_mask |= bit
         elif tile is Tile.DESTROYED:
-            self.destroyed_tiles.add((x, y))
+            self.destroyed_mask |= bit
+            self.destroyed_indices.add(index)
         else:
             if Tile.is_special(tile):
-                self.special_tiles.add((x, y))
-            self.breakable_tiles.add((x, y))
+                self.special_mask |= bit
+            self.breakable_mask |= bit
+            self.breakable_indices.add(index)
 
-    def _remove_tile_metadata(self, x: int, y: int, tile: Tile):
+    def _remove_tile_metadata(self, index: int, tile: Tile):
+        bit = ~(1 << index)
         if tile is Tile.NONE:
-            self.unusable_tiles.remove((x, y))
+            self.unusable_mask &= bit
         elif tile is Tile.DISTORTED:
-            self.distorted_tiles.remove((x, y))
+            self.distorted_mask &= bit
         elif tile is Tile.DESTROYED:
-            self.destroyed_tiles.remove((x, y))
+            self.destroyed_mask &= bit
+            self.destroyed_indices.discard(index)
         else:
             if Tile.is_special(tile):
-                self.special_tiles.remove((x, y))
-            self.breakable_tiles.remove((x, y))
+                self.special_mask &= bit
+            self.breakable_mask &= bit
+            self.breakable_indices.discard(index)
 
     def _populate_tiles(self) -> None:
-        self.breakable_tiles.clear()
-        self.distorted_tiles.clear()
-        self.unusable_tiles.clear()
-        for y, row in enumerate(self.grid):
-            for x, tile in enumerate(row):
-                self._add_tile_metadata(x, y, tile)
+        self.breakable_mask = 0
+        self.distorted_mask = 0
+        self.destroyed_mask = 0
+        self.unusable_mask = 0
+        self.special_mask = 0
+        self.breakable_indices = IndexedTileSet()
+        self.destroyed_indices = IndexedTileSet()
+        self.zobrist_hash = 0
+        for index, tile in enumerate(self.tiles):
+            self._add_tile_metadata(index, tile)
+            self.zobrist_hash ^= zobrist.tile_key(index, tile)
 
     def set_tile(self, x: int, y: int, tile: Tile) -> None:
         if not self.in_board(x, y):
             return None
 
-        old_tile = self.grid[y][x]
+        old_tile = self.tiles[y * self.width + x]
         if old_tile is Tile.NONE:
             return None
 
@@ -91,21 +289,32 @@ class TranscendenceBoard:
     def _setup_board_tile(self, x: int, y: int, tile: Tile) -> None:
         if not self.in_board(x, y):
             return None
-        old_tile = self.get(x, y)
+        self._set_index(y * self.width + x, tile)
+
+    def _set_index(self, index: int, tile: Tile) -> None:
+        old_tile = self.tiles[index]
+        if self._tile_log is not None:
+            self._tile_log.append(self.position(index) + (old_tile,))
 
-        self.grid[y][x] = tile
-        self._remove_tile_metadata(x, y, old_tile)
-        self._add_tile_metadata(x, y, tile)
+        self.tiles[index] = tile
+        self._remove_tile_metadata(index, old_tile)
+        self._add_tile_metadata(index, tile)
+        self.zobrist_hash ^= (zobrist.tile_key(index, old_tile)
+                              ^ zobrist.tile_key(index, tile))
 
     def _clear_special_tiles(self) -> None:
-        for x, y in list(self.special_tiles):
+        for index in _iter_bits(self.special_mask):
+            x, y = self.position(index)
             self.set_tile(x, y, Tile.NORMAL)
 
-    def set_special_tile(self) -> None:
+    def set_special_tile(self,
+                         rng: 'randomness.RandomLike' = random,
+                         tile_table: 'generators.AliasTable' = None) -> None:
         self._clear_special_tiles()
-        if self.breakable_tiles:
-            x, y = random.choice(list(self.breakable_tiles))
-            special_tile = generators.TileGenerator.get_random_tile()
+        if self.breakable_indices:
+            x, y = self.position(self.breakable_indices.choice(rng))
+            special_tile = generators.TileGenerator.get_random_tile(
+                rng, tile_table)
             self.set_tile(x, y, special_tile)
 
     def in_board(self, x: int, y: int) -> bool:
@@ -114,43 +323,72 @@ class TranscendenceBoard:
     def get(self, x: int, y: int) -> Tile:
         if not self.in_board(x, y):
             return None
-        return self.grid[y][x]
+        return self.tiles[y * self.width + x]
 
     def is_finished(self):
-        return len(self.breakable_tiles) == 0
+        return self.breakable_mask == 0
+
+    def copy(self) -> 'TranscendenceBoard':
+        board = TranscendenceBoard.__new__(TranscendenceBoard)
+        board.__dict__.update(self.__dict__)
+        board.tiles = list(self.tiles)
+        board.breakable_indices = self.breakable_indices.copy()
+        board.destroyed_indices = self.destroyed_indices.copy()
+        board._tile_log = None
+        return board
+
+    _STATE = ['breakable_mask', 'distorted_mask', 'destroyed_mask',
+              'unusable_mask', 'special_mask', 'zobrist_hash']
+
+    def snapshot(self) -> Tuple:
+        return (list(self.tiles),) + tuple(getattr(self, name)
+                                           for name in self._STATE)
+
+    def restore(self, snapshot: Tuple) -> None:
+        self.tiles = list(snapshot[0])
+        for name, value in zip(self._STATE, snapshot[1:]):
+            setattr(self, name, value)
+        self.breakable_indices = IndexedTileSet(_iter_bits(self.breakable_mask))
+        self.destroyed_indices = IndexedTileSet(_iter_bits(self.destroyed_mask))
 
     def calculate_hit_tiles(self, hit_tiles: Set[Tuple], card_type: type = cards.Card) -> Counter:
+        # Hits come from kernels clipped to the board, so tiles are looked up
+        # and set by index; positions off the board are skipped.
         tile_count = Counter()
+        width, height, tiles = self.width, self.height, self.tiles
         for x, y in hit_tiles:
-            tile = self.get(x, y)
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            index = y * width + x
+            tile = tiles[index]
             if not Tile.is_breakable(tile):
-                # TODO: Implement breakable tiles being undone.
-                # In the case of lightning.
+                # Lightning can undo destroyed tiles.
                 if card_type is cards.Lightning and tile == Tile.DESTROYED:
                     tile_count[tile] += 1
-                    self.set_tile(x, y, Tile.NORMAL)
-                raise NotImplementedError(f'Tile of type {tile}'
-                                          ' is not supported')
+                    self._set_index(index, Tile.NORMAL)
+                else:
+                    raise NotImplementedError(f'Tile of type {tile}'
+                                              ' is not supported')
             else:
                 if tile is Tile.DISTORTED:
                     if card_type is cards.Purify:
                         tile_count[tile] += 1
-                        self.set_tile(x, y, Tile.DESTROYED)
+                        self._set_index(index, Tile.DESTROYED)
                     else:
                         # TODO: Implement hitting distorted tiles. Keep in mind
                         # that distorted tiles activate after all tiles break.
                         raise NotImplementedError()
                 else:
                     tile_count[tile] += 1
-                    self.set_tile(x, y, Tile.DESTROYED)
+                    self._set_index(index, Tile.DESTROYED)
 
         return tile_count
 
     def __str__(self) -> str:
-        output = ''
-        for row in self.grid:
-            output += ' '.join([str(x.value) for x in row]) + '\n'
-        return output
+        width = self.width
+        return ''.join(
+            ' '.join([TILE_TEXT[tile] for tile in self.tiles[start:start + width]])
+            + '\n' for start in range(0, len(self.tiles), width))
 
 
 class TranscendenceMove:
@@ -162,8 +400,12 @@ class TranscendenceMove:
         self.is_left = is_left
         self.is_change = is_change
 
-    def get_hit_tiles(self, board: TranscendenceBoard, x: int, y: int):
-        return self.card.use(board, x, y)
+    def get_hit_tiles(self,
+                      board: TranscendenceBoard,
+                      x: int,
+                      y: int,
+                      rng: 'randomness.RandomLike' = random):
+        return self.card.use(board, x, y, rng)
 
     def __str__(self) -> str:
         output = ''
@@ -175,8 +417,50 @@ class TranscendenceMove:
         return output
 
 
+class GameSnapshot:
+    # Cards are kept together with their levels, since folding and
+    # enhancement tiles change levels in place.
+    def __init__(self, game: 'TranscendenceGame', include_board: bool = True):
+        self.board = game.board.snapshot() if include_board else None
+        self.hand_left = (game.hand_left, game.hand_left.level)
+        self.hand_right = (game.hand_right, game.hand_right.level)
+        self.hand_queue = [(card, card.level) for card in game.hand_queue]
+        self.turns_left = game.turns_left
+        self.changes_left = game.changes_left
+
+
+class MoveUndo(GameSnapshot):
+    # Undo record of TranscendenceGame.use_move_with_undo. Tiles are
+    # restored from the list of changes rather than from a copy.
+    def __init__(self, game: 'TranscendenceGame'):
+        super().__init__(game, include_board=False)
+        self.tile_changes = []
+
+
 class TranscendenceGame:
-    def __init__(self, board: TranscendenceBoard):
+    def __init__(self,
+                 board: TranscendenceBoard,
+                 rng=None,
+                 card_table: 'generators.AliasTable' = None,
+                 tile_table: 'generators.AliasTable' = None):
+        # Every random draw of the game comes from rng, which may be a seed,
+        # a random.Random or a NumPy Generator. A randomness.StreamRandom
+        # gives hits, card draws, special tiles and mystery results a stream
+        # each. Card and special tile draws use the generators' default
+        # weights unless tables are given.
+        self.rng = randomness.make_rng(rng)
+        self.card_table = card_table
+        self.tile_table = tile_table
+
+        # Zobrist hash of the hands and counters. Each part's key is kept so
+        # it can be removed again even if the card was changed in place.
+        self._hash = 0
+        self._hand_left = None
+        self._hand_right = None
+        self._turns_left = 0
+        self._changes_left = 0
+        self._keys = {'left': 0, 'right': 0, 'turns': 0, 'changes': 0}
+
         self.board = board
         self.hand_left = cards.Thunder()
         self.hand_right = cards.Tornado()
@@ -184,6 +468,114 @@ class TranscendenceGame:
         self.hand_queue_size = 3
         self.turns_left = 0
         self.changes_left = 0
+        # Objects with before_move(game, move) and
+        # after_move(game, move, tile_counter), called around use_move.
+        self.observers = []
+
+    def __getstate__(self) -> dict:
+        # Observers stay with the original when a game is copied or sent to
+        # another process.
+        state = self.__dict__.copy()
+        state['observers'] = []
+        return state
+
+    def _set_key(self, part: str, key: int) -> None:
+        self._hash ^= self._keys[part] ^ key
+        self._keys[part] = key
+
+    @property
+    def hand_left(self) -> cards.Card:
+        return self._hand_left
+
+    @hand_left.setter
+    def hand_left(self, card: cards.Card) -> None:
+        self._hand_left = card
+        self._set_key('left', zobrist.card_key('left', card))
+
+    @property
+    def hand_right(self) -> cards.Card:
+        return self._hand_right
+
+    @hand_right.setter
+    def hand_right(self, card: cards.Card) -> None:
+        self._hand_right = card
+        self._set_key('right', zobrist.card_key('right', card))
+
+    @property
+    def turns_left(self) -> int:
+        return self._turns_left
+
+    @turns_left.setter
+    def turns_left(self, value: int) -> None:
+        self._turns_left = value
+        self._set_key('turns', zobrist.counter_key('turns', value))
+
+    @property
+    def changes_left(self) -> int:
+        return self._changes_left
+
+    @changes_left.setter
+    def changes_left(self, value: int) -> None:
+        self._changes_left = value
+        self._set_key('changes', zobrist.counter_key('changes', value))
+
+    @property
+    def zobrist_hash(self) -> int:
+        # The queue shifts on every pop, so its few keys are combined here
+        # rather than tracked.
+        result = self._hash ^ self.board.zobrist_hash
+        for slot, card in enumerate(self.hand_queue):
+            result ^= zobrist.card_key(slot, card)
+        return result
+
+    def rehash(self) -> None:
+        # Needed only after changing a card's level directly.
+        self.board._populate_tiles()
+        self.hand_left = self.hand_left
+        self.hand_right = self.hand_right
+
+    def _enhance_hand(self, is_left: bool) -> None:
+        if is_left:
+            self.hand_left.enhance()
+            self.hand_left = self.hand_left
+        else:
+            self.hand_right.enhance()
+            self.hand_right = self.hand_right
+
+    def is_over(self) -> bool:
+        return self.turns_left <= 0 or self.board.is_finished()
+
+    def snapshot(self) -> GameSnapshot:
+        return GameSnapshot(self)
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        if snapshot.board is not None:
+            self.board.restore(snapshot.board)
+
+        def restore_card(state):
+            card, level = state
+            card.level = level
+            return card
+
+        self.hand_left = restore_card(snapshot.hand_left)
+        self.hand_right = restore_card(snapshot.hand_right)
+        self.hand_queue = [restore_card(state) for state in snapshot.hand_queue]
+        self.turns_left = snapshot.turns_left
+        self.changes_left = snapshot.changes_left
+
+    def use_move_with_undo(self, move: 'TranscendenceMove') -> MoveUndo:
+        undo = MoveUndo(self)
+        self.board._tile_log = undo.tile_changes
+        try:
+            self.use_move(move)
+        finally:
+            self.board._tile_log = None
+        return undo
+
+    def undo_move(self, undo: MoveUndo) -> None:
+        for x, y, tile in reversed(undo.tile_changes):
+            self.board._setup_board_tile(x, y, tile)
+        self.restore(undo)
 
     def bless(self, move: TranscendenceMove) -> None:
         self.turns_left += 1
@@ -192,10 +584,7 @@ class TranscendenceGame:
         self.changes_left += 1
 
     def enhance(self, move: TranscendenceMove) -> None:
-        if move.is_left:
-            self.hand_right.enhance()
-        else:
-            self.hand_left.enhance()
+        self._enhance_hand(not move.is_left)
 
     def clone(self, move: TranscendenceMove) -> None:
         if move.is_left:
@@ -205,7 +594,7 @@ class TranscendenceGame:
 
     def mystery(self, move: TranscendenceMove) -> None:
         result = None
-        if random.choice([True, False]):
+        if randomness.get_stream(self.rng, 'mystery').choice([True, False]):
             result = cards.Tree()
         else:
             result = cards.Outburst()
@@ -223,24 +612,46 @@ class TranscendenceGame:
         move = TranscendenceMove(self.hand_left, x, y, is_left=True)
         self.use_move(move)
 
-    def use_move(self, move: TranscendenceMove):
+    def use_move(self,
+                 move: TranscendenceMove,
+                 hit_tiles: Set[Tuple] = None) -> Counter:
         # Calculate hit tiles, then break them and use special effects as
-        # necessary. Then cycle hand and set next board state.
+        # necessary. Then cycle hand and set next board state. Solvers that
+        # enumerate the possible hits pass them in as hit_tiles.
+        for observer in self.observers:
+            observer.before_move(self, move)
 
+        # Phases are timed only while instrumentation is enabled.
+        stats = instrumentation.active
+        if stats is not None:
+            move_start = start = time.perf_counter()
+
+        tile_counter = Counter()
         if move.is_change:
             if move.is_left:
                 self.hand_left = None
             else:
                 self.hand_right = None
+            self.changes_left -= 1
             self.fix_hand()
+            if stats is not None:
+                stats.record('fix_hand', start)
         else:
             # Ensure the move is on a valid tile.
             if (move.x, move.y) not in self.board.breakable_tiles:
                 if ((move.x, move.y) in self.board.distorted_tiles
                     and isinstance(move.card, cards.Purify)):
                     pass
-            hit_tiles = move.get_hit_tiles(self.board, move.x, move.y)
-            tile_counter = self.board.calculate_hit_tiles(hit_tiles)
+            if hit_tiles is None:
+                hit_tiles = move.get_hit_tiles(
+                    self.board, move.x, move.y,
+                    randomness.get_stream(self.rng, 'hits'))
+            if stats is not None:
+                start = stats.record('hit_tiles', start)
+            tile_counter = self.board.calculate_hit_tiles(hit_tiles,
+                                                          type(move.card))
+            if stats is not None:
+                start = stats.record('calculate_hit_tiles', start)
 
             if Tile.BLESSING in tile_counter:
                 self.bless(move)
@@ -254,15 +665,31 @@ class TranscendenceGame:
                 self.mystery(move)
             if Tile.RELOCATION in tile_counter:
                 self.relocation(move)
+            if stats is not None:
+                for tile in tile_counter:
+                    if Tile.is_special(tile):
+                        stats.count(f'effect.{tile.name.lower()}')
+                start = stats.record('special_tiles', start)
 
             if move.is_left:
                 self.hand_left = None
             else:
                 self.hand_right = None
             self.fix_hand()
-            self.board.set_special_tile()
+            if stats is not None:
+                start = stats.record('fix_hand', start)
+            self.board.set_special_tile(
+                randomness.get_stream(self.rng, 'tiles'), self.tile_table)
+            if stats is not None:
+                stats.record('set_special_tile', start)
             self.turns_left -= 1
 
+        if stats is not None:
+            stats.record('use_move', move_start)
+        for observer in self.observers:
+            observer.after_move(self, move, tile_counter)
+        return tile_counter
+
     def fix_hand(self) -> None:
         # How to fix hand:
         # 1. Fill in left and right hand slots.
@@ -287,11 +714,13 @@ class TranscendenceGame:
             if not (self.hand_left.level is cards.CardLevel.MAX
                 or self.hand_right.level is cards.CardLevel.MAX):
                 self.hand_right = None
-                self.hand_left.enhance()
+                self._enhance_hand(True)
 
     def _refill_hand_queue(self) -> None:
+        rng = randomness.get_stream(self.rng, 'cards')
         while len(self.hand_queue) < self.hand_queue_size:
-            self.hand_queue.append(generators.CardGenerator.get_random_card())
+            self.hand_queue.append(
+                generators.CardGenerator.get_random_card(rng, self.card_table))
 
     def __str__(self):
         return str(self.board)
\ No newline at end of file
@@ -3,7 +3,10 @@ import unittest
 
 from . import transcendence
 from . import cards
+from . import expectimax
 from . import generators
+from . import kernels
+from . import zobrist
 
 from unittest.mock import patch, Mock
 
@@ -39,27 +42,27 @@ class TestTileEnhancements(unittest.TestCase):
         self.assertEqual(self.game.hand_left, self.move_right.card)
 
     # ----- Mystery Tiles -----
-    @patch('transcendence.random')
-    def test_mystery_tree_left(self, random):
-        random.choice.return_value = True
+    def test_mystery_tree_left(self):
+        self.game.rng = Mock()
+        self.game.rng.choice.return_value = True
         self.game.mystery(self.move_left)
         self.assertIsInstance(self.game.hand_right, cards.Tree)
 
-    @patch('transcendence.random')
-    def test_mystery_outburst_left(self, random):
-        random.choice.return_value = False
+    def test_mystery_outburst_left(self):
+        self.game.rng = Mock()
+        self.game.rng.choice.return_value = False
         self.game.mystery(self.move_left)
         self.assertIsInstance(self.game.hand_right, cards.Outburst)
 
-    @patch('transcendence.random')
-    def test_mystery_tree_right(self, random):
-        random.choice.return_value = True
+    def test_mystery_tree_right(self):
+        self.game.rng = Mock()
+        self.game.rng.choice.return_value = True
         self.game.mystery(self.move_right)
         self.assertIsInstance(self.game.hand_left, cards.Tree)
 
-    @patch('transcendence.random')
-    def test_mystery_outburst_right(self, random):
-        random.choice.return_value = False
+    def test_mystery_outburst_right(self):
+        self.game.rng = Mock()
+        self.game.rng.choice.return_value = False
         self.game.mystery(self.move_right)
         self.assertIsInstance(self.game.hand_left, cards.Outburst)
 
@@ -89,6 +92,91 @@ class TestTileEnhancements(unittest.TestCase):
         self.assertEqual(cards.CardLevel.MAX, self.game.hand_left.level)
 
 
+class TestBoard(unittest.TestCase):
+    def setUp(self):
+        self.board = transcendence.TranscendenceBoard(3, 2)
+
+    def test_grid_is_read_only(self):
+        self.board.set_tile(2, 1, transcendence.Tile.DESTROYED)
+        self.assertEqual(self.board.grid[1][2], transcendence.Tile.DESTROYED)
+        with self.assertRaises(TypeError):
+            self.board.grid[1][2] = transcendence.Tile.NORMAL
+
+    def test_set_tile_updates_masks(self):
+        self.board.set_tile(1, 0, transcendence.Tile.DESTROYED)
+        self.board.set_tile(2, 1, transcendence.Tile.BLESSING)
+        self.assertEqual(self.board.destroyed_tiles, {(1, 0)})
+        self.assertEqual(self.board.special_tiles, {(2, 1)})
+        self.assertIn((2, 1), self.board.breakable_tiles)
+        self.assertNotIn((1, 0), self.board.breakable_tiles)
+        self.assertEqual(len(self.board.breakable_tiles), 5)
+        self.assertEqual(self.board.get(1, 0), transcendence.Tile.DESTROYED)
+
+    def test_hits_off_the_board_are_skipped(self):
+        tile_count = self.board.calculate_hit_tiles({(0, 0), (3, 0), (0, -1)})
+        self.assertEqual(tile_count, {transcendence.Tile.NORMAL: 1})
+        self.assertEqual(self.board.get(0, 0), transcendence.Tile.DESTROYED)
+
+    def test_copy_is_independent(self):
+        board_copy = self.board.copy()
+        board_copy.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        self.assertEqual(self.board.get(0, 0), transcendence.Tile.NORMAL)
+        self.assertIn((0, 0), self.board.breakable_tiles)
+        self.assertNotIn((0, 0), board_copy.breakable_tiles)
+
+    def test_is_finished(self):
+        for x in range(3):
+            for y in range(2):
+                self.board.set_tile(x, y, transcendence.Tile.DESTROYED)
+        self.assertTrue(self.board.is_finished())
+
+    def test_indices_follow_masks(self):
+        def assertIndicesMatch(board):
+            self.assertEqual(set(board.breakable_indices),
+                             {board.index(x, y) for x, y in board.breakable_tiles})
+            self.assertEqual(set(board.destroyed_indices),
+                             {board.index(x, y) for x, y in board.destroyed_tiles})
+
+        snapshot = self.board.snapshot()
+        rng = random.Random(0)
+        for _ in range(20):
+            x, y = rng.randrange(3), rng.randrange(2)
+            self.board.set_tile(x, y, rng.choice(list(transcendence.Tile)[1:]))
+            assertIndicesMatch(self.board)
+        assertIndicesMatch(self.board.copy())
+        self.board.restore(snapshot)
+        assertIndicesMatch(self.board)
+
+
+class TestIndexedTileSet(unittest.TestCase):
+    def test_add_and_discard(self):
+        tiles = transcendence.IndexedTileSet([4, 1, 7])
+        tiles.discard(4)
+        tiles.discard(5)
+        tiles.add(1)
+        self.assertEqual(sorted(tiles), [1, 7])
+        self.assertIn(7, tiles)
+        self.assertNotIn(4, tiles)
+        self.assertEqual(tiles.choice(random.Random(0)) in (1, 7), True)
+        with self.assertRaises(IndexError):
+            transcendence.IndexedTileSet().choice()
+
+    def test_sample_is_uniform(self):
+        tiles = transcendence.IndexedTileSet(range(5))
+        rng = random.Random(0)
+        counts = dict.fromkeys([0, 1, 3, 4, 9], 0)
+        for _ in range(4000):
+            sample = tiles.sample(2, rng, include=9, exclude=2)
+            self.assertEqual(len(set(sample)), 2)
+            for index in sample:
+                counts[index] += 1
+        # Each of the 5 candidates is in 2 of 5 samples.
+        for count in counts.values():
+            self.assertAlmostEqual(count / 4000, 0.4, delta=0.04)
+        with self.assertRaises(ValueError):
+            tiles.sample(5, rng, exclude=2)
+
+
 class TestCards(unittest.TestCase):
     def setUp(self) -> None:
         board = transcendence.TranscendenceBoard(5, 5)
@@ -99,6 +187,11 @@ class TestCards(unittest.TestCase):
             [cards.Lightning(), cards.Tempest(), cards.Earthquake()]
         )
         self.game = game
+        self.get_random_card = (
+            generators.CardGenerator.__dict__['get_random_card'])
+
+    def tearDown(self) -> None:
+        generators.CardGenerator.get_random_card = self.get_random_card
 
     def test_card_folding(self):
         generators.CardGenerator.get_random_card = Mock()
@@ -121,5 +214,251 @@ class TestCards(unittest.TestCase):
         self.assertEqual(self.game.hand_right, cards.Tempest())
         self.assertListEqual(self.game.hand_queue, [cards.Earthquake(), cards.Shockwave(), cards.Tornado()])
 
+class TestCardKernels(unittest.TestCase):
+    def setUp(self) -> None:
+        self.board = transcendence.TranscendenceBoard(5, 5)
+
+    def test_max_thunder_hits_cross(self):
+        hit_tiles = cards.Thunder(cards.CardLevel.MAX).use(self.board, 0, 0)
+        self.assertSetEqual(hit_tiles, {(0, 0), (1, 0), (0, 1)})
+
+    def test_max_hellfire_is_centered_on_target(self):
+        hit_tiles = cards.Hellfire(cards.CardLevel.MAX).use(self.board, 2, 2)
+        expected = {(x, y) for x in range(5) for y in range(5)
+                    if abs(x - 2) + abs(y - 2) <= 3}
+        self.assertSetEqual(hit_tiles, expected)
+
+    def test_kernel_is_cached_and_clipped(self):
+        kernel = kernels.KernelRegistry.get_kernel(
+            cards.Tree, cards.CardLevel.MAX, 5, 5)
+        self.assertIs(kernel, cards.Tree().get_kernel(self.board))
+        positions = {position for _, position, _ in kernel.footprint(0, 0)}
+        self.assertSetEqual(positions, {(0, 0), (1, 0), (2, 0), (0, 1), (0, 2)})
+
+    def test_tempest_always_hits_origin(self):
+        self.board.set_tile(1, 1, transcendence.Tile.DESTROYED)
+        hit_tiles = cards.Tempest().use(self.board, 1, 1)
+        self.assertIn((1, 1), hit_tiles)
+        self.assertTrue(all(x == 1 for x, _ in hit_tiles))
+
+class TestHitDistribution(unittest.TestCase):
+    def setUp(self) -> None:
+        self.board = transcendence.TranscendenceBoard(3, 3)
+
+    def test_thunder_corner(self):
+        distribution = cards.Thunder().hit_distribution(self.board, 0, 0)
+        self.assertDictEqual(distribution, {(0, 0): 1, (1, 0): 0.5, (0, 1): 0.5})
+
+    def test_destroyed_tiles_are_excluded(self):
+        self.board.set_tile(1, 0, transcendence.Tile.DESTROYED)
+        distribution = cards.Thunder().hit_distribution(self.board, 0, 0)
+        self.assertNotIn((1, 0), distribution)
+
+    def test_lightning(self):
+        distribution = cards.Lightning().hit_distribution(self.board, 1, 1)
+        self.assertAlmostEqual(distribution[(1, 1)], 3 / 4)
+        for x, y in self.board.breakable_tiles.difference({(1, 1)}):
+            self.assertAlmostEqual(distribution[(x, y)], 3 / 32)
+
+    def test_lightning_with_destroyed_tiles(self):
+        self.board.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        distribution = cards.Lightning().hit_distribution(self.board, 1, 1)
+        self.assertAlmostEqual(distribution[(0, 0)], 1 / 8)
+        self.assertAlmostEqual(distribution[(1, 1)], 7 / 8)
+
+class TestSnapshots(unittest.TestCase):
+    def setUp(self) -> None:
+        self.game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(5, 5))
+        self.game.turns_left = 20
+
+    def get_state(self):
+        return (list(self.game.board.tiles), self.game.board.breakable_mask,
+                self.game.hand_left, self.game.hand_right,
+                list(self.game.hand_queue), self.game.turns_left,
+                self.game.changes_left, self.game.zobrist_hash)
+
+    def test_snapshot_restore(self):
+        before = self.get_state()
+        snapshot = self.game.snapshot()
+        for _ in range(5):
+            self.game.use_move(generators.MoveGenerator.get_random_move(self.game))
+        self.game.restore(snapshot)
+        self.assertEqual(before, self.get_state())
+
+    def test_undo_restores_enhanced_cards(self):
+        self.game.board.set_tile(1, 1, transcendence.Tile.ENHANCEMENT)
+        before = self.get_state()
+        move = transcendence.TranscendenceMove(self.game.hand_left, 1, 1, True)
+        undo = self.game.use_move_with_undo(move)
+        self.game.undo_move(undo)
+        self.assertEqual(before, self.get_state())
+        self.assertEqual(self.game.hand_right.level, cards.CardLevel.NORMAL)
+
+    def test_undo_in_reverse_order(self):
+        before = self.get_state()
+        undos = []
+        for _ in range(5):
+            move = generators.MoveGenerator.get_random_move(self.game)
+            undos.append(self.game.use_move_with_undo(move))
+        for undo in reversed(undos):
+            self.game.undo_move(undo)
+        self.assertEqual(before, self.get_state())
+        self.assertIsNone(self.game.board._tile_log)
+
+
+class TestRandomness(unittest.TestCase):
+    def play(self, rng):
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(5, 5), rng=rng)
+        game.turns_left = 10
+        while not game.is_over():
+            game.use_move(generators.MoveGenerator.get_random_move(game))
+        return game.zobrist_hash
+
+    def test_seeded_games_repeat(self):
+        self.assertEqual(self.play(7), self.play(7))
+        self.assertEqual(self.play(random.Random(3)), self.play(random.Random(3)))
+
+    def test_numpy_generator(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        self.assertEqual(self.play(numpy.random.default_rng(5)),
+                         self.play(numpy.random.default_rng(5)))
+
+
+class TestAliasTable(unittest.TestCase):
+    def test_matches_weights(self):
+        table = generators.AliasTable({'a': 1, 'b': 3, 'c': 0})
+        draws = table.draw_many(20000, random.Random(0))
+        self.assertNotIn('c', draws)
+        self.assertAlmostEqual(draws.count('b') / len(draws), 0.75, delta=0.02)
+
+    def test_custom_tile_table(self):
+        table = generators.AliasTable({transcendence.Tile.BLESSING: 1})
+        game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(3, 3), rng=0, tile_table=table)
+        game.turns_left = 2
+        game.use_move(generators.MoveGenerator.get_random_move(game))
+        self.assertEqual(
+            [game.board.get(x, y) for x, y in game.board.special_tiles],
+            [transcendence.Tile.BLESSING])
+
+    def test_requires_positive_weight(self):
+        with self.assertRaises(ValueError):
+            generators.AliasTable({'a': 0})
+
+
+class TestZobristHash(unittest.TestCase):
+    def setUp(self) -> None:
+        self.game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(4, 4))
+
+    def assertHashIsFresh(self, game):
+        expected = game.zobrist_hash
+        game.rehash()
+        self.assertEqual(expected, game.zobrist_hash)
+
+    def test_order_independent(self):
+        other = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(4, 4))
+        self.game.board.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        self.game.board.set_tile(3, 3, transcendence.Tile.DESTROYED)
+        other.board.set_tile(3, 3, transcendence.Tile.DESTROYED)
+        other.board.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        self.assertEqual(self.game.zobrist_hash, other.zobrist_hash)
+        other.turns_left += 1
+        self.assertNotEqual(self.game.zobrist_hash, other.zobrist_hash)
+
+    def test_hands_and_queue(self):
+        base = self.game.zobrist_hash
+        self.game.hand_left, self.game.hand_right = (
+            self.game.hand_right, self.game.hand_left)
+        self.assertNotEqual(base, self.game.zobrist_hash)
+        self.game.hand_queue.append(self.game.hand_queue.pop(0))
+        self.assertHashIsFresh(self.game)
+
+    def test_enhance_and_clone(self):
+        move = transcendence.TranscendenceMove(self.game.hand_left, 1, 1, True)
+        self.game.clone(move)
+        self.game.enhance(move)
+        self.game.hand_left = None
+        self.game.fix_hand()
+        self.assertHashIsFresh(self.game)
+
+    def test_transposition_table_evicts_least_recently_used(self):
+        table = zobrist.TranspositionTable(capacity=2)
+        table.put(1, 'a')
+        table.put(2, 'b')
+        self.assertEqual(table.get(1), 'a')
+        table.put(3, 'c')
+        self.assertNotIn(2, table)
+        self.assertIn(1, table)
+        self.assertIsNone(table.get(2))
+        self.assertEqual(table.get_hit_rate(), 0.5)
+
+
+class TestMoveGeneration(unittest.TestCase):
+    def setUp(self):
+        self.game = transcendence.TranscendenceGame(
+            transcendence.TranscendenceBoard(4, 4))
+        self.game.changes_left = 1
+
+    def keys(self, reduce=True):
+        return list(generators.MoveGenerator.iter_move_keys(self.game, reduce))
+
+    def test_unreduced_matches_valid_moves(self):
+        moves = generators.MoveGenerator.get_valid_moves(self.game)
+        self.assertCountEqual(
+            self.keys(reduce=False),
+            [(move.x, move.y, move.is_left, move.is_change) for move in moves])
+        right_change = [move for move in moves
+                        if move.is_change and not move.is_left]
+        self.assertIs(right_change[0].card, self.game.hand_right)
+
+    def test_symmetric_board(self):
+        # Only the mirror between the top and bottom rows maps every card
+        # onto itself, leaving 8 distinct tiles of 16 per hand.
+        self.assertEqual(len(self.keys()), 2 * 8 + 2)
+        self.game.board.set_tile(0, 0, transcendence.Tile.DESTROYED)
+        self.assertEqual(len(self.keys()), 2 * 15 + 2)
+
+    def test_reduction_keeps_best_value(self):
+        # Outburst is symmetric under the diagonal mirror of this board, but
+        # the Earthquake drawn next is not, so (0, 1) and (1, 0) differ.
+        board = transcendence.TranscendenceBoard(3, 3)
+        for x, y in board.breakable_tiles:
+            if (x, y) not in [(0, 0), (1, 0), (0, 1)]:
+                board.set_tile(x, y, transcendence.Tile.DESTROYED)
+        self.game = transcendence.TranscendenceGame(board)
+        self.game.hand_left = cards.Outburst()
+        self.game.hand_right = cards.Outburst()
+        self.game.hand_queue = [cards.Earthquake(), cards.Outburst(),
+                                cards.Outburst()]
+        self.game.turns_left = 2
+        solver = expectimax.ExpectimaxSolver()
+        reduced = max(solver.get_move_value(self.game, key)
+                      for key in self.keys())
+        unreduced = max(solver.get_move_value(self.game, key)
+                        for key in self.keys(reduce=False))
+        self.assertAlmostEqual(reduced, unreduced)
+        self.assertGreater(unreduced, 0.8)
+
+    def test_change_uses_a_change(self):
+        key = next(key for key in self.keys() if key[3])
+        self.game.use_move(transcendence.TranscendenceMove(
+            self.game.hand_left, *key))
+        self.assertEqual(self.game.changes_left, 0)
+        self.assertFalse([key for key in self.keys() if key[3]])
+
+    def test_same_card_in_both_hands(self):
+        self.game.hand_right = cards.Thunder()
+        self.assertFalse([key for key in self.keys() if not key[2]])
+        self.game.hand_right.enhance()
+        self.assertTrue([key for key in self.keys() if not key[2]])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
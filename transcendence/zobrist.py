@@ -0,0 +1,73 @@
+import random
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+# Zobrist keys are derived from string seeds rather than drawn in order, so
+# every process agrees on them however lazily they are created.
+_keys: Dict[Hashable, int] = {}
+_MISSING = object()
+
+
+def _get_key(name: Hashable) -> int:
+    key = _keys.get(name)
+    if key is None:
+        key = random.Random(repr(name)).getrandbits(64)
+        _keys[name] = key
+    return key
+
+
+def tile_key(index: int, tile: 'transcendence.Tile') -> int:
+    return _get_key(('tile', index, tile.value))
+
+
+def card_key(slot: Hashable, card: 'cards.Card') -> int:
+    if card is None:
+        return 0
+    return _get_key(('card', slot, type(card).__name__, card.level.value))
+
+
+def counter_key(name: str, value: int) -> int:
+    return _get_key(('counter', name, value))
+
+
+class TranspositionTable:
+    # Maps Zobrist hashes to search results, evicting the least recently
+    # used entry once capacity is reached.
+    def __init__(self, capacity: int = 1 << 20):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: int, default: Any = None) -> Any:
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: int, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)